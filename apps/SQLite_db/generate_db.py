@@ -215,6 +215,8 @@ def init_schema(cursor):
             filename TEXT,
             subject TEXT,
             body TEXT,
+            clean_body TEXT,
+            clean_body_version INTEGER,
             from_address TEXT,
             to_address TEXT,
             date TEXT,
@@ -242,6 +244,8 @@ def init_schema(cursor):
             subjectivity REAL,
             stress_score REAL,
             relaxation_score REAL,
+            model_version TEXT,
+            content_hash TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             UNIQUE(email_id) ON CONFLICT REPLACE
         );
@@ -450,6 +454,14 @@ def main():
 
     print(f"✅ Successfully created {DB_PATH} from {MAILDIR_PATH}")
     print(f"📊 Total emails processed: {len(all_parsed_emails)}")
+    print(
+        "🧹 Fill emails.clean_body with: "
+        "cd apps/flask_api && python -m app.services.email_cleaning"
+    )
+    print(
+        "📐 Then precompute classifier features with: "
+        "cd apps/flask_api && python -m app.services.email_features"
+    )
 
 
 if __name__ == "__main__":
@@ -18,6 +18,9 @@ def create_app():
     from app.routes.respond import respond_bp
     from app.routes.users import users_bp
     from app.routes.emails import emails_bp
+    from app.routes.search import search_bp
+    from app.routes.system import system_bp
+    from app.routes.topics import topics_bp
 
     app.register_blueprint(summarize_bp, url_prefix="/api/summarize")
     app.register_blueprint(ner_bp, url_prefix="/api/ner")
@@ -25,5 +28,8 @@ def create_app():
     app.register_blueprint(respond_bp, url_prefix="/api/respond")
     app.register_blueprint(users_bp, url_prefix="/api")
     app.register_blueprint(emails_bp, url_prefix="/api")
+    app.register_blueprint(search_bp, url_prefix="/api")
+    app.register_blueprint(system_bp, url_prefix="/api/system")
+    app.register_blueprint(topics_bp, url_prefix="/api/topics")
 
     return app
@@ -1,7 +1,23 @@
 from flask import Blueprint, request, jsonify
 from app.services.enron_classifier import EnronEmailClassifier
 from app.services.emotion_enhancer import EmotionEnhancer
-from app.services.db import get_email_by_id, store_data
+from app.services.db import (
+    get_classification_by_hash,
+    get_email_by_id,
+    get_stored_classification,
+    store_data,
+)
+from app.services.micro_batcher import MicroBatcher
+from app.services.model_artifacts import ArtifactError
+from app.services.model_registry import DEFAULT_SHADOW_SAMPLE_RATE
+from app.services.online_learner import OnlineLearner
+from app.services.profiling import PROFILE_INFERENCE, profiling, stage
+from app.services.resources import allocation
+from app.services.shadow_evaluation import ShadowEvaluator
+from app.services.single_flight import SingleFlight
+from app.services.streaming_trainer import StreamingTrainer
+from app.services.training_jobs import TrainingJobManager
+from app.services.text_normalizer import normalization_stats
 import pandas as pd
 import traceback
 import concurrent.futures
@@ -10,14 +26,33 @@ import sqlite3  #
 classify_bp = Blueprint("classify", __name__)
 classifier = EnronEmailClassifier()
 emotion_enhancer = EmotionEnhancer()
+online_learner = OnlineLearner(classifier)
+training_jobs = TrainingJobManager(classifier.model_dir)
+# Concurrent classifications of the same content share one inference
+classification_flights = SingleFlight()
+# Concurrent single-email inferences run together as one batch
+inference_batcher = MicroBatcher(classifier.predict_batch, name="classify-batcher")
+# Scores a sample of live traffic with the registry's shadow version
+shadow_evaluator = ShadowEvaluator(classifier)
 
 # Initialize the classifier (you might want to call train() elsewhere)
 # Can be initialized during app startup or the first time it's needed
 
 
+@classify_bp.before_request
+def sync_published_models():
+    """Serve what another worker process trained, activated or learned"""
+    classifier.sync_published()
+
+
 @classify_bp.route("/email/<int:email_id>", methods=["GET"])
 def classify_email(email_id):
-    """Classify a single email by ID"""
+    """Classify a single email by ID
+
+    With ``?profile=1`` (or PROFILE_INFERENCE=1) the response carries a
+    per-stage timing breakdown of this request, including its micro-batch
+    queue wait and batch run time.
+    """
     try:
         # Check if model is trained
         if classifier.ensemble_model is None:
@@ -28,32 +63,40 @@ def classify_email(email_id):
                 400,
             )
 
-        # Get the email from database
-        email = get_email_by_id(email_id)
-
-        if not email:
-            return jsonify({"error": f"Email with id {email_id} not found"}), 404
-
-        # Convert to a format the classifier expects
-        email_data = {
-            "subject": email["subject"] if "subject" in email.keys() else "",
-            "body": email.get("body", ""),
-            "sender": email.get("sender", ""),
-            "has_attachment": email.get("has_attachment", False),
-            "num_recipients": email.get("num_recipients", 1),
-            "time_sent": pd.to_datetime(email.get("time_sent", "2000-01-01")),
-        }
-
-        # Predict using the classifier
-        prediction = classifier.predict(email_data)
-
-        # Store prediction result in database using the classifier's serialize method
-        prediction_data = EnronEmailClassifier.serialize_prediction(
-            str(email_id), prediction
+        profile_requested = PROFILE_INFERENCE or request.args.get("profile") in (
+            "1",
+            "true",
         )
-        store_data("email_classifications", [prediction_data])
-
-        return jsonify({"email_id": email_id, "classification": prediction})
+        with profiling(profile_requested) as profile:
+            # Reuse the stored result if the current model produced it
+            version = prediction_version()
+            with stage("stored_lookup"):
+                stored = stored_prediction(email_id, version)
+            if stored is not None:
+                prediction, source = stored, "stored"
+            else:
+                # Get the email from database
+                with stage("db_fetch"):
+                    email = get_email_by_id(email_id)
+
+                if not email:
+                    return (
+                        jsonify({"error": f"Email with id {email_id} not found"}),
+                        404,
+                    )
+
+                # Convert to a format the classifier expects
+                email_data = email_row_to_data(email)
+                prediction, source = classify_with_cache(email_id, email_data, version)
+
+        response = {
+            "email_id": email_id,
+            "classification": prediction,
+            "source": source,
+        }
+        if profile is not None:
+            response["profile"] = profile.to_dict()
+        return jsonify(response)
 
     except Exception as e:
         return (
@@ -67,6 +110,151 @@ def classify_email(email_id):
         )
 
 
+def prediction_version():
+    """Model version a stored classification must carry to be reused, or None
+
+    Results from the online head are never reused: it changes with every
+    feedback update and its state is per process.
+    """
+    if classifier.serving_online_head:
+        return None
+    return classifier.results_version
+
+
+def recorded_version():
+    """Model version to store with a freshly computed classification"""
+    if classifier.serving_online_head:
+        # Never matches prediction_version(), so it is not reused
+        return f"{classifier.results_version}+online"
+    return classifier.results_version
+
+
+def stored_prediction(email_id, version):
+    """The stored prediction for an email if ``version`` produced it"""
+    if version is None:
+        return None
+    stored = get_stored_classification(email_id)
+    if stored and stored.get("model_version") == version:
+        return EnronEmailClassifier.deserialize_prediction(stored)
+    return None
+
+
+def classify_with_cache(email_id, email_data, version=None):
+    """Classify a stored email, sharing work with identical requests
+
+    Concurrent calls for the same content (hence the same email) run one
+    inference between them, and an identical email already classified by the
+    same model is reused. Returns ``(prediction, source)``, where source is
+    "computed", "duplicate" or "shared"; the result is stored for
+    ``email_id``.
+    """
+    content_hash = classifier.content_hash(email_data)
+
+    def compute():
+        if version is not None:
+            with stage("duplicate_lookup"):
+                duplicate = get_classification_by_hash(content_hash, version)
+            if duplicate:
+                prediction = EnronEmailClassifier.deserialize_prediction(duplicate)
+                return prediction, "duplicate", str(email_id)
+        # Batched with whatever other requests are in flight
+        prediction = inference_batcher.predict(email_data)
+        return prediction, "computed", str(email_id)
+
+    (prediction, source, leader_id), shared = classification_flights.do(
+        (version, content_hash), compute
+    )
+    if shared:
+        source = "shared"
+    elif source == "computed":
+        shadow_evaluator.offer(email_data)
+    # The caller that ran the computation stores for its own email; waiting
+    # callers only need a row if they asked about a different email
+    if not shared or leader_id != str(email_id):
+        store_data(
+            "email_classifications",
+            [
+                EnronEmailClassifier.serialize_prediction(
+                    str(email_id),
+                    prediction,
+                    version or recorded_version(),
+                    content_hash,
+                )
+            ],
+        )
+    return prediction, source
+
+
+def classify_misses(misses, version):
+    """Classify several emails with no stored result, batched together
+
+    ``misses`` holds ``(email_id, email_data)`` pairs. Identical emails
+    already classified by ``version`` are reused; the rest are all submitted
+    to the micro-batcher before any result is awaited, so they share batches
+    instead of each paying INFERENCE_MAX_WAIT_MS. Results are stored in one
+    write. Returns ``{email_id: prediction}``, with ``{"error": ...}`` for an
+    email whose inference failed; that one is not stored.
+    """
+    predictions, futures, rows = {}, {}, []
+    for email_id, email_data in misses:
+        content_hash = classifier.content_hash(email_data)
+        duplicate = (
+            get_classification_by_hash(content_hash, version)
+            if version is not None
+            else None
+        )
+        if duplicate:
+            predictions[email_id] = EnronEmailClassifier.deserialize_prediction(
+                duplicate
+            )
+        else:
+            futures[email_id] = (inference_batcher.submit(email_data), email_data)
+        rows.append((email_id, content_hash))
+
+    for email_id, (future, email_data) in futures.items():
+        try:
+            predictions[email_id] = future.result()
+        except Exception as e:
+            predictions[email_id] = {"error": f"Error processing email: {str(e)}"}
+            continue
+        shadow_evaluator.offer(email_data)
+
+    rows = [row for row in rows if "error" not in predictions[row[0]]]
+    if rows:
+        store_data(
+            "email_classifications",
+            [
+                EnronEmailClassifier.serialize_prediction(
+                    email_id,
+                    predictions[email_id],
+                    version or recorded_version(),
+                    content_hash,
+                )
+                for email_id, content_hash in rows
+            ],
+        )
+    return predictions
+
+
+def email_row_to_data(email):
+    """Map an emails row from the database to the classifier's input format"""
+    email = dict(email)
+    return {
+        "email_id": email.get("id"),
+        "subject": email.get("subject") or "",
+        "body": email.get("body") or "",
+        "clean_body": email.get("clean_body"),
+        "clean_body_version": email.get("clean_body_version"),
+        "sender": email.get("from_address") or email.get("sender", ""),
+        "has_attachment": email.get("has_attachment", False),
+        "num_recipients": email.get("num_recipients", 1),
+        "time_sent": pd.to_datetime(
+            email.get("date") or email.get("time_sent") or "2000-01-01",
+            errors="coerce",
+        ),
+    }
+
+
 def classify_single_email(email_data):
     try:
         # Defensive coding as before
@@ -76,7 +264,9 @@ def classify_single_email(email_data):
         if "time_sent" in email_data:
             email_data["time_sent"] = pd.to_datetime(email_data["time_sent"])
 
-        prediction = classifier.predict(email_data)
+        # No email_id: client content must not enter the feature cache, which
+        # feedback and shadow evaluation read by stored email id
+        prediction = inference_batcher.predict({**email_data, "email_id": None})
 
         result = {
             "email_id": email_data.get("id", "unknown"),
@@ -84,6 +274,8 @@ def classify_single_email(email_data):
         }
 
         if "id" in email_data:
+            # Unversioned: the content comes from the client, not the emails
+            # table, so /email/<id> must not serve it as the stored result
             prediction_data = EnronEmailClassifier.serialize_prediction(
                 str(email_data["id"]), prediction
             )
@@ -111,7 +303,9 @@ def classify_batch():
             return jsonify({"error": "Expected a list of email objects"}), 400
 
         results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=allocation()["request_pool"]
+        ) as executor:
             results = list(executor.map(classify_single_email, data))
 
         return jsonify(results)
@@ -156,41 +350,41 @@ def classify_folder(username, folder):
             )
 
         results = []
+        misses = []
+        version = prediction_version()
         for email in emails:
             # Convert to format expected by classifier
-            email_data = {
-                "subject": email.get("subject", ""),
-                "body": email.get("body", ""),
-                "sender": email.get("sender", ""),
-                "has_attachment": email.get("has_attachment", False),
-                "num_recipients": email.get("num_recipients", 1),
-                "time_sent": pd.to_datetime(email.get("time_sent", "2000-01-01")),
-            }
+            email_data = email_row_to_data(email)
+            email_id = str(email_data["email_id"])
 
-            # Classify email
-            prediction = classifier.predict(email_data)
-
-            # Store result
-            email_id = str(email.get("id", "unknown"))
-            prediction_data = EnronEmailClassifier.serialize_prediction(
-                email_id, prediction
-            )
-            store_data("email_classifications", [prediction_data])
+            # Stored result for the current model, else classified below
+            prediction = stored_prediction(email_id, version)
+            if prediction is None:
+                misses.append((email_id, email_data))
 
             # Add to results
             results.append(
                 {
                     "email_id": email_id,
-                    "subject": email.get("subject", ""),
+                    "subject": email_data["subject"],
                     "classification": prediction,
                 }
             )
 
+        computed = classify_misses(misses, version)
+        for result in results:
+            if result["classification"] is None:
+                prediction = computed[result["email_id"]]
+                if "error" in prediction:
+                    result["error"] = prediction["error"]
+                else:
+                    result["classification"] = prediction
+
         return jsonify(
             {
                 "username": username,
                 "folder": folder,
-                "classified_count": len(results),
+                "classified_count": sum("error" not in r for r in results),
                 "results": results,
             }
         )
@@ -236,7 +430,10 @@ def analyze_text():
 
 @classify_bp.route("/train", methods=["POST"])
 def train_classifier():
-    """Train the classifier from the SQLite Enron DB at the given path"""
+    """Submit a background training job on the SQLite Enron DB at the given path
+
+    Returns 202 with a job id; poll /train/jobs/<job_id> for progress.
+    """
     try:
         data = request.get_json()
         if not data or "enron_dir" not in data:
@@ -247,82 +444,315 @@ def train_classifier():
                 400,
             )
 
-        # We're really passing the .db file here
-        enron_db = data["enron_dir"]
-        max_emails = data.get("max_emails", 5000)
-        analyze_only = data.get(
-            "analyze_only", False
-        )  # New parameter to just analyze without training
-
-        print(f"Loading emails from {enron_db} (max: {max_emails})")
+        active = training_jobs.active_job()
+        if active is not None and not data.get("queue", False):
+            return (
+                jsonify(
+                    {
+                        "error": "A training job is already queued or running. "
+                        "Pass 'queue': true to run after it.",
+                        "job": active.to_dict(),
+                    }
+                ),
+                409,
+            )
 
-        # Load emails from the database
-        email_df, labels = classifier.load_enron_emails(enron_db, max_emails=max_emails)
+        params = {
+            "enron_dir": data["enron_dir"],
+            "max_emails": data.get("max_emails"),
+            "analyze_only": data.get("analyze_only", False),
+            "streaming": data.get("streaming", False),
+            "chunk_size": data.get("chunk_size", 2048),
+            "epochs": data.get("epochs", 3),
+            "distill": data.get("distill"),
+            "latency_budget_ms": data.get("latency_budget_ms"),
+            "labels": data.get("labels", "stored"),
+        }
+        job = training_jobs.submit(run_training_job, params)
 
-        # Analyze the dataset
-        analysis = classifier.analyze_dataset(email_df, labels)
-        classifier.print_dataset_analysis(analysis)
+        return (
+            jsonify(
+                {
+                    "status": "accepted",
+                    "job_id": job.id,
+                    "status_url": f"/api/classify/train/jobs/{job.id}",
+                    "job": job.to_dict(),
+                }
+            ),
+            202,
+        )
 
-        # If only analyzing, return the analysis
-        if analyze_only:
-            return jsonify(
+    except Exception as e:
+        return (
+            jsonify(
                 {
-                    "status": "analysis_complete",
-                    "analysis": analysis,
-                    "message": "Dataset analysis completed. Set 'analyze_only': false to proceed with training.",
+                    "error": f"Could not start training: {str(e)}",
+                    "traceback": traceback.format_exc(),
                 }
+            ),
+            500,
+        )
+
+
+def run_training_job(job):
+    """Body of a training job; runs on the TrainingJobManager worker thread"""
+    try:
+        return _run_training(job)
+    finally:
+        # Encoder worker processes (ENCODER_WORKERS) are only needed while training
+        classifier.close_encoding_pool()
+
+
+def _run_training(job):
+    params = job.params
+    enron_db = params["enron_dir"]
+
+    # Fast mode: hashed n-grams + linear model, always trained out of core
+    if classifier.mode == "fast":
+        stats = classifier.train_fast(
+            enron_db,
+            max_emails=params["max_emails"],
+            labels=params["labels"],
+            epochs=params["epochs"],
+            progress=job.report,
+        )
+        return {
+            "message": "Fast-mode classifier trained",
+            "training_stats": stats,
+            "model_version": classifier.model_version,
+        }
+
+    # Out-of-core path: chunked featurisation + incremental linear model
+    if params["streaming"]:
+        trainer = StreamingTrainer(
+            classifier,
+            enron_db,
+            chunk_size=params["chunk_size"],
+            epochs=params["epochs"],
+        )
+        trainer.progress = job.report
+        stats = trainer.run(max_emails=params["max_emails"])
+        return {
+            "message": "Classifier trained with the streaming trainer",
+            "training_stats": stats,
+            "model_version": classifier.model_version,
+        }
+
+    max_emails = params["max_emails"] or 5000
+    print(f"Loading emails from {enron_db} (max: {max_emails})")
+
+    # Load emails from the database
+    email_df, labels = classifier.load_enron_emails(
+        enron_db, max_emails=max_emails, progress=job.report
+    )
+
+    # Analyze the dataset
+    analysis = classifier.analyze_dataset(email_df, labels)
+    classifier.print_dataset_analysis(analysis)
+
+    # If only analyzing, return the analysis
+    if params["analyze_only"]:
+        return {
+            "message": "Dataset analysis completed. "
+            "Set 'analyze_only': false to proceed with training.",
+            "analysis": analysis,
+        }
+
+    # Check if we have enough data to train
+    if analysis["total_emails"] < 10:
+        raise ValueError(
+            "Not enough emails to train the model. Need at least 10 emails."
+        )
+
+    if analysis["categories_to_filter"] == analysis["total_categories"]:
+        raise ValueError(
+            "All categories have insufficient samples. Cannot train model."
+        )
+
+    # Train the classifier; the new model is swapped in only when complete
+    print("Starting training process...")
+    classifier.train(
+        email_df,
+        labels,
+        progress=job.report,
+        distill=params["distill"],
+        latency_budget_ms=params["latency_budget_ms"],
+    )
+
+    return {
+        "message": "Classifier trained successfully",
+        "training_stats": {
+            "total_emails_loaded": len(email_df),
+            "categories_available": len(classifier.categories),
+            "model_categories": (
+                len(classifier.label_encoder.classes_)
+                if hasattr(classifier.label_encoder, "classes_")
+                else 0
+            ),
+        },
+        "analysis": analysis,
+        "model_version": classifier.model_version,
+        "distillation": (
+            classifier.model_manifest["metadata"].get("distillation")
+            if classifier.model_manifest
+            else None
+        ),
+    }
+
+
+@classify_bp.route("/train/jobs", methods=["GET"])
+def list_training_jobs():
+    """List recent training jobs, newest first"""
+    return jsonify({"jobs": training_jobs.list()})
+
+
+@classify_bp.route("/train/jobs/<job_id>", methods=["GET"])
+def get_training_job(job_id):
+    """Status, stage progress and result of a training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Training job {job_id} not found"}), 404
+    return jsonify(job)
+
+
+@classify_bp.route("/train/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_training_job(job_id):
+    """Cancel a queued or running job; it stops at its next progress report"""
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Training job {job_id} not found"}), 404
+    return jsonify(job)
+
+
+@classify_bp.route("/feedback", methods=["POST"])
+def classification_feedback():
+    """Apply user corrections to the online head incrementally
+
+    Expected JSON: {"email_id": 123, "category": "financial"} or a list of them.
+    An "email" object with subject/body/... may be given instead of email_id.
+    Returns 409 unless the online head is what serves predictions, since an
+    update would otherwise have no effect.
+    """
+    try:
+        data = request.get_json()
+        items = data if isinstance(data, list) else [data]
+        if not items or not all(
+            isinstance(item, dict) and "category" in item for item in items
+        ):
+            return (
+                jsonify({"error": "Expected JSON with 'category' and 'email_id'"}),
+                400,
             )
 
-        # Check if we have enough data to train
-        if analysis["total_emails"] < 10:
+        if classifier.online_model is None:
             return (
                 jsonify(
-                    {
-                        "error": "Not enough emails to train the model. Need at least 10 emails.",
-                        "analysis": analysis,
-                    }
+                    {"error": "No online head available. Please retrain the model."}
                 ),
-                400,
+                409,
             )
-
-        if analysis["categories_to_filter"] == analysis["total_categories"]:
+        if not classifier.serving_online_head:
+            # With CLASSIFIER_HEAD=auto the head only serves when the trained
+            # model is itself a linear head (e.g. from the streaming trainer)
             return (
                 jsonify(
                     {
-                        "error": "All categories have insufficient samples. Cannot train model.",
-                        "analysis": analysis,
+                        "error": "The online head is not serving predictions, so "
+                        "feedback would have no effect. Set CLASSIFIER_HEAD=online "
+                        "or train a linear model (streaming trainer) to use it.",
+                        "online_head": online_learner.status(),
                     }
                 ),
-                400,
+                409,
             )
 
-        # Train the classifier
-        print("Starting training process...")
-        classifier.train(email_df, labels)
+        results = []
+        feedback_rows = []
+        for item in items:
+            email_id = item.get("email_id")
+            email_data = item.get("email")
+            if email_data is None and email_id is not None:
+                email = get_email_by_id(email_id)
+                if not email:
+                    results.append({"email_id": email_id, "error": "Email not found"})
+                    continue
+                email_data = email_row_to_data(email)
+            elif email_data is not None and "time_sent" in email_data:
+                email_data["time_sent"] = pd.to_datetime(
+                    email_data["time_sent"], errors="coerce"
+                )
+
+            features = online_learner.features_for(email_id, email_data)
+            if features is None:
+                results.append(
+                    {"email_id": email_id, "error": "No email to learn from"}
+                )
+                continue
+
+            try:
+                result = online_learner.apply_feedback(features, item["category"])
+            except ValueError as e:
+                results.append({"email_id": email_id, "error": str(e)})
+                continue
+
+            results.append({"email_id": email_id, **result})
+            if email_id is not None:
+                feedback_rows.append(
+                    {
+                        "email_id": str(email_id),
+                        "category": item["category"],
+                        "model_version": classifier.model_version,
+                    }
+                )
 
-        return jsonify(
-            {
-                "status": "success",
-                "message": f"Classifier trained successfully",
-                "training_stats": {
-                    "total_emails_loaded": len(email_df),
-                    "categories_available": len(classifier.categories),
-                    "model_categories": (
-                        len(classifier.label_encoder.classes_)
-                        if hasattr(classifier.label_encoder, "classes_")
-                        else 0
-                    ),
-                },
-                "analysis": analysis,
-                "categories": classifier.categories,
-            }
+        if feedback_rows:
+            store_data("classification_feedback", feedback_rows)
+
+        return jsonify({"results": results, "online_head": online_learner.status()})
+
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Feedback failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
+
+
+@classify_bp.route("/categories", methods=["GET"])
+def get_categories():
+    """The active category taxonomy"""
+    return jsonify({"categories": classifier.categories})
+
+
+@classify_bp.route("/categories/reload", methods=["POST"])
+def reload_categories():
+    """Hot-reload the category taxonomy without re-encoding the corpus
+
+    Expected JSON: {"categories": {...}}; without "categories" the
+    CATEGORIES_FILE taxonomy is reloaded (arbitrary paths are not accepted).
+    Optional: "apply" (default true; false only previews the relabelling)
+    and "update_store" (default true; relabel the streaming feature store).
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        report = classifier.reload_categories(
+            categories=data.get("categories"),
+            apply=data.get("apply", True),
+            update_store=data.get("update_store", True),
         )
+        return jsonify({"status": "success", **report})
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return (
             jsonify(
                 {
-                    "error": f"Training failed: {str(e)}",
+                    "error": f"Category reload failed: {str(e)}",
                     "traceback": traceback.format_exc(),
                 }
             ),
@@ -338,11 +768,125 @@ def model_status():
     return jsonify(
         {
             "is_trained": is_trained,
+            "mode": classifier.mode,
             "categories": classifier.categories if is_trained else None,
+            "model_version": classifier.model_version,
+            "model_created_at": (
+                classifier.model_manifest["created_at"]
+                if classifier.model_manifest
+                else None
+            ),
+            "load_error": classifier.model_load_error,
+            "online_head": online_learner.status(),
+            "text_normalization": normalization_stats(),
+            "inference_batcher": inference_batcher.status(),
+            "classification_flights": {
+                "in_flight": classification_flights.in_flight(),
+                "shared_calls": classification_flights.shared_calls,
+            },
+            "registry": {"active": classifier.registry.active()},
+            "shadow_evaluation": shadow_evaluator.status(),
+        }
+    )
+
+
+@classify_bp.route("/models", methods=["GET"])
+def list_models():
+    """Registered model versions with the active and shadow pointers"""
+    return jsonify(
+        {
+            "mode": classifier.mode,
+            "serving": classifier.model_version,
+            "active": classifier.registry.active(),
+            "shadow": classifier.registry.shadow,
+            "versions": classifier.registry.versions(),
         }
     )
 
 
+@classify_bp.route("/models/<model_version>/activate", methods=["POST"])
+def activate_model(model_version):
+    """Make a registered version the active one (rollout or rollback)
+
+    The version is swapped in for this process; other worker processes
+    follow the registry's active pointer (see sync_published).
+    """
+    try:
+        entry = classifier.activate_version(model_version)
+        return jsonify(
+            {
+                "status": "success",
+                "activated": entry,
+                "serving": classifier.model_version,
+            }
+        )
+
+    except ArtifactError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Activation failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
+
+
+@classify_bp.route("/models/shadow", methods=["POST", "DELETE"])
+def shadow_model():
+    """Set (POST) or clear (DELETE) the shadow version
+
+    Expected JSON for POST: {"version": "...", "sample_rate": 0.1}.
+    """
+    if request.method == "DELETE":
+        classifier.registry.clear_shadow()
+        return jsonify({"status": "success", "shadow": None})
+
+    try:
+        data = request.get_json(silent=True) or {}
+        if "version" not in data:
+            return jsonify({"error": "Expected JSON with 'version'"}), 400
+        shadow = classifier.registry.set_shadow(
+            data["version"],
+            float(data.get("sample_rate", DEFAULT_SHADOW_SAMPLE_RATE)),
+        )
+        return jsonify({"status": "success", "shadow": shadow})
+
+    except ArtifactError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@classify_bp.route("/models/shadow/report", methods=["GET"])
+def shadow_report():
+    """Agreement, latency and feedback accuracy of the shadow vs. active model
+
+    ``?version=`` reports on an earlier shadow version instead.
+    """
+    try:
+        return jsonify(
+            {
+                **shadow_evaluator.report(request.args.get("version")),
+                "evaluator": shadow_evaluator.status(),
+            }
+        )
+
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Shadow report failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
+
+
 def get_dominant_tone(analysis):
     """Determine the dominant tone based on analysis scores"""
     # Get the highest scoring tone
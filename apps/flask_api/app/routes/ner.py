@@ -1,4 +1,6 @@
 from flask import Blueprint, request, jsonify
+from app.services.db import get_email_by_id
+from app.services.email_cleaning import clean_body_of
 from app.services.ner_engine import Extractor
 
 ner_bp = Blueprint("ner", __name__)
@@ -12,6 +14,8 @@ def extract_entities():
         "email_text": "<full email text>",
         "email_id":   "abc123"
     }
+    "email_text" may be omitted for a stored email; its precomputed clean
+    body is used instead.
 
     Response (200):
     {
@@ -25,11 +29,17 @@ def extract_entities():
     data = request.get_json()
 
     # ── validation ───────────────────────────────────────────────────────────
-    if not data or "email_text" not in data:
+    if not data or ("email_text" not in data and "email_id" not in data):
         return jsonify({"error": "Missing required parameter: email_text"}), 400
 
-    email_text = data["email_text"]
     email_id   = data.get("email_id")
+    if "email_text" in data:
+        email_text = data["email_text"]
+    else:
+        email = get_email_by_id(email_id)
+        if not email:
+            return jsonify({"error": f"Email with id {email_id} not found"}), 404
+        email_text = clean_body_of(dict(email))
 
     # ── run NER ──────────────────────────────────────────────────────────────
     extractor = Extractor()
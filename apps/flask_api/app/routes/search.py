@@ -0,0 +1,130 @@
+from flask import Blueprint, request, jsonify
+from app.routes.classify import classifier
+from app.services.db import get_email_by_id, get_email_cluster, get_email_summaries
+from app.services.email_cleaning import clean_body_of
+import time
+import traceback
+
+search_bp = Blueprint("search", __name__)
+
+MAX_K = 100
+
+
+def _hits_response(ids, scores, start):
+    summaries = get_email_summaries([int(i) for i in ids])
+    results = []
+    for email_id, score in zip(ids, scores):
+        result = summaries.get(int(email_id), {"id": int(email_id)})
+        result["score"] = round(float(score), 4)
+        results.append(result)
+    return {
+        "results": results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2),
+        "index_size": len(classifier.ann_index),
+    }
+
+
+def _search_args():
+    k = min(max(request.args.get("k", 10, type=int), 1), MAX_K)
+    nprobe = request.args.get("nprobe", None, type=int)
+    return k, nprobe
+
+
+@search_bp.route("/email/<int:email_id>/similar", methods=["GET"])
+def similar_emails(email_id):
+    """Emails whose MiniLM embedding is closest to the given email's"""
+    try:
+        if classifier.ann_index is None:
+            return (
+                jsonify({"error": "No similarity index. Please train the model."}),
+                503,
+            )
+        start = time.perf_counter()
+        k, nprobe = _search_args()
+
+        query = classifier.ann_index.vector_for(email_id)
+        if query is None:
+            # Not indexed yet (e.g. a newer email): embed it on the fly
+            email = get_email_by_id(email_id)
+            if not email:
+                return jsonify({"error": f"Email with id {email_id} not found"}), 404
+            query = classifier.embed_text(
+                f"{email['subject'] or ''} {clean_body_of(dict(email))}"
+            )
+
+        ids, scores = classifier.ann_index.search(
+            query, k=k, nprobe=nprobe, exclude_ids={email_id}
+        )
+        response = _hits_response(ids, scores, start)
+        response["email_id"] = email_id
+        return jsonify(response)
+
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Similarity search failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
+
+
+@search_bp.route("/email/<int:email_id>/duplicates", methods=["GET"])
+def duplicate_emails(email_id):
+    """The email's near-duplicate cluster (see app.services.near_duplicates)"""
+    try:
+        limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+        cluster = get_email_cluster(email_id, limit=limit)
+        summaries = get_email_summaries([m["email_id"] for m in cluster["members"]])
+        for member in cluster["members"]:
+            member.update(summaries.get(member["email_id"], {}))
+            member["representative"] = member["email_id"] == cluster["cluster_id"]
+        cluster["email_id"] = email_id
+        return jsonify(cluster)
+
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Duplicate lookup failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
+
+
+@search_bp.route("/search/semantic", methods=["GET"])
+def semantic_search():
+    """Free-text semantic search over the indexed emails: ?q=...&k=10"""
+    try:
+        q = request.args.get("q", "").strip()
+        if not q:
+            return jsonify({"error": "Expected a non-empty 'q' parameter"}), 400
+        if classifier.ann_index is None:
+            return (
+                jsonify({"error": "No similarity index. Please train the model."}),
+                503,
+            )
+        start = time.perf_counter()
+        k, nprobe = _search_args()
+
+        ids, scores = classifier.ann_index.search(
+            classifier.embed_text(q), k=k, nprobe=nprobe
+        )
+        response = _hits_response(ids, scores, start)
+        response["query"] = q
+        return jsonify(response)
+
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Semantic search failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
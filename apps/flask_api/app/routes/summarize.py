@@ -1,4 +1,6 @@
 from flask import Blueprint, request, jsonify
+from app.services.db import get_email_by_id
+from app.services.email_cleaning import clean_body_of
 from app.services.summarizer import EmailSummarizer
 
 summarize_bp = Blueprint("summarize", __name__)
@@ -17,6 +19,9 @@ def summarize_email():
         "num_sentences": 3  # Optional, defaults to 3
     }
 
+    Instead of "email_text", an "email_id" summarizes the stored email from
+    its precomputed clean body.
+
     Returns:
     {
         "summary": "Summarized email text"
@@ -24,13 +29,24 @@ def summarize_email():
     """
     data = request.get_json()
 
-    if not data or "email_text" not in data:
+    if not data or ("email_text" not in data and "email_id" not in data):
         return jsonify({"error": "Missing required parameter: email_text"}), 400
 
-    email_text = data.get("email_text")
     num_sentences = data.get("num_sentences", 3)
+    cleaned = False
+    if "email_text" in data:
+        email_text = data.get("email_text")
+    else:
+        email = get_email_by_id(data["email_id"])
+        if not email:
+            return (
+                jsonify({"error": f"Email with id {data['email_id']} not found"}),
+                404,
+            )
+        email_text = clean_body_of(dict(email))
+        cleaned = True
 
     summarizer = EmailSummarizer()
-    summary = summarizer.summarize_email(email_text, num_sentences)
+    summary = summarizer.summarize_email(email_text, num_sentences, cleaned)
 
     return jsonify({"summary": summary})
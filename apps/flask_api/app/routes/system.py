@@ -0,0 +1,22 @@
+import os
+
+from flask import Blueprint, jsonify
+from app.services.process_memory import memory_usage, serving_memory
+from app.services.profiling import stage_histograms
+
+system_bp = Blueprint("system", __name__)
+
+
+@system_bp.route("/memory")
+def process_memory():
+    """RSS / PSS / USS of this process, or of every worker when pre-forked"""
+    master_pid = os.getenv("SERVE_MASTER_PID")
+    if master_pid is None:
+        return jsonify({"mode": "single-process", "process": memory_usage()})
+    return jsonify({"mode": "pre-fork", **serving_memory(int(master_pid))})
+
+
+@system_bp.route("/metrics")
+def inference_metrics():
+    """Rolling per-stage latency histograms of profiled inference requests"""
+    return jsonify({"pid": os.getpid(), **stage_histograms.snapshot()})
@@ -0,0 +1,199 @@
+import threading
+import traceback
+
+from flask import Blueprint, jsonify, request
+from app.routes.classify import classifier, training_jobs
+from app.services.db import DB_PATH, get_db_connection, get_email_summaries
+from app.services.model_artifacts import readable_dir
+from app.services.topics import (
+    TOPICS_DIR,
+    assign_new_emails,
+    ensure_topic_tables,
+    load_topic_model,
+    topic_members,
+    topic_sizes,
+    user_topic_counts,
+)
+
+topics_bp = Blueprint("topics", __name__)
+
+_model_lock = threading.Lock()
+_loaded = {"mtime": None, "model": None}
+
+
+def current_topic_model():
+    """The persisted topic model, reloaded when a rebuild replaces it"""
+    if classifier.encoder is None:
+        return None
+    topics_dir = readable_dir(classifier.model_dir / TOPICS_DIR, "meta.json")
+    meta_path = topics_dir / "meta.json"
+    try:
+        mtime = meta_path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _model_lock:
+        if _loaded["mtime"] != mtime:
+            _loaded["model"] = load_topic_model(
+                classifier.model_dir, classifier.feature_spec()["embedding"]
+            )
+            _loaded["mtime"] = mtime
+        return _loaded["model"]
+
+
+def _no_topics():
+    return (
+        jsonify(
+            {
+                "error": "No topic model. Build one with "
+                "`python -m app.services.topics`."
+            }
+        ),
+        503,
+    )
+
+
+@topics_bp.route("", methods=["GET"])
+def list_topics():
+    """All topics with their labels and sizes; ?user=<username> adds that
+    user's topic distribution"""
+    try:
+        model = current_topic_model()
+        if model is None:
+            return _no_topics()
+        username = request.args.get("user")
+
+        conn = get_db_connection()
+        try:
+            ensure_topic_tables(conn)
+            sizes = topic_sizes(conn)
+            counts = user_topic_counts(conn, username) if username else None
+        finally:
+            conn.close()
+
+        topics = [
+            {**topic, "size": int(sizes.get(topic["topic_id"], 0))}
+            for topic in model.topics
+        ]
+        response = {
+            "version": model.meta.get("version"),
+            "built_at": model.meta.get("built_at"),
+            "n_topics": len(topics),
+            "topics": topics,
+        }
+        if username:
+            total = sum(counts.values())
+            response["user"] = username
+            response["user_emails"] = total
+            response["distribution"] = [
+                {
+                    "topic_id": topic_id,
+                    "label": topics[topic_id]["label"],
+                    "n_emails": n,
+                    "share": round(n / total, 4),
+                }
+                for topic_id, n in counts.items()
+                if topic_id < len(topics)
+            ]
+        return jsonify(response)
+
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Listing topics failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
+
+
+@topics_bp.route("/<int:topic_id>", methods=["GET"])
+def get_topic(topic_id):
+    """A topic's label terms and its most central emails (?limit=20)"""
+    try:
+        model = current_topic_model()
+        if model is None:
+            return _no_topics()
+        if not 0 <= topic_id < len(model.topics):
+            return jsonify({"error": f"Topic {topic_id} not found"}), 404
+        limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+
+        conn = get_db_connection()
+        try:
+            ensure_topic_tables(conn)
+            members = topic_members(conn, topic_id, limit)
+            size = topic_sizes(conn).get(topic_id, 0)
+        finally:
+            conn.close()
+
+        summaries = get_email_summaries([email_id for email_id, _ in members])
+        emails = []
+        for email_id, score in members:
+            email = summaries.get(email_id, {"id": email_id})
+            email["score"] = score
+            emails.append(email)
+        return jsonify({**model.topics[topic_id], "size": size, "emails": emails})
+
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Topic lookup failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
+
+
+@topics_bp.route("/assign", methods=["POST"])
+def assign_topics():
+    """Assign newly ingested emails to the existing topics
+
+    Accepts an optional JSON body ``{"max_emails": 1000}``. The emails are
+    embedded by a background job on the training queue: returns 202 with a
+    job id; poll or cancel it under /api/classify/train/jobs/<job_id>.
+    """
+    try:
+        model = current_topic_model()
+        if model is None:
+            return _no_topics()
+        data = request.get_json(silent=True) or {}
+        params = {
+            "task": "topic_assignment",
+            "max_emails": int(data.get("max_emails", 1000)),
+        }
+
+        def run_assignment(job):
+            return assign_new_emails(
+                classifier,
+                model,
+                DB_PATH,
+                max_emails=job.params["max_emails"],
+                progress=job.report,
+            )
+
+        job = training_jobs.submit(run_assignment, params)
+        return (
+            jsonify(
+                {
+                    "status": "accepted",
+                    "job_id": job.id,
+                    "status_url": f"/api/classify/train/jobs/{job.id}",
+                    "job": job.to_dict(),
+                }
+            ),
+            202,
+        )
+
+    except Exception as e:
+        return (
+            jsonify(
+                {
+                    "error": f"Topic assignment failed: {str(e)}",
+                    "traceback": traceback.format_exc(),
+                }
+            ),
+            500,
+        )
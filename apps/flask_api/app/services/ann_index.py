@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Approximate nearest-neighbour search over email embeddings.
+
+An inverted-file (IVF) index in plain numpy: spherical k-means splits the
+corpus into ``nlist`` cells, vectors are stored contiguously per cell, and a
+query only scans the ``nprobe`` cells whose centroids are closest to it.
+Vectors are kept as int8 codes by default (see embedding_store), a quarter of
+the float32 size. The index is persisted as .npy files under models/ann_index
+and memory-mapped on load, so every worker shares the same pages.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_store import QuantizedEmbeddings, measure_recall
+from app.services.model_artifacts import readable_dir, staging_dir, swap_in_dir
+
+ANN_FORMAT_VERSION = 2
+ANN_INDEX_DIR = "ann_index"
+
+DEFAULT_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# "int8" (scalar quantized codes) or "none" (float32)
+DEFAULT_QUANTIZATION = os.getenv("ANN_QUANTIZATION", "int8")
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray, block_size: int = 65536):
+    """Index of the most similar centroid for every row, in blocks"""
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), block_size):
+        block = _normalize(x[start : start + block_size])
+        out[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(
+    x: np.ndarray, nlist: int, n_iter: int = 10, seed: int = 42
+) -> np.ndarray:
+    """Unit-norm centroids maximising cosine similarity to their members"""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=nlist, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        empty = np.bincount(labels, minlength=nlist) == 0
+        # Re-seed empty cells with random points so no list is wasted
+        sums[empty] = x[rng.choice(len(x), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index of unit-normalised vectors keyed by email id
+
+    ``vectors`` is either a float32 array or a QuantizedEmbeddings store.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        offsets: np.ndarray,
+        meta: Dict[str, Any],
+    ):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.meta = meta
+        # Position of each id in ``ids``, for looking up stored vectors
+        self._id_order = np.argsort(ids, kind="stable")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def quantized(self) -> bool:
+        return isinstance(self.vectors, QuantizedEmbeddings)
+
+    def dense_vectors(self, rows=slice(None)) -> np.ndarray:
+        """Float32 unit vectors for ``rows`` (dequantized if needed)"""
+        if self.quantized:
+            return self.vectors.dequantize(rows)
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def cosine_similarity(self, queries: np.ndarray, rows=None) -> np.ndarray:
+        """``(n_rows, n_queries)`` cosine scores of stored vectors to ``queries``"""
+        if self.quantized:
+            return self.vectors.cosine_similarity(queries, rows=rows)
+        queries = _normalize(np.atleast_2d(queries))
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        return np.asarray(vectors @ queries.T, dtype=np.float32)
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        ids: np.ndarray,
+        nlist: Optional[int] = None,
+        sample_size: int = 100_000,
+        n_iter: int = 10,
+        meta: Optional[Dict[str, Any]] = None,
+        seed: int = 42,
+        quantization: str = DEFAULT_QUANTIZATION,
+    ) -> "IVFIndex":
+        """Cluster ``embeddings`` and lay them out cell by cell"""
+        start = time.perf_counter()
+        n = len(embeddings)
+        if n == 0:
+            raise ValueError("Cannot build an index over zero embeddings")
+        # ~4·sqrt(n) cells keeps both the centroid scan and each cell small
+        nlist = int(min(nlist or max(1, 4 * int(np.sqrt(n))), n))
+
+        rng = np.random.default_rng(seed)
+        sample_idx = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+        sample = _normalize(embeddings[sample_idx])
+        centroids = spherical_kmeans(sample, nlist, n_iter=n_iter, seed=seed)
+
+        labels = _assign(embeddings, centroids)
+        order = np.argsort(labels, kind="stable")
+        vectors = np.empty((n, embeddings.shape[1]), dtype=np.float32)
+        for block in range(0, n, 65536):
+            rows = order[block : block + 65536]
+            vectors[block : block + len(rows)] = _normalize(embeddings[rows])
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+
+        quantization_meta = {"type": "none", "bytes": int(vectors.nbytes)}
+        if quantization == "int8":
+            quantized = QuantizedEmbeddings.from_float(vectors)
+            quantization_meta = {
+                "type": "int8",
+                "bytes": int(quantized.nbytes),
+                "float32_bytes": int(vectors.nbytes),
+                **measure_recall(vectors, quantized),
+            }
+            print(
+                f"[IVFIndex] int8 vectors: {quantized.nbytes / 2**20:.0f} MB "
+                f"(float32 {vectors.nbytes / 2**20:.0f} MB), exact recall@"
+                f"{quantization_meta['k']} {quantization_meta['recall_at_k']}"
+            )
+            vectors = quantized
+
+        meta = dict(meta or {})
+        meta.update(
+            {
+                "format_version": ANN_FORMAT_VERSION,
+                "n_vectors": int(n),
+                "dim": int(embeddings.shape[1]),
+                "nlist": nlist,
+                "quantization": quantization_meta,
+                "built_at": datetime.now(timezone.utc).isoformat(),
+                "build_seconds": round(time.perf_counter() - start, 2),
+            }
+        )
+        print(
+            f"[IVFIndex] Built {nlist} lists over {n:,} vectors "
+            f"in {meta['build_seconds']}s"
+        )
+        return cls(
+            centroids, vectors, np.asarray(ids, dtype=np.int64)[order], offsets, meta
+        )
+
+    def vector_for(self, email_id: int) -> Optional[np.ndarray]:
+        pos = np.searchsorted(self.ids, email_id, sorter=self._id_order)
+        if pos < len(self.ids) and self.ids[self._id_order[pos]] == email_id:
+            return self.dense_vectors([self._id_order[pos]])[0]
+        return None
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        exclude_ids=(),
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(email_ids, cosine_scores)`` of the top ``k`` matches"""
+        query = _normalize(query).reshape(-1)
+        nprobe = int(min(nprobe or DEFAULT_NPROBE, self.nlist))
+
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        candidates = [
+            np.arange(self.offsets[cell], self.offsets[cell + 1]) for cell in probe
+        ]
+        rows = np.concatenate(candidates) if candidates else np.zeros(0, np.int64)
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores = self.cosine_similarity(query[None, :], rows=rows)[:, 0]
+        if exclude_ids:
+            scores[np.isin(self.ids[rows], list(exclude_ids))] = -np.inf
+
+        top = min(k, len(rows))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        best = best[np.isfinite(scores[best])]
+        return self.ids[rows[best]], scores[best]
+
+    # ── persistence ─────────────────────────────────────────────────────────
+    def save(self, index_dir: Path):
+        """Write the index to a staging directory, then swap it in"""
+        tmp_dir = staging_dir(index_dir)
+
+        np.save(tmp_dir / "centroids.npy", self.centroids)
+        if self.quantized:
+            self.vectors.save(tmp_dir)
+        else:
+            np.save(tmp_dir / "vectors.npy", self.vectors)
+        np.save(tmp_dir / "ids.npy", self.ids)
+        np.save(tmp_dir / "offsets.npy", self.offsets)
+        with open(tmp_dir / "meta.json", "w") as f:
+            json.dump(self.meta, f, indent=2)
+        swap_in_dir(tmp_dir, index_dir)
+
+    @classmethod
+    def load(cls, index_dir: Path, mmap_mode: Optional[str] = "r") -> "IVFIndex":
+        index_dir = readable_dir(index_dir, "meta.json")
+        with open(index_dir / "meta.json") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != ANN_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported ANN index format {meta.get('format_version')}"
+            )
+        if meta.get("quantization", {}).get("type") == "int8":
+            vectors = QuantizedEmbeddings.load(index_dir, mmap_mode=mmap_mode)
+        else:
+            vectors = np.load(index_dir / "vectors.npy", mmap_mode=mmap_mode)
+        return cls(
+            np.load(index_dir / "centroids.npy"),
+            vectors,
+            np.load(index_dir / "ids.npy"),
+            np.load(index_dir / "offsets.npy"),
+            meta,
+        )
+
+
+def load_index(model_dir: Path, embedding_spec: Dict[str, Any]) -> Optional[IVFIndex]:
+    """Load the persisted index if it was built with the current encoder"""
+    index_dir = readable_dir(Path(model_dir) / ANN_INDEX_DIR, "meta.json")
+    if not (index_dir / "meta.json").exists():
+        return None
+    try:
+        index = IVFIndex.load(index_dir)
+    except Exception as e:
+        print(f"Error loading ANN index: {e}")
+        return None
+    if index.meta.get("embedding") != embedding_spec:
+        print(
+            f"Ignoring ANN index built with {index.meta.get('embedding')} "
+            f"(runtime encoder is {embedding_spec})"
+        )
+        return None
+    print(f"Loaded ANN index: {len(index):,} emails, {index.nlist} lists")
+    return index
+
+
+def build_from_feature_store(
+    classifier, store_dir: Optional[Path] = None, nlist: Optional[int] = None
+) -> IVFIndex:
+    """Build and save an index from the streaming trainer's feature store"""
+    from app.services.streaming_trainer import StreamingTrainer
+
+    trainer = StreamingTrainer(classifier, db_path=None, store_dir=store_dir)
+    features, _, email_ids, meta = trainer.open_store()
+    dim = meta["feature_spec"]["embedding"]["dim"]
+    index = IVFIndex.build(
+        features[:, :dim],
+        email_ids,
+        nlist=nlist,
+        meta={"embedding": meta["feature_spec"]["embedding"], "source": "store"},
+    )
+    classifier.publish_ann_index(index)
+    return index
+
+
+def main():
+    from app.services.enron_classifier import EnronEmailClassifier
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--store-dir", default=None)
+    parser.add_argument("--nlist", type=int, default=None)
+    args = parser.parse_args()
+
+    classifier = EnronEmailClassifier(model_dir=args.model_dir)
+    index = build_from_feature_store(classifier, args.store_dir, nlist=args.nlist)
+    print(json.dumps(index.meta, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Resumable offline classification of the whole Enron corpus.
+
+Emails are streamed from SQLite in id order, classified a chunk at a time
+with the classifier's batched path (predict_frame) and written to
+email_classifications in one transaction per chunk, together with a
+checkpoint of the last id processed. An interrupted run resumes from that
+checkpoint, and emails already classified by the current model version are
+skipped, so the job can simply be restarted until it reports nothing left.
+
+When near-duplicate clusters have been built (app.services.near_duplicates),
+only each cluster's representative is classified; the other members get a
+copy of its category with their own emotion scores. Copies are stored
+without a content hash, so they are never reused as exact duplicates.
+
+    python -m app.services.bulk_classifier --db ../SQLite_db/enron.db
+"""
+import argparse
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from app.services.db import (
+    CLASSIFICATION_INSERT,
+    ensure_aux_tables,
+    ensure_email_schema,
+)
+from app.services.email_cleaning import clean_body_of
+from app.services.email_features import (
+    FEATURE_JOIN,
+    METADATA_FEATURES,
+    STORED_FEATURE_COLUMNS,
+    ensure_feature_table,
+    stored_metadata,
+)
+
+EMOTION_FIELDS = ("polarity", "subjectivity", "stress_score", "relaxation_score")
+
+# Emails the current model version has not classified yet, in id order
+PENDING_QUERY = f"""
+    SELECT
+        e.id AS email_id,
+        e.from_address AS sender,
+        e.subject AS subject,
+        e.body AS body,
+        e.clean_body AS clean_body,
+        e.clean_body_version AS clean_body_version,
+        e.date AS time_sent,
+        k.cluster_id AS cluster_id,
+        {STORED_FEATURE_COLUMNS}
+    FROM emails e
+    LEFT JOIN email_classifications c ON c.email_id = CAST(e.id AS TEXT)
+    LEFT JOIN email_clusters k ON k.email_id = e.id
+    {FEATURE_JOIN}
+    WHERE e.id > ? AND (c.model_version IS NULL OR c.model_version != ?)
+    ORDER BY e.id
+    LIMIT ?
+"""
+
+
+class BulkClassifier:
+    """Classify every email in enron.db with the serving model, resumably"""
+
+    def __init__(
+        self,
+        classifier,
+        db_path: str,
+        chunk_size: int = 4096,
+        with_transformer: bool = False,
+        dedupe: bool = True,
+    ):
+        self.classifier = classifier
+        self.db_path = db_path
+        self.chunk_size = chunk_size
+        self.with_transformer = with_transformer
+        self.dedupe = dedupe
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        ensure_email_schema(conn)
+        ensure_aux_tables(conn)
+        ensure_feature_table(conn)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bulk_classification_checkpoints (
+                model_version TEXT PRIMARY KEY,
+                last_email_id INTEGER NOT NULL,
+                classified INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """
+        )
+        # Each chunk is committed as a whole; the checkpoint makes it durable
+        # enough to resume, so per-statement fsyncs are not needed
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def _checkpoint(conn: sqlite3.Connection, model_version: str):
+        row = conn.execute(
+            "SELECT last_email_id, classified FROM bulk_classification_checkpoints "
+            "WHERE model_version = ?",
+            (model_version,),
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def _count_pending(
+        self, conn: sqlite3.Connection, last_id: int, model_version: str
+    ) -> int:
+        return conn.execute(
+            """
+            SELECT COUNT(*) FROM emails e
+            LEFT JOIN email_classifications c ON c.email_id = CAST(e.id AS TEXT)
+            WHERE e.id > ? AND (c.model_version IS NULL OR c.model_version != ?)
+            """,
+            (last_id, model_version),
+        ).fetchone()[0]
+
+    def _stored_predictions(
+        self, conn: sqlite3.Connection, email_ids, model_version: str
+    ) -> Dict[int, Dict[str, Any]]:
+        """Stored predictions of ``model_version`` for the given emails"""
+        email_ids = [str(email_id) for email_id in email_ids]
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(email_ids), 900):
+            batch = email_ids[i : i + 900]
+            placeholders = ",".join("?" for _ in batch)
+            cursor = conn.execute(
+                f"SELECT * FROM email_classifications "
+                f"WHERE model_version = ? AND email_id IN ({placeholders})",
+                (model_version, *batch),
+            )
+            columns = [column[0] for column in cursor.description]
+            for row in cursor.fetchall():
+                row = dict(zip(columns, row))
+                prediction = self.classifier.deserialize_prediction(row)
+                found[int(row["email_id"])] = prediction
+        return found
+
+    def _plan_chunk(self, conn, records, model_version):
+        """Split a chunk into rows to classify and near-duplicates to copy
+
+        Returns the positions to classify, ``{position: representative id}``
+        for the copies, and the representatives' stored predictions. A member
+        is only copied when its representative is classified in this chunk or
+        already stored for ``model_version``; otherwise it is classified.
+        """
+        in_chunk = {int(message["email_id"]) for message in records}
+        copies = {}
+        if self.dedupe:
+            for i, message in enumerate(records):
+                cluster_id = message.get("cluster_id")
+                # NaN for emails without near-duplicates
+                if cluster_id is None or cluster_id != cluster_id:
+                    continue
+                if int(cluster_id) != int(message["email_id"]):
+                    copies[i] = int(cluster_id)
+        stored = self._stored_predictions(
+            conn, set(copies.values()) - in_chunk, model_version
+        )
+        copies = {
+            i: cluster_id
+            for i, cluster_id in copies.items()
+            if cluster_id in in_chunk or cluster_id in stored
+        }
+        classify = [i for i in range(len(records)) if i not in copies]
+        return classify, copies, stored
+
+    def _own_emotions(self, chunk: pd.DataFrame, records, positions):
+        """Each copied member's own emotion scores, stored or computed"""
+        values, current = stored_metadata(chunk)
+        columns = {name: METADATA_FEATURES.index(name) for name in EMOTION_FIELDS}
+        emotions = {}
+        for i in positions:
+            if current[i]:
+                emotions[i] = {
+                    name: float(values[i, column]) for name, column in columns.items()
+                }
+                continue
+            analysis = self.classifier.emotion_enhancer.enhance_emotion_analysis(
+                clean_body_of(records[i])
+            )
+            emotions[i] = {name: float(analysis.get(name, 0)) for name in columns}
+        return emotions
+
+    def run(
+        self, max_emails: Optional[int] = None, restart: bool = False
+    ) -> Dict[str, Any]:
+        """Classify pending emails; returns throughput and progress counters"""
+        model_version = self.classifier.results_version
+        if self.classifier.ensemble_model is None or model_version is None:
+            raise ValueError("No trained model artifact to classify with")
+        if self.classifier.serving_online_head:
+            # Never matches a serving version, so the API recomputes these
+            model_version = f"{model_version}+online"
+            print(
+                "[BulkClassifier] The online head is serving; results are stored "
+                f"as {model_version} and will not be reused by the API"
+            )
+        if not self.with_transformer and self.classifier.mode != "fast":
+            # The API returns the transformer's fields too; rows without them
+            # are kept apart so /classify/email/<id> recomputes them
+            model_version = f"{model_version}+notransformer"
+            print(
+                "[BulkClassifier] Without --with-transformer, results are stored "
+                f"as {model_version} and will not be reused by the API"
+            )
+
+        conn = self._connect()
+        try:
+            if restart:
+                conn.execute(
+                    "DELETE FROM bulk_classification_checkpoints "
+                    "WHERE model_version = ?",
+                    (model_version,),
+                )
+                conn.commit()
+            last_id, classified_before = self._checkpoint(conn, model_version)
+            pending = self._count_pending(conn, last_id, model_version)
+            if max_emails is not None:
+                pending = min(pending, max_emails)
+            print(
+                f"[BulkClassifier] Model {model_version}: {pending} emails to "
+                f"classify, resuming after id {last_id}"
+            )
+
+            done = 0
+            copied = 0
+            start = time.perf_counter()
+            while max_emails is None or done < max_emails:
+                limit = self.chunk_size
+                if max_emails is not None:
+                    limit = min(limit, max_emails - done)
+                chunk = pd.read_sql_query(
+                    PENDING_QUERY, conn, params=(last_id, model_version, limit)
+                )
+                if chunk.empty:
+                    break
+                chunk = self.classifier.prepare_email_frame(chunk)
+                records = chunk.to_dict("records")
+                classify, copies, by_id = self._plan_chunk(
+                    conn, records, model_version
+                )
+
+                predictions = [None] * len(records)
+                if classify:
+                    computed = self.classifier.predict_frame(
+                        chunk.iloc[classify].reset_index(drop=True),
+                        with_transformer=self.with_transformer,
+                    )
+                    for i, prediction in zip(classify, computed):
+                        predictions[i] = prediction
+                        by_id[int(records[i]["email_id"])] = prediction
+                # Near-duplicates reuse their representative's category but
+                # keep their own emotion scores
+                emotions = self._own_emotions(chunk, records, copies)
+                for i, cluster_id in copies.items():
+                    predictions[i] = {**by_id[cluster_id], "emotion": emotions[i]}
+
+                # Copies are approximate: stored without a content hash, so
+                # get_classification_by_hash never reuses them as exact
+                rows = [
+                    self.classifier.serialize_prediction(
+                        str(message["email_id"]),
+                        prediction,
+                        model_version,
+                        None if i in copies else self.classifier.content_hash(message),
+                    )
+                    for i, (message, prediction) in enumerate(zip(records, predictions))
+                ]
+                last_id = int(chunk["email_id"].iloc[-1])
+                done += len(rows)
+                copied += len(copies)
+
+                # Results and checkpoint land in the same transaction
+                with conn:
+                    conn.executemany(CLASSIFICATION_INSERT, rows)
+                    conn.execute(
+                        """
+                        INSERT INTO bulk_classification_checkpoints
+                            (model_version, last_email_id, classified, updated_at)
+                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(model_version) DO UPDATE SET
+                            last_email_id = excluded.last_email_id,
+                            classified = excluded.classified,
+                            updated_at = excluded.updated_at
+                        """,
+                        (model_version, last_id, classified_before + done),
+                    )
+
+                elapsed = time.perf_counter() - start
+                rate = done / max(elapsed, 1e-9)
+                eta = (pending - done) / rate if rate > 0 else 0
+                print(
+                    f"[BulkClassifier] {done}/{pending} emails "
+                    f"({rate:.1f} emails/s, ETA {eta / 60:.1f} min, "
+                    f"{copied} near-duplicates copied, last id {last_id})"
+                )
+        finally:
+            self.classifier.close_encoding_pool()
+            conn.close()
+
+        elapsed = time.perf_counter() - start
+        return {
+            "model_version": model_version,
+            "classified": done,
+            "near_duplicates_copied": copied,
+            "classified_total": classified_before + done,
+            "last_email_id": last_id,
+            "seconds": round(elapsed, 1),
+            "emails_per_second": round(done / max(elapsed, 1e-9), 1),
+        }
+
+
+def main():
+    from app.services.enron_classifier import EnronEmailClassifier
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--max-emails", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument(
+        "--with-transformer",
+        action="store_true",
+        help="Also run the zero-shot transformer (one forward pass per email)",
+    )
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Classify near-duplicates too instead of copying their "
+        "representative's result",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the checkpoint and rescan from the first email",
+    )
+    args = parser.parse_args()
+
+    classifier = EnronEmailClassifier(model_dir=args.model_dir)
+    bulk = BulkClassifier(
+        classifier,
+        args.db,
+        chunk_size=args.chunk_size,
+        with_transformer=args.with_transformer,
+        dedupe=not args.no_dedupe,
+    )
+    print(json.dumps(bulk.run(args.max_emails, restart=args.restart), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,24 +2,46 @@ import sqlite3
 import os
 import json
 import random
+import threading
+from pathlib import Path
 from typing import List, Dict, Any
 
 print("DB_PATH:", os.getenv("DB_PATH"))
 DB_PATH = os.getenv("DB_PATH", "../SQLite_db/enron.db")
 
+# The schema checks below run once per process, not on every connection
+_schema_ready = False
+_schema_lock = threading.Lock()
+
 
 def get_db_connection():
+    global _schema_ready
     try:
-        print(f"Attempting to connect to database at: {DB_PATH}")
         conn = sqlite3.connect(DB_PATH, check_same_thread=False)
         conn.row_factory = sqlite3.Row
-        ensure_email_schema(conn)  # Ensure new columns are initialized to avoid 500 errors
+        if not _schema_ready:
+            with _schema_lock:
+                if not _schema_ready:
+                    print(f"Preparing database schema at: {DB_PATH}")
+                    # Ensure new columns are initialized to avoid 500 errors
+                    ensure_email_schema(conn)
+                    ensure_aux_tables(conn)
+                    _schema_ready = True
         return conn
     except Exception as e:
         print(f"Failed to connect to database: {str(e)}")
         raise
 
 
+def connect_readonly(db_path):
+    """Open a database only to read from it (e.g. a training source)
+
+    Nothing is created or altered, so this also works on a read-only file;
+    schema changes are left to the backfill jobs.
+    """
+    return sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+
+
 def get_all_users():
     conn = get_db_connection()
     cursor = conn.execute("SELECT id, username FROM users")
@@ -64,6 +86,16 @@ def ensure_email_schema(conn):
             cursor.execute(f"ALTER TABLE emails ADD COLUMN {col} {col_type};")
             new_column_added = True
 
+    # Derived columns (filled by the services' backfill jobs, not randomised)
+    derived_fields = [
+        ("clean_body", "TEXT"),
+        ("clean_body_version", "INTEGER"),
+    ]
+    for col, col_type in derived_fields:
+        if col not in existing_columns:
+            print(f"Adding missing column: {col}")
+            cursor.execute(f"ALTER TABLE emails ADD COLUMN {col} {col_type};")
+
     conn.commit()
 
     if new_column_added:
@@ -73,6 +105,95 @@ def ensure_email_schema(conn):
     else:
         conn.commit()
 
+def ensure_aux_tables(conn):
+    """Create the tables written by the classification services if missing."""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS classification_feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            model_version TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_classifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            category_name TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            transformer_category TEXT,
+            transformer_confidence REAL,
+            polarity REAL,
+            subjectivity REAL,
+            stress_score REAL,
+            relaxation_score REAL,
+            model_version TEXT,
+            content_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(email_id) ON CONFLICT REPLACE
+        );
+        """
+    )
+    # Stored results are reused only for the model version that produced them
+    cursor.execute("PRAGMA table_info(email_classifications);")
+    existing_columns = [row[1] for row in cursor.fetchall()]
+    for col in ("model_version", "content_hash"):
+        if col not in existing_columns:
+            print(f"Adding missing column: email_classifications.{col}")
+            cursor.execute(f"ALTER TABLE email_classifications ADD COLUMN {col} TEXT;")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_email_classifications_hash "
+        "ON email_classifications (content_hash, model_version);"
+    )
+    # Near-duplicate clusters (app.services.near_duplicates); singletons are
+    # not stored. cluster_id is the id of the cluster's representative email.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_clusters (
+            email_id INTEGER PRIMARY KEY,
+            cluster_id INTEGER NOT NULL,
+            cluster_size INTEGER NOT NULL,
+            similarity REAL
+        );
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_email_clusters_cluster "
+        "ON email_clusters (cluster_id);"
+    )
+    # Shadow model vs active model on sampled live traffic
+    # (app.services.shadow_evaluation)
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS shadow_evaluations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_id TEXT,
+            active_version TEXT NOT NULL,
+            shadow_version TEXT NOT NULL,
+            active_category TEXT NOT NULL,
+            shadow_category TEXT NOT NULL,
+            agree INTEGER NOT NULL,
+            active_confidence REAL,
+            shadow_confidence REAL,
+            active_ms REAL,
+            shadow_ms REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_shadow_evaluations_versions "
+        "ON shadow_evaluations (shadow_version, active_version);"
+    )
+    conn.commit()
+
+
 def initialize_column_values_once(conn):
     """Randomize initial values for the first 500 emails only."""
     cursor = conn.cursor()
@@ -102,7 +223,8 @@ def get_emails(username, folder_name):
     cursor = conn.execute(
         """
         SELECT emails.id, emails.subject, emails.body, emails.from_address, emails.to_address, emails.date,
-               emails.starred, emails.flagged, emails.deleted, emails.archived, emails.read
+               emails.starred, emails.flagged, emails.deleted, emails.archived, emails.read,
+               emails.clean_body, emails.clean_body_version
         FROM emails
         JOIN folders ON emails.folder_id = folders.id
         JOIN users ON folders.user_id = users.id
@@ -123,10 +245,14 @@ def get_email_by_id(email_id):
         """
         SELECT emails.id, emails.subject, emails.body, emails.from_address, emails.to_address, emails.date,
                emails.starred, emails.flagged, emails.deleted, emails.archived, emails.read,
-               folders.name as folder_name, users.username
+               emails.clean_body, emails.clean_body_version,
+               folders.name as folder_name, users.username,
+               COALESCE(email_clusters.cluster_id, emails.id) as cluster_id,
+               COALESCE(email_clusters.cluster_size, 1) as cluster_size
         FROM emails
         JOIN folders ON emails.folder_id = folders.id
         JOIN users ON folders.user_id = users.id
+        LEFT JOIN email_clusters ON email_clusters.email_id = emails.id
         WHERE emails.id = ?
         """,
         (email_id,),
@@ -136,6 +262,87 @@ def get_email_by_id(email_id):
     return email
 
 
+def get_email_summaries(email_ids):
+    """Subject/sender/date/folder for a list of email ids, keyed by id"""
+    if not email_ids:
+        return {}
+    placeholders = ",".join("?" for _ in email_ids)
+    conn = get_db_connection()
+    cursor = conn.execute(
+        f"""
+        SELECT emails.id, emails.subject, emails.from_address, emails.date,
+               folders.name as folder_name, users.username
+        FROM emails
+        JOIN folders ON emails.folder_id = folders.id
+        JOIN users ON folders.user_id = users.id
+        WHERE emails.id IN ({placeholders})
+        """,
+        [int(email_id) for email_id in email_ids],
+    )
+    rows = {row["id"]: dict(row) for row in cursor.fetchall()}
+    conn.close()
+    return rows
+
+
+def get_email_cluster(email_id, limit=50):
+    """The near-duplicate cluster of an email and up to ``limit`` member ids"""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT cluster_id, cluster_size, similarity FROM email_clusters "
+        "WHERE email_id = ?",
+        (int(email_id),),
+    ).fetchone()
+    if row is None:
+        conn.close()
+        return {
+            "cluster_id": int(email_id),
+            "cluster_size": 1,
+            "similarity": None,
+            "members": [],
+        }
+    members = conn.execute(
+        """
+        SELECT email_id, similarity FROM email_clusters
+        WHERE cluster_id = ?
+        ORDER BY email_id
+        LIMIT ?
+        """,
+        (row["cluster_id"], limit),
+    ).fetchall()
+    conn.close()
+    return {
+        "cluster_id": row["cluster_id"],
+        "cluster_size": row["cluster_size"],
+        "similarity": row["similarity"],
+        "members": [dict(member) for member in members],
+    }
+
+
+def get_stored_classification(email_id):
+    """The stored classification row for an email, or None"""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT * FROM email_classifications WHERE email_id = ?", (str(email_id),)
+    ).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def get_classification_by_hash(content_hash, model_version):
+    """A stored classification of identical content by the same model, or None"""
+    conn = get_db_connection()
+    row = conn.execute(
+        """
+        SELECT * FROM email_classifications
+        WHERE content_hash = ? AND model_version = ?
+        LIMIT 1
+        """,
+        (content_hash, model_version),
+    ).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
 def initialize_table():
     """Initialize required tables in the DB if they don't exist."""
     with get_db_connection() as conn:
@@ -179,6 +386,8 @@ def initialize_table():
                 filename TEXT,
                 subject TEXT,
                 body TEXT,
+                clean_body TEXT,
+                clean_body_version INTEGER,
                 from_address TEXT,
                 to_address TEXT,
                 date TEXT,
@@ -193,6 +402,40 @@ def initialize_table():
         conn.commit()
 
 
+# Shared by store_data and the bulk classifier; rows come from
+# EnronEmailClassifier.serialize_prediction
+CLASSIFICATION_INSERT = """
+    INSERT INTO email_classifications (
+        email_id,
+        category,
+        category_name,
+        confidence,
+        transformer_category,
+        transformer_confidence,
+        polarity,
+        subjectivity,
+        stress_score,
+        relaxation_score,
+        model_version,
+        content_hash
+    )
+    VALUES (
+        :email_id,
+        :category,
+        :category_name,
+        :confidence,
+        :transformer_category,
+        :transformer_confidence,
+        :polarity,
+        :subjectivity,
+        :stress_score,
+        :relaxation_score,
+        :model_version,
+        :content_hash
+    )
+"""
+
+
 def store_data(table: str, data: List[Dict[str, Any]]):
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -214,32 +457,12 @@ def store_data(table: str, data: List[Dict[str, Any]]):
                 data,
             )
         elif table == "email_classifications":
+            cursor.executemany(CLASSIFICATION_INSERT, data)
+        elif table == "classification_feedback":
             cursor.executemany(
                 """
-                INSERT INTO email_classifications (
-                    email_id,
-                    category,
-                    category_name,
-                    confidence,
-                    transformer_category,
-                    transformer_confidence,
-                    polarity,
-                    subjectivity,
-                    stress_score,
-                    relaxation_score
-                )
-                VALUES (
-                    :email_id,
-                    :category,
-                    :category_name,
-                    :confidence,
-                    :transformer_category,
-                    :transformer_confidence,
-                    :polarity,
-                    :subjectivity,
-                    :stress_score,
-                    :relaxation_score
-                )
+                INSERT INTO classification_feedback (email_id, category, model_version)
+                VALUES (:email_id, :category, :model_version)
             """,
                 data,
             )
@@ -0,0 +1,149 @@
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.neural_network import MLPClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+# p99 single-email predict_proba budget used to pick the served model
+DEFAULT_LATENCY_BUDGET_MS = float(os.getenv("CLASSIFIER_LATENCY_BUDGET_MS", "1.0"))
+
+# Teacher probabilities below this are dropped from the soft-label expansion
+MIN_SOFT_LABEL = 0.01
+
+
+def soft_label_expansion(
+    X: np.ndarray, teacher_proba: np.ndarray, min_prob: float = MIN_SOFT_LABEL
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Turn soft targets into weighted hard examples.
+
+    Each row is repeated once per class the teacher gives at least
+    ``min_prob``, weighted by that probability, so a cross-entropy learner
+    that only accepts hard labels fits the teacher's full distribution.
+    """
+    rows, classes = np.nonzero(teacher_proba >= min_prob)
+    return X[rows], classes, teacher_proba[rows, classes]
+
+
+def measure_latency(model, X: np.ndarray, n: int = 200) -> Dict[str, float]:
+    """Single-row predict_proba latency percentiles (ms) and batch throughput"""
+    rows = X[: min(n, len(X))]
+    model.predict_proba(rows[:1])  # warm-up
+    latencies = []
+    for i in range(len(rows)):
+        start = time.perf_counter()
+        model.predict_proba(rows[i : i + 1])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    model.predict_proba(X)
+    batch_secs = time.perf_counter() - start
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "batch_rows_per_s": round(len(X) / max(batch_secs, 1e-9), 1),
+    }
+
+
+def build_students(
+    X_train: np.ndarray, teacher_proba: np.ndarray, teacher_classes: np.ndarray
+) -> Dict[str, Pipeline]:
+    """Fit the distilled candidates on the teacher's outputs"""
+    X_soft, y_soft, w_soft = soft_label_expansion(X_train, teacher_proba)
+    y_soft = teacher_classes[y_soft]
+
+    linear = Pipeline(
+        [
+            ("scaler", StandardScaler()),
+            ("clf", LogisticRegression(max_iter=2000, C=0.1, random_state=42)),
+        ]
+    )
+    linear.fit(X_soft, y_soft, clf__sample_weight=w_soft)
+
+    # MLPClassifier takes no sample weights here; it learns the teacher's argmax
+    mlp = Pipeline(
+        [
+            ("scaler", StandardScaler()),
+            (
+                "clf",
+                MLPClassifier(
+                    hidden_layer_sizes=(128,),
+                    early_stopping=True,
+                    max_iter=200,
+                    random_state=42,
+                ),
+            ),
+        ]
+    )
+    mlp.fit(X_train, teacher_classes[teacher_proba.argmax(axis=1)])
+
+    students = {"linear": linear, "mlp": mlp}
+    # A student that never saw a class cannot output it; such students are
+    # not drop-in replacements for the teacher
+    return {
+        name: model
+        for name, model in students.items()
+        if np.array_equal(model.classes_, teacher_classes)
+    }
+
+
+def select_model(
+    teacher,
+    X_train: np.ndarray,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    latency_budget_ms: Optional[float] = None,
+) -> Tuple[Any, Dict[str, Any]]:
+    """Distil ``teacher`` and return ``(chosen_model, report)``.
+
+    Every candidate (the teacher included) is scored on accuracy against the
+    true test labels, agreement with the teacher and single-email latency.
+    The most accurate candidate whose p99 latency fits the budget is chosen;
+    if none fits, the fastest one is, and the report says so.
+    """
+    budget = latency_budget_ms if latency_budget_ms else DEFAULT_LATENCY_BUDGET_MS
+    teacher_proba = teacher.predict_proba(X_train)
+    teacher_test = teacher.predict(X_test)
+
+    candidates = {"ensemble": teacher}
+    candidates.update(build_students(X_train, teacher_proba, teacher.classes_))
+
+    results: List[Dict[str, Any]] = []
+    for name, model in candidates.items():
+        y_pred = model.predict(X_test)
+        results.append(
+            {
+                "name": name,
+                "accuracy": round(float(accuracy_score(y_test, y_pred)), 4),
+                "teacher_agreement": round(
+                    float(np.mean(y_pred == teacher_test)), 4
+                ),
+                **measure_latency(model, X_test),
+            }
+        )
+
+    within = [r for r in results if r["p99_ms"] <= budget]
+    if within:
+        chosen = max(within, key=lambda r: (r["accuracy"], -r["p99_ms"]))
+    else:
+        chosen = min(results, key=lambda r: r["p99_ms"])
+
+    for r in results:
+        print(
+            f"  {r['name']:<9} accuracy {r['accuracy']:.4f}  "
+            f"agreement {r['teacher_agreement']:.4f}  "
+            f"p50 {r['p50_ms']:.3f} ms  p99 {r['p99_ms']:.3f} ms"
+        )
+    print(f"Selected '{chosen['name']}' under a {budget} ms p99 budget")
+
+    report = {
+        "latency_budget_ms": budget,
+        "selected": chosen["name"],
+        "within_budget": bool(within),
+        "candidates": results,
+    }
+    return candidates[chosen["name"]], report
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Canonical cleaned email body, stored once in ``emails.clean_body``.
+
+Headers, Enron X-metadata, quoted replies, forwarded history and signatures
+are stripped here, at ingest or by the backfill below, instead of by every
+service on every request. Classification, summarisation, NER and emotion
+analysis read the stored column through ``clean_body_of``, which falls back
+to cleaning on the fly for rows the backfill has not reached yet.
+
+    python -m app.services.email_cleaning --db ../SQLite_db/enron.db
+"""
+import argparse
+import quopri
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Mapping
+
+from app.services.db import ensure_email_schema
+from app.services.text_normalizer import normalize_text
+
+# Bump whenever clean_email_body changes; older rows are re-cleaned by the
+# backfill and ignored by clean_body_of until then
+CLEAN_BODY_VERSION = 2
+
+_HEADER_LINE = re.compile(
+    r"^(Message-ID|From|To|Subject|Date|Cc|Bcc|Mime-Version|Content-Type|"
+    r"Content-Transfer-Encoding|X-[\w-]+):.*$",
+    flags=re.MULTILINE,
+)
+_ENRON_METADATA = re.compile(
+    r"X-Folder:.*|X-Origin:.*|X-FileName:.*", flags=re.MULTILINE
+)
+# Conventional "-- " signature delimiter: everything after it is dropped
+_SIGNATURE = re.compile(r"^-- ?\r?$.*", flags=re.MULTILINE | re.DOTALL)
+# Quoted-printable soft line breaks and escapes left in undecoded payloads
+_QUOTED_PRINTABLE = re.compile(r"=\r?\n|=(?:09|20|3D)")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def _decode_quoted_printable(text: str) -> str:
+    if not _QUOTED_PRINTABLE.search(text):
+        return text
+    try:
+        return quopri.decodestring(text.encode("utf-8", errors="replace")).decode(
+            "utf-8", errors="replace"
+        )
+    except ValueError:
+        return text
+
+
+def clean_email_body(body) -> str:
+    """Message text without headers, metadata, history, quotes or signature"""
+    if body is None or (isinstance(body, float) and body != body):
+        return ""
+    text = _decode_quoted_printable(str(body))
+
+    # Bounded window with quoted/forwarded history removed (see text_normalizer)
+    text = normalize_text(text, "clean_body")
+
+    text = _HEADER_LINE.sub("", text)
+    text = _ENRON_METADATA.sub("", text)
+    text = _SIGNATURE.sub("", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def clean_body_of(email: Mapping[str, Any]) -> str:
+    """The stored clean body of an email row, or a freshly cleaned one"""
+    stored = email.get("clean_body")
+    version = email.get("clean_body_version")
+    if isinstance(stored, str) and version == CLEAN_BODY_VERSION:
+        return stored
+    return clean_email_body(email.get("body"))
+
+
+def clean_body_columns(conn: sqlite3.Connection) -> str:
+    """SELECT list for the stored clean body of ``emails e``
+
+    NULLs when the columns have not been added yet; such rows are cleaned on
+    the fly, so readers never need to alter the database.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(emails)")}
+    if {"clean_body", "clean_body_version"} <= columns:
+        return "e.clean_body AS clean_body, e.clean_body_version AS clean_body_version"
+    return "NULL AS clean_body, NULL AS clean_body_version"
+
+
+def backfill_clean_bodies(
+    db_path: str, batch_size: int = 1000, force: bool = False
+) -> Dict[str, Any]:
+    """Fill ``clean_body`` for rows that are missing it or out of date"""
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_email_schema(conn)
+        if force:
+            stale, params = "", ()
+        else:
+            stale = "AND (clean_body_version IS NULL OR clean_body_version != ?)"
+            params = (CLEAN_BODY_VERSION,)
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM emails WHERE 1 = 1 {stale}", params
+        ).fetchone()[0]
+        print(f"[CleanBody] {total} emails to clean (version {CLEAN_BODY_VERSION})")
+
+        done = 0
+        last_id = 0
+        start = time.perf_counter()
+        while True:
+            rows = conn.execute(
+                f"SELECT id, body FROM emails WHERE id > ? {stale} ORDER BY id LIMIT ?",
+                (last_id, *params, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            conn.executemany(
+                "UPDATE emails SET clean_body = ?, clean_body_version = ? WHERE id = ?",
+                [
+                    (clean_email_body(body), CLEAN_BODY_VERSION, email_id)
+                    for email_id, body in rows
+                ],
+            )
+            conn.commit()
+            done += len(rows)
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            print(f"[CleanBody] {done}/{total} emails ({rate:.0f} emails/s)")
+    finally:
+        conn.close()
+
+    return {
+        "cleaned": done,
+        "version": CLEAN_BODY_VERSION,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill emails.clean_body")
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--force", action="store_true", help="Re-clean every row, not just stale ones"
+    )
+    args = parser.parse_args()
+    print(backfill_clean_bodies(args.db, args.batch_size, args.force))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Per-email metadata and emotion features, stored once in ``email_features``.
+
+The nine METADATA_FEATURES appended to every text embedding only change
+when the email itself does, but the emotion scores behind four of them are
+regex- and VADER-heavy Python run row by row. The backfill below computes
+them for the whole corpus in bulk; the classifier's SQL queries LEFT JOIN
+the table (STORED_FEATURE_COLUMNS / FEATURE_JOIN) and extract_features only
+computes rows whose stored values are missing or from an older spec.
+
+    python -m app.services.email_features --db ../SQLite_db/enron.db
+"""
+import argparse
+import email.utils
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.db import ensure_email_schema
+from app.services.email_cleaning import CLEAN_BODY_VERSION, clean_body_of
+
+# Bump whenever a stored value below changes meaning (the emotion lexicons,
+# the hour fallback...). A change of order or membership also needs
+# FEATURE_SPEC_VERSION bumped in enron_classifier.
+METADATA_SPEC_VERSION = 1
+
+# Per-email features appended after the text embedding, in this order
+METADATA_FEATURES = [
+    "subject_length",
+    "body_length",
+    "has_attachment",
+    "num_recipients",
+    "hour_sent",
+    "polarity",
+    "subjectivity",
+    "stress_score",
+    "relaxation_score",
+]
+
+# Stored features selected alongside an email row aliased ``e``
+STORED_FEATURE_COLUMNS = ",\n".join(
+    [f"m.{name} AS feature_{name}" for name in METADATA_FEATURES]
+    + [
+        "m.spec_version AS feature_spec_version",
+        "m.clean_body_version AS feature_clean_body_version",
+    ]
+)
+FEATURE_JOIN = "LEFT JOIN email_features m ON m.email_id = e.id"
+# The same columns when email_features has not been created
+_NULL_FEATURE_COLUMNS = ",\n".join(
+    [f"NULL AS feature_{name}" for name in METADATA_FEATURES]
+    + ["NULL AS feature_spec_version", "NULL AS feature_clean_body_version"]
+)
+
+# Emails with no current stored features, in id order
+_PENDING_QUERY = """
+    SELECT
+        e.id AS email_id,
+        e.subject AS subject,
+        e.body AS body,
+        e.clean_body AS clean_body,
+        e.clean_body_version AS clean_body_version,
+        e.date AS time_sent
+    FROM emails e
+    LEFT JOIN email_features m ON m.email_id = e.id
+    WHERE e.id > ? {stale}
+    ORDER BY e.id
+    LIMIT ?
+"""
+_STALE = """AND (
+        m.email_id IS NULL OR m.spec_version != ? OR m.clean_body_version != ?
+    )"""
+
+_INSERT = (
+    f"INSERT OR REPLACE INTO email_features "
+    f"(email_id, {', '.join(METADATA_FEATURES)}, spec_version, clean_body_version) "
+    f"VALUES ({', '.join('?' * (len(METADATA_FEATURES) + 3))})"
+)
+
+
+def ensure_feature_table(conn: sqlite3.Connection):
+    columns = ",\n".join(f"{name} REAL NOT NULL" for name in METADATA_FEATURES)
+    conn.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS email_features (
+            email_id INTEGER PRIMARY KEY,
+            {columns},
+            spec_version INTEGER NOT NULL,
+            clean_body_version INTEGER NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- Edited emails are recomputed rather than served stale features
+        CREATE TRIGGER IF NOT EXISTS email_features_invalidate
+        AFTER UPDATE OF subject, body, date ON emails
+        BEGIN
+            DELETE FROM email_features WHERE email_id = OLD.id;
+        END;
+        """
+    )
+    conn.commit()
+
+
+def stored_feature_sql(conn: sqlite3.Connection) -> Tuple[str, str]:
+    """``(columns, join)`` selecting stored features without creating the table
+
+    When the backfill has not run, every feature column is NULL and
+    extract_features computes all rows.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'email_features'"
+    ).fetchone()
+    if exists:
+        return STORED_FEATURE_COLUMNS, FEATURE_JOIN
+    return _NULL_FEATURE_COLUMNS, ""
+
+
+def hour_sent(value) -> int:
+    """Hour of a datetime, ISO or RFC 2822 date string; 12 when unknown"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except ValueError:
+            try:
+                value = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return 12
+    hour = getattr(value, "hour", None)
+    # pd.NaT has a NaN hour
+    return 12 if hour is None or hour != hour else int(hour)
+
+
+def metadata_row(message: Mapping[str, Any], emotion_data: Dict[str, Any]) -> Tuple:
+    """The METADATA_FEATURES values for one email, in order"""
+    return (
+        len(str(message.get("subject", ""))),
+        len(str(message.get("body", ""))),
+        int(message.get("has_attachment", False)),
+        message.get("num_recipients", 1),
+        hour_sent(message.get("time_sent")),
+        emotion_data.get("polarity", 0),
+        emotion_data.get("subjectivity", 0),
+        emotion_data.get("stress_score", 0),
+        emotion_data.get("relaxation_score", 0),
+    )
+
+
+def stored_metadata(email_data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Stored METADATA_FEATURES for each row and a mask of which are current
+
+    Rows read without FEATURE_JOIN, or whose stored values predate the
+    current spec or clean body, are left as NaN with a False mask.
+    """
+    n_rows = len(email_data)
+    if "feature_spec_version" not in email_data:
+        return np.full((n_rows, len(METADATA_FEATURES)), np.nan), np.zeros(
+            n_rows, dtype=bool
+        )
+
+    values = (
+        email_data[[f"feature_{name}" for name in METADATA_FEATURES]]
+        .to_numpy(dtype=np.float64, na_value=np.nan)
+        .copy()
+    )
+    current = (
+        (email_data["feature_spec_version"] == METADATA_SPEC_VERSION)
+        & (email_data["feature_clean_body_version"] == CLEAN_BODY_VERSION)
+    ).to_numpy(dtype=bool)
+    current &= ~np.isnan(values).any(axis=1)
+    values[~current] = np.nan
+    return values, current
+
+
+def backfill_email_features(
+    db_path: str,
+    batch_size: int = 1000,
+    force: bool = False,
+    emotion_enhancer=None,
+) -> Dict[str, Any]:
+    """Compute ``email_features`` for emails missing them or out of date"""
+    if emotion_enhancer is None:
+        from app.services.emotion_enhancer import EmotionEnhancer
+
+        emotion_enhancer = EmotionEnhancer()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_email_schema(conn)
+        ensure_feature_table(conn)
+        if force:
+            stale, params = "", ()
+        else:
+            stale, params = _STALE, (METADATA_SPEC_VERSION, CLEAN_BODY_VERSION)
+        query = _PENDING_QUERY.format(stale=stale)
+        total = conn.execute(
+            f"""
+            SELECT COUNT(*) FROM emails e
+            LEFT JOIN email_features m ON m.email_id = e.id
+            WHERE 1 = 1 {stale}
+            """,
+            params,
+        ).fetchone()[0]
+        print(
+            f"[EmailFeatures] {total} emails to featurise "
+            f"(spec {METADATA_SPEC_VERSION}, clean body {CLEAN_BODY_VERSION})"
+        )
+
+        done = 0
+        last_id = 0
+        start = time.perf_counter()
+        while True:
+            batch = pd.read_sql_query(
+                query, conn, params=(last_id, *params, batch_size)
+            )
+            if batch.empty:
+                break
+            last_id = int(batch["email_id"].iloc[-1])
+            # Same columns prepare_email_frame gives the classifier
+            batch["has_attachment"] = False
+            batch["num_recipients"] = 1
+            batch["time_sent"] = pd.to_datetime(batch["time_sent"], errors="coerce")
+
+            rows = []
+            for message in batch.to_dict("records"):
+                emotion_data = emotion_enhancer.enhance_emotion_analysis(
+                    clean_body_of(message)
+                )
+                rows.append(
+                    (
+                        int(message["email_id"]),
+                        *(float(v) for v in metadata_row(message, emotion_data)),
+                        METADATA_SPEC_VERSION,
+                        CLEAN_BODY_VERSION,
+                    )
+                )
+            with conn:
+                conn.executemany(_INSERT, rows)
+            done += len(rows)
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            print(f"[EmailFeatures] {done}/{total} emails ({rate:.0f} emails/s)")
+    finally:
+        conn.close()
+
+    return {
+        "featurised": done,
+        "spec_version": METADATA_SPEC_VERSION,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the email_features table")
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Recompute every row, not just missing or stale ones",
+    )
+    args = parser.parse_args()
+    print(backfill_email_features(args.db, args.batch_size, args.force))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,13 @@ import numpy as np
 import re
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
+from app.services.text_normalizer import normalize_text
+
+_NEGATION_PATTERNS = [
+    re.compile(rf'\b{neg}\b.*\b(urgent|stress|critical|pressure)\b')
+    for neg in ['not', 'never', 'no']
+]
+
 
 class EmotionEnhancer:
     def __init__(self):
@@ -49,15 +56,13 @@ class EmotionEnhancer:
     def detect_keywords(self, text, keyword_dict):
         score = 0.0
         for word, weight in keyword_dict.items():
-            pattern = re.escape(word)
-            matches = re.findall(pattern, text)
-            score += len(matches) * weight
+            # Same non-overlapping count as re.findall(re.escape(word)), no regex
+            score += text.count(word) * weight
         return min(score / 5.0, 1.0)
 
     def handle_negation(self, text, score):
-        negations = ['not', 'never', 'no']
-        for neg in negations:
-            if re.search(rf'\b{neg}\b.*\b(urgent|stress|critical|pressure)\b', text):
+        for pattern in _NEGATION_PATTERNS:
+            if pattern.search(text):
                 return score * 0.3
         return score
 
@@ -150,7 +155,8 @@ class EmotionEnhancer:
                 "sarcasm_score": 0
             }
 
-        text = str(text).lower()
+        # Bounded window without quoted/forwarded history (see text_normalizer)
+        text = normalize_text(text, "emotion").lower()
 
         sentiment = self.analyzer.polarity_scores(text)
         polarity = sentiment["compound"]
@@ -0,0 +1,240 @@
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+ENCODER_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Probe sentences used to check an exported backend against the torch model
+PROBE_TEXTS = [
+    "Please review the attached contract before Friday's meeting.",
+    "The Q3 budget forecast needs to be revised immediately.",
+    "hey, want to grab lunch later?",
+    "Server outage in the Houston data center, IT is investigating.",
+]
+
+
+class TorchSentenceEncoder:
+    """Reference backend: SentenceTransformer running in eager PyTorch"""
+
+    name = "torch"
+
+    def __init__(self, sentence_model, device: str = "cpu"):
+        self.sentence_model = sentence_model
+        self.device = device
+        self.tokenizer = sentence_model.tokenizer
+        self.max_seq_length = sentence_model.max_seq_length
+
+    @property
+    def dim(self) -> int:
+        return self.sentence_model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return self.sentence_model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            device=self.device,
+        ).astype(np.float32, copy=False)
+
+
+class OnnxSentenceEncoder:
+    """MiniLM encoder exported to ONNX and executed with onnxruntime on CPU.
+
+    Mean pooling and L2 normalisation are done in numpy so the output matches
+    the SentenceTransformer pipeline (Transformer -> Pooling -> Normalize).
+    """
+
+    def __init__(
+        self,
+        onnx_path: Path,
+        tokenizer,
+        max_seq_length: int,
+        normalize: bool = True,
+        quantized: bool = False,
+        intra_op_threads: int = 0,
+    ):
+        import onnxruntime as ort
+
+        self.onnx_path = Path(onnx_path)
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+        self.normalize = normalize
+        self.quantized = quantized
+        self.name = "onnx-int8" if quantized else "onnx"
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            str(self.onnx_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._dim = self.session.get_outputs()[0].shape[-1]
+
+    @property
+    def dim(self) -> int:
+        return int(self._dim)
+
+    def _run_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        feeds = {
+            name: encoded[name].astype(np.int64)
+            for name in ("input_ids", "attention_mask", "token_type_ids")
+            if name in self._input_names and name in encoded
+        }
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over non-padding tokens
+        mask = encoded["attention_mask"].astype(np.float32)[..., None]
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+
+        if self.normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+        return embeddings.astype(np.float32, copy=False)
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        batches = [
+            self._run_batch(texts[i : i + batch_size])
+            for i in range(0, len(texts), batch_size)
+        ]
+        return np.vstack(batches)
+
+
+def _has_normalize_module(sentence_model) -> bool:
+    return any(type(m).__name__ == "Normalize" for m in sentence_model)
+
+
+def export_to_onnx(sentence_model, output_dir: Path, quantize: bool = False) -> Path:
+    """Export the transformer of a SentenceTransformer to ONNX (once, cached on disk)"""
+    import torch
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = output_dir / f"{ENCODER_MODEL_NAME}.onnx"
+    int8_path = output_dir / f"{ENCODER_MODEL_NAME}-int8.onnx"
+
+    if not fp32_path.exists():
+        print(f"Exporting {ENCODER_MODEL_NAME} to ONNX at {fp32_path}...")
+        transformer = sentence_model[0].auto_model.to("cpu").eval()
+        dummy = sentence_model.tokenizer(
+            ["export probe"], return_tensors="pt", padding=True
+        )
+        input_names = [
+            name
+            for name in ("input_ids", "attention_mask", "token_type_ids")
+            if name in dummy
+        ]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(dummy[name] for name in input_names),
+                str(fp32_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                do_constant_folding=True,
+            )
+
+    if not quantize:
+        return fp32_path
+
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"Quantizing ONNX encoder to int8 at {int8_path}...")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def compare_encoders(reference, candidate, texts: Optional[List[str]] = None) -> dict:
+    """Compare two encoders on the same texts (max abs error and cosine agreement)"""
+    texts = texts or PROBE_TEXTS
+    ref = reference.encode(texts)
+    cand = candidate.encode(texts)
+
+    ref_norm = ref / np.clip(np.linalg.norm(ref, axis=1, keepdims=True), 1e-12, None)
+    cand_norm = cand / np.clip(
+        np.linalg.norm(cand, axis=1, keepdims=True), 1e-12, None
+    )
+    cosine = (ref_norm * cand_norm).sum(axis=1)
+
+    return {
+        "max_abs_diff": float(np.max(np.abs(ref - cand))),
+        "min_cosine": float(np.min(cosine)),
+        "mean_cosine": float(np.mean(cosine)),
+    }
+
+
+def build_encoder(
+    backend: str,
+    sentence_model,
+    model_dir: Path,
+    device: str = "cpu",
+    tolerance: Optional[float] = None,
+):
+    """Build the requested encoder backend, falling back to torch on any failure.
+
+    ``backend`` is one of ``torch``, ``onnx`` or ``onnx-int8``. ONNX backends
+    are checked against the torch model on ``PROBE_TEXTS``; if the minimum
+    cosine similarity drops below ``tolerance`` the torch backend is used.
+    """
+    torch_encoder = TorchSentenceEncoder(sentence_model, device=device)
+    backend = (backend or "torch").lower()
+
+    if backend == "torch":
+        return torch_encoder
+
+    if backend not in ("onnx", "onnx-int8"):
+        print(f"Unknown encoder backend '{backend}', using torch")
+        return torch_encoder
+
+    quantize = backend == "onnx-int8"
+    if tolerance is None:
+        default_tolerance = "0.98" if quantize else "0.9999"
+        tolerance = float(os.getenv("ENCODER_TOLERANCE", default_tolerance))
+
+    try:
+        onnx_path = export_to_onnx(
+            sentence_model, Path(model_dir) / "onnx", quantize=quantize
+        )
+        encoder = OnnxSentenceEncoder(
+            onnx_path,
+            tokenizer=sentence_model.tokenizer,
+            max_seq_length=sentence_model.max_seq_length,
+            normalize=_has_normalize_module(sentence_model),
+            quantized=quantize,
+        )
+        check = compare_encoders(torch_encoder, encoder)
+        print(
+            f"Encoder backend {encoder.name}: min cosine vs torch "
+            f"{check['min_cosine']:.5f} (tolerance {tolerance})"
+        )
+        if check["min_cosine"] < tolerance:
+            print(f"Encoder backend {encoder.name} outside tolerance, using torch")
+            return torch_encoder
+        return encoder
+    except Exception as e:
+        print(f"Could not build {backend} encoder: {e}")
+        print("Falling back to torch encoder...")
+        return torch_encoder
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from app.services.length_batching import DEFAULT_TOKEN_BUDGET, encode_bucketed
+from app.services.resources import available_cpus
+
+# Number of encoder processes for bulk CPU encoding; 0 or 1 encodes in-process
+DEFAULT_ENCODER_WORKERS = int(os.getenv("ENCODER_WORKERS", "0"))
+
+# Texts sent to a worker per task; large enough to amortise pickling
+DEFAULT_POOL_CHUNK_SIZE = int(os.getenv("ENCODER_POOL_CHUNK_SIZE", "512"))
+
+# Set in each worker process by _init_worker
+_worker_encoder = None
+
+
+def _init_worker(backend: str, model_dir: str, num_threads: int):
+    """Load one encoder copy per process with its intra-op threads pinned"""
+    global _worker_encoder
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(num_threads)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    from app.services.encoder_backends import ENCODER_MODEL_NAME, build_encoder
+
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+    sentence_model = SentenceTransformer(ENCODER_MODEL_NAME, device="cpu")
+    _worker_encoder = build_encoder(backend, sentence_model, model_dir, device="cpu")
+    if _worker_encoder.name != backend:
+        # A worker must never silently encode differently from the parent
+        raise RuntimeError(
+            f"Encoder worker built '{_worker_encoder.name}' instead of '{backend}'"
+        )
+
+
+def _encode_chunk(texts: List[str], token_budget: int) -> np.ndarray:
+    return encode_bucketed(_worker_encoder, texts, token_budget=token_budget)
+
+
+class EncodingPool:
+    """A pool of CPU encoder processes that returns embeddings in input order.
+
+    Workers are started with the "spawn" method (forking a process that has
+    already initialised torch is unsafe) and each loads its own encoder, with
+    ``cpu_count // n_workers`` intra-op threads so they do not oversubscribe
+    the cores.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        model_dir: str,
+        n_workers: Optional[int] = None,
+        threads_per_worker: Optional[int] = None,
+        chunk_size: int = DEFAULT_POOL_CHUNK_SIZE,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+    ):
+        self.n_workers = n_workers or DEFAULT_ENCODER_WORKERS or available_cpus()
+        self.threads_per_worker = threads_per_worker or max(
+            1, available_cpus() // self.n_workers
+        )
+        self.chunk_size = chunk_size
+        self.token_budget = token_budget
+        self.backend = backend
+        self.pid = os.getpid()
+        print(
+            f"[EncodingPool] Starting {self.n_workers} '{backend}' encoder processes "
+            f"with {self.threads_per_worker} thread(s) each"
+        )
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend, str(model_dir), self.threads_per_worker),
+        )
+
+    def imap(self, texts: List[str]) -> Iterator[np.ndarray]:
+        """Yield embeddings for consecutive ``chunk_size`` slices, in order.
+
+        At most two chunks per worker are in flight, so results stream back
+        without holding the whole corpus's embeddings in memory.
+        """
+        pending = deque()
+        max_in_flight = 2 * self.n_workers
+        for start in range(0, len(texts), self.chunk_size):
+            pending.append(
+                self._executor.submit(
+                    _encode_chunk,
+                    texts[start : start + self.chunk_size],
+                    self.token_budget,
+                )
+            )
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def encode(self, texts: List[str], progress=None) -> np.ndarray:
+        """Embeddings for all ``texts`` as one float32 matrix"""
+        out = None
+        done = 0
+        for embeddings in self.imap(texts):
+            if out is None:
+                out = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+            out[done : done + len(embeddings)] = embeddings
+            done += len(embeddings)
+            if progress is not None:
+                progress(done / len(texts))
+        return out if out is not None else np.zeros((0, 0), dtype=np.float32)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
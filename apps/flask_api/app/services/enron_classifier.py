@@ -1,25 +1,83 @@
+from app.services.ann_index import ANN_INDEX_DIR, IVFIndex, load_index
+from app.services.db import connect_readonly
+from app.services.distillation import select_model
+from app.services.email_cleaning import (
+    CLEAN_BODY_VERSION,
+    clean_body_columns,
+    clean_body_of,
+)
+from app.services.email_features import (
+    METADATA_FEATURES,
+    hour_sent,
+    metadata_row,
+    stored_feature_sql,
+    stored_metadata,
+)
 from app.services.emotion_enhancer import EmotionEnhancer
-import sqlite3
+from app.services.encoder_backends import ENCODER_MODEL_NAME, build_encoder
+from app.services.fast_classifier import (
+    FastEmailClassifier,
+    FastTrainer,
+    fast_feature_spec,
+)
+from app.services.encoding_pool import (
+    DEFAULT_ENCODER_WORKERS,
+    DEFAULT_POOL_CHUNK_SIZE,
+    EncodingPool,
+)
+from app.services.length_batching import (
+    DEFAULT_TOKEN_BUDGET,
+    encode_bucketed,
+    token_lengths,
+    truncate_texts,
+)
+from app.services.model_artifacts import (
+    MANIFEST_FILE,
+    ArtifactError,
+    load_artifact,
+    readable_dir,
+    save_artifact,
+)
+from app.services.model_registry import ModelRegistry, version_kind
+from app.services.profiling import count as profile_count, current_profile, stage
+from app.services.resources import (
+    allocation,
+    configure,
+    configure_torch,
+    set_n_jobs,
+)
+from app.services.taxonomy import load_taxonomy, validate_categories
+from app.services.text_normalizer import normalize_text
+from app.services.training_jobs import TrainingCancelled
+from app.services.online_learner import (
+    FeatureCache,
+    build_online_head,
+    copy_online_head,
+    is_online_head,
+    load_online_head,
+    online_head_mtime,
+    save_online_head,
+)
+import copy
+import hashlib
+import json
+import os
 import pandas as pd
 import numpy as np
 import re
 import pickle
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
-from sentence_transformers import util
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import logging
 
-# Modern NLP imports
-from transformers import (
-    AutoTokenizer,
-    pipeline,
-)
-import torch
-from sentence_transformers import SentenceTransformer
+# torch, transformers and sentence_transformers are imported where full
+# mode uses them, so fast mode starts without them installed
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier, VotingClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report
+from sklearn.metrics import accuracy_score, classification_report
 from sklearn.preprocessing import LabelEncoder
 import warnings
 
@@ -28,162 +86,361 @@ warnings.filterwarnings("ignore")
 logging.getLogger("transformers").setLevel(logging.ERROR)
 
 
+# Bump whenever the meaning or order of the feature vector changes
+FEATURE_SPEC_VERSION = 3
+
+# Dimensionality of _extract_simple_features, used when no encoder is available
+SIMPLE_FEATURES_DIM = 8
+
+# preprocess_text patterns, compiled once
+_HTML_TAG = re.compile(r"<[^>]+>")
+_EMAIL_ADDRESS = re.compile(r"\S+@\S+\.\S+")
+_URL = re.compile(r"http\S+|www\S+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Training progress hook: progress(stage, fraction_done). May raise to abort.
+ProgressCallback = Callable[[str, float], None]
+
+# How often a serving process looks for versions and online head snapshots
+# published by another process (see sync_published)
+MODEL_SYNC_SECONDS = float(os.getenv("MODEL_SYNC_SECONDS", "2"))
+
+
+def taxonomy_fingerprint(categories: Dict[str, Any]) -> str:
+    """Short digest of a category taxonomy, to tag results that depend on it"""
+    canonical = json.dumps(categories, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+def _empty_device_cache(device: str):
+    """Release cached accelerator memory; nothing to do (or import) on CPU"""
+    if device == "cuda":
+        import torch
+
+        torch.cuda.empty_cache()
+    elif device == "mps":
+        import torch
+
+        torch.mps.empty_cache()
+
+
+def _report(progress: Optional[ProgressCallback], stage: str, fraction: float):
+    if progress is not None:
+        progress(stage, fraction)
+
+
+# New category system from paste.txt
+DEFAULT_CATEGORIES = {
+    "strategic_planning": {
+        "name": "Strategic Planning",
+        "description": "Long-term business strategy, corporate planning, acquisitions",
+        "keywords": [
+            "strategy",
+            "planning",
+            "acquisition",
+            "merger",
+            "corporate",
+            "vision",
+            "roadmap",
+        ],
+    },
+    "operational": {
+        "name": "Daily Operations",
+        "description": "Day-to-day operations, routine tasks, procedures",
+        "keywords": [
+            "operations",
+            "daily",
+            "routine",
+            "procedure",
+            "process",
+            "workflow",
+        ],
+    },
+    "financial": {
+        "name": "Financial",
+        "description": "Budget, accounting, financial reports, expenses",
+        "keywords": [
+            "budget",
+            "financial",
+            "accounting",
+            "expense",
+            "revenue",
+            "cost",
+            "profit",
+        ],
+    },
+    "legal_compliance": {
+        "name": "Legal & Compliance",
+        "description": "Legal matters, regulatory compliance, contracts",
+        "keywords": [
+            "legal",
+            "compliance",
+            "regulation",
+            "contract",
+            "agreement",
+            "policy",
+        ],
+    },
+    "client_external": {
+        "name": "Client & External",
+        "description": "External communications, client relations, partnerships",
+        "keywords": [
+            "client",
+            "customer",
+            "external",
+            "partner",
+            "vendor",
+            "supplier",
+        ],
+    },
+    "hr_personnel": {
+        "name": "HR & Personnel",
+        "description": "Human resources, hiring, employee matters",
+        "keywords": [
+            "hr",
+            "hiring",
+            "employee",
+            "personnel",
+            "recruitment",
+            "performance",
+        ],
+    },
+    "meetings_events": {
+        "name": "Meetings & Events",
+        "description": "Meeting scheduling, event planning, appointments",
+        "keywords": [
+            "meeting",
+            "appointment",
+            "schedule",
+            "event",
+            "conference",
+            "calendar",
+        ],
+    },
+    "urgent_critical": {
+        "name": "Urgent & Critical",
+        "description": "Time-sensitive, emergency, critical issues",
+        "keywords": [
+            "urgent",
+            "emergency",
+            "critical",
+            "asap",
+            "immediate",
+            "deadline",
+        ],
+    },
+    "personal_informal": {
+        "name": "Personal & Informal",
+        "description": "Personal communications, informal chats, non-work related",
+        "keywords": [
+            "personal",
+            "informal",
+            "casual",
+            "chat",
+            "social",
+            "family",
+        ],
+    },
+    "technical_it": {
+        "name": "Technical & IT",
+        "description": "Technical issues, IT support, system problems",
+        "keywords": [
+            "technical",
+            "system",
+            "software",
+            "hardware",
+            "server",
+            "network",
+        ],
+    },
+}
+
+
 class EnronEmailClassifier:
-    def __init__(self, model_dir="models"):
+    def __init__(self, model_dir="models", encoder_backend=None, mode=None):
         self.model_dir = Path(model_dir)
         self.model_dir.mkdir(exist_ok=True)
 
-        # Device detection and setup
-        self.device = self._get_optimal_device()
+        # "full" (sentence encoder + ensemble) or "fast" (hashed n-grams and a
+        # linear model, see fast_classifier; no transformer is downloaded)
+        self.mode = mode or os.getenv("CLASSIFIER_MODE", "full")
+        if self.mode not in ("full", "fast"):
+            raise ValueError(f"Unknown classifier mode: {self.mode!r}")
+
+        # Sentence encoder backend: "torch" (default), "onnx" or "onnx-int8"
+        self.encoder_backend = encoder_backend or os.getenv("ENCODER_BACKEND", "torch")
+
+        # Size torch / BLAS thread pools from the process budget before loading
+        configure()
+
+        # Device detection and setup; fast mode never touches torch
+        self.device = "cpu" if self.mode == "fast" else self._get_optimal_device()
         print(f"Using device: {self.device}")
 
-        # New category system from paste.txt
-        self.categories = {
-            "strategic_planning": {
-                "name": "Strategic Planning",
-                "description": "Long-term business strategy, corporate planning, acquisitions",
-                "keywords": [
-                    "strategy",
-                    "planning",
-                    "acquisition",
-                    "merger",
-                    "corporate",
-                    "vision",
-                    "roadmap",
-                ],
-            },
-            "operational": {
-                "name": "Daily Operations",
-                "description": "Day-to-day operations, routine tasks, procedures",
-                "keywords": [
-                    "operations",
-                    "daily",
-                    "routine",
-                    "procedure",
-                    "process",
-                    "workflow",
-                ],
-            },
-            "financial": {
-                "name": "Financial",
-                "description": "Budget, accounting, financial reports, expenses",
-                "keywords": [
-                    "budget",
-                    "financial",
-                    "accounting",
-                    "expense",
-                    "revenue",
-                    "cost",
-                    "profit",
-                ],
-            },
-            "legal_compliance": {
-                "name": "Legal & Compliance",
-                "description": "Legal matters, regulatory compliance, contracts",
-                "keywords": [
-                    "legal",
-                    "compliance",
-                    "regulation",
-                    "contract",
-                    "agreement",
-                    "policy",
-                ],
-            },
-            "client_external": {
-                "name": "Client & External",
-                "description": "External communications, client relations, partnerships",
-                "keywords": [
-                    "client",
-                    "customer",
-                    "external",
-                    "partner",
-                    "vendor",
-                    "supplier",
-                ],
-            },
-            "hr_personnel": {
-                "name": "HR & Personnel",
-                "description": "Human resources, hiring, employee matters",
-                "keywords": [
-                    "hr",
-                    "hiring",
-                    "employee",
-                    "personnel",
-                    "recruitment",
-                    "performance",
-                ],
-            },
-            "meetings_events": {
-                "name": "Meetings & Events",
-                "description": "Meeting scheduling, event planning, appointments",
-                "keywords": [
-                    "meeting",
-                    "appointment",
-                    "schedule",
-                    "event",
-                    "conference",
-                    "calendar",
-                ],
-            },
-            "urgent_critical": {
-                "name": "Urgent & Critical",
-                "description": "Time-sensitive, emergency, critical issues",
-                "keywords": [
-                    "urgent",
-                    "emergency",
-                    "critical",
-                    "asap",
-                    "immediate",
-                    "deadline",
-                ],
-            },
-            "personal_informal": {
-                "name": "Personal & Informal",
-                "description": "Personal communications, informal chats, non-work related",
-                "keywords": [
-                    "personal",
-                    "informal",
-                    "casual",
-                    "chat",
-                    "social",
-                    "family",
-                ],
-            },
-            "technical_it": {
-                "name": "Technical & IT",
-                "description": "Technical issues, IT support, system problems",
-                "keywords": [
-                    "technical",
-                    "system",
-                    "software",
-                    "hardware",
-                    "server",
-                    "network",
-                ],
-            },
-        }
+        # Category taxonomy; CATEGORIES_FILE (JSON/YAML) overrides the defaults
+        self.categories = copy.deepcopy(DEFAULT_CATEGORIES)
+        categories_file = os.getenv("CATEGORIES_FILE")
+        if categories_file:
+            try:
+                self.categories = load_taxonomy(categories_file)
+                print(f"Loaded {len(self.categories)} categories from {categories_file}")
+            except Exception as e:
+                print(f"Error loading categories from {categories_file}: {e}")
 
         self.category_names = list(self.categories.keys())
+        self.taxonomy_id = taxonomy_fingerprint(self.categories)
         self.label_encoder = LabelEncoder()
         self.emotion_enhancer = EmotionEnhancer()
 
-        # Initialize models
-        self._initialize_models()
-        self._load_models()
+        # Linear head updated online from user feedback. CLASSIFIER_HEAD picks
+        # what serves predictions: "ensemble", "online", or "auto" (online head
+        # only when the trained model is itself linear)
+        self.serving_head = os.getenv("CLASSIFIER_HEAD", "auto")
+        self.online_model = None
+        # model_version the online head was built on, fixed when it is created
+        self.online_base_version = None
+        # Save time of the head snapshot the online head matches, if any
+        self._online_head_mtime = None
+        self._model_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced_at = time.monotonic()
+        self._sync_failed = None
+        self.feature_cache = FeatureCache()
+        self.ann_index = None
+        self._encoding_pool = None
+        self._encoding_pool_failed = False
+        self.fast_classifier = None
+        # Every published version, with the active and shadow pointers
+        self.registry = ModelRegistry(self.model_dir)
+
+        if self.mode == "fast":
+            self._initialize_fast_mode()
+        else:
+            # Initialize models
+            self._initialize_models()
+            self._load_models()
+            self._load_ann_index()
+
+        # Category names are embedded on first use (see category_index)
+        self._category_keys, self._category_embeds = self.category_names, None
+
+    def _encode_categories(
+        self, categories: Dict[str, Dict[str, Any]]
+    ) -> Tuple[List[str], Optional[np.ndarray]]:
+        """Category keys and the embeddings of their names, in the same order"""
+        category_names = [v["name"] for v in categories.values()]
+        category_embeds = (
+            self.encoder.encode(category_names, batch_size=16)
+            if self.encoder is not None
+            else None
+        )
+        return list(categories.keys()), category_embeds
 
-        category_names = [v["name"] for v in self.categories.values()]
+    def category_index(self) -> Tuple[List[str], Optional[np.ndarray]]:
+        """Consistent ``(keys, embeddings)`` pair of the active taxonomy
 
-        self._category_keys = list(self.categories.keys())
-        self._category_embeds = self.sentence_model.encode(
-            category_names,
-            convert_to_tensor=True,
-            device="cpu",  # CPU-only
-            batch_size=16,
-            show_progress_bar=False,
+        The names are embedded on the first call rather than at start-up, so
+        a pre-fork server's master runs no encoder (torch) work before it
+        forks: torch's thread pools do not survive a fork.
+        """
+        with self._model_lock:
+            keys, embeds = self._category_keys, self._category_embeds
+            categories = self.categories
+        if embeds is not None or self.encoder is None:
+            return keys, embeds
+        keys, embeds = self._encode_categories(categories)
+        with self._model_lock:
+            # Unless reload_categories swapped in another taxonomy meanwhile
+            if self.categories is categories:
+                self._category_keys, self._category_embeds = keys, embeds
+        return keys, embeds
+
+    def reload_categories(
+        self,
+        categories: Optional[Dict[str, Any]] = None,
+        apply: bool = True,
+        update_store: bool = True,
+    ) -> Dict[str, Any]:
+        """Swap in a new category taxonomy without re-encoding any email.
+
+        Only the category names are embedded. Stored email embeddings (the
+        int8 similarity index) are scored against the old and new category
+        embeddings in one pass to report how labels move; with ``apply`` the
+        new taxonomy becomes active and the streaming feature store's labels
+        are rewritten from its embeddings, ready for ``--reuse-store`` training.
+        Without inline ``categories`` the CATEGORIES_FILE taxonomy is reloaded;
+        no other file is read.
+        """
+        if self.encoder is None:
+            raise ValueError("Category reload needs a sentence encoder")
+        if categories is None:
+            path = os.getenv("CATEGORIES_FILE")
+            if not path:
+                raise ValueError("Expected inline categories (CATEGORIES_FILE unset)")
+            categories = load_taxonomy(path)
+        categories = validate_categories(categories)
+
+        start = time.perf_counter()
+        new_keys, new_embeds = self._encode_categories(categories)
+        report = {
+            "categories": new_keys,
+            "encode_ms": round((time.perf_counter() - start) * 1000, 2),
+            "applied": apply,
+        }
+
+        if self.ann_index is not None:
+            start = time.perf_counter()
+            old_keys, old_embeds = self.category_index()
+            sims = self.ann_index.cosine_similarity(np.vstack([old_embeds, new_embeds]))
+            old_labels = np.array(old_keys)[sims[:, : len(old_keys)].argmax(axis=1)]
+            new_labels = np.array(new_keys)[sims[:, len(old_keys) :].argmax(axis=1)]
+            keys, counts = np.unique(new_labels, return_counts=True)
+            report["relabel"] = {
+                "n_emails": int(len(new_labels)),
+                "relabel_ms": round((time.perf_counter() - start) * 1000, 2),
+                "changed_fraction": round(float(np.mean(old_labels != new_labels)), 4),
+                "label_distribution": {
+                    str(k): int(c) for k, c in zip(keys, counts.tolist())
+                },
+            }
+
+        if not apply:
+            return report
+
+        with self._model_lock:
+            self.categories = categories
+            self.category_names = new_keys
+            self.taxonomy_id = taxonomy_fingerprint(categories)
+            self._category_keys, self._category_embeds = new_keys, new_embeds
+
+        model_classes = (
+            set(self.label_encoder.classes_)
+            if hasattr(self.label_encoder, "classes_")
+            else set()
         )
+        report["retrain_required"] = bool(model_classes) and model_classes != set(
+            new_keys
+        )
+
+        if update_store:
+            from app.services.streaming_trainer import StreamingTrainer
+
+            trainer = StreamingTrainer(self, db_path=None)
+            if trainer.has_store():
+                report["feature_store"] = trainer.relabel_store()
+
+        print(
+            f"Category taxonomy reloaded: {len(new_keys)} categories "
+            f"(retrain required: {report['retrain_required']})"
+        )
+        return report
 
     def _get_optimal_device(self):
         """Detect and return the best available device"""
+        import torch
+
+        # The thread budget reaches torch once it is loaded
+        configure_torch()
         if torch.cuda.is_available():
             device = "cuda"
             print(f"CUDA detected: {torch.cuda.get_device_name()}")
@@ -209,11 +466,14 @@ class EnronEmailClassifier:
 
     def _initialize_models(self):
         """Initialize transformer models with optimal device settings"""
+        from sentence_transformers import SentenceTransformer
+        from transformers import AutoTokenizer, pipeline
+
         try:
             # Sentence transformer for embeddings with device optimization
             print("Loading sentence transformer model...")
             self.sentence_model = SentenceTransformer(
-                "all-MiniLM-L6-v2", device=self.device
+                ENCODER_MODEL_NAME, device=self.device
             )
 
             # For MPS, we might need to handle some edge cases
@@ -259,7 +519,7 @@ class EnronEmailClassifier:
             # Fallback to CPU
             try:
                 self.sentence_model = SentenceTransformer(
-                    "all-MiniLM-L6-v2", device="cpu"
+                    ENCODER_MODEL_NAME, device="cpu"
                 )
                 self.classifier_pipeline = pipeline(
                     "zero-shot-classification",
@@ -273,96 +533,485 @@ class EnronEmailClassifier:
                 self.sentence_model = None
                 self.classifier_pipeline = None
 
-    def _load_models(self):
-        """Load pre-trained models if they exist"""
-        model_path = self.model_dir / "email_classifier.pkl"
+        self._initialize_encoder()
 
-        if model_path.exists():
-            try:
-                with open(model_path, "rb") as f:
-                    saved_data = pickle.load(f)
-                    self.ensemble_model = saved_data.get("model")
-                    self.label_encoder = saved_data.get(
-                        "label_encoder", self.label_encoder
-                    )
-                print("Loaded pre-trained model")
-            except Exception as e:
-                print(f"Could not load model: {e}")
-                self.ensemble_model = None
+    def _initialize_fast_mode(self):
+        """Serve the fast-mode model; no transformer is loaded or downloaded"""
+        self.sentence_model = None
+        self.tokenizer = None
+        self.classifier_pipeline = None
+        self.encoder = None
+        self.fast_classifier = FastEmailClassifier(
+            self.model_dir, self.categories, self.emotion_enhancer
+        )
+        self._sync_fast_model()
+        if self.model_manifest:
+            self._register_loaded(self.fast_classifier.artifact_dir)
+        print("Classifier mode: fast (hashed n-grams + linear model)")
+
+    def _sync_fast_model(self):
+        """Mirror the fast model so routes and jobs see it like any other"""
+        fast = self.fast_classifier
+        with self._model_lock:
+            self.ensemble_model = fast.model
+            self.label_encoder = fast.label_encoder
+            self.model_manifest = fast.manifest
+            self.model_load_error = fast.load_error
+
+    def train_fast(
+        self,
+        enron_db_path: str,
+        max_emails: Optional[int] = None,
+        labels: str = "stored",
+        chunk_size: int = 4096,
+        epochs: int = 3,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        """Train and publish the fast-mode model out of core (see FastTrainer)"""
+        if self.fast_classifier is None:
+            raise ValueError("train_fast needs the classifier in fast mode")
+        trainer = FastTrainer(
+            self.fast_classifier,
+            enron_db_path,
+            labels=labels,
+            chunk_size=chunk_size,
+            epochs=epochs,
+        )
+        trainer.progress = progress
+        stats = trainer.run(max_emails=max_emails)
+        self._sync_fast_model()
+        return stats
+
+    def _initialize_encoder(self):
+        """Wrap the sentence model in the configured encoder backend"""
+        if self.sentence_model is None:
+            self.encoder = None
+            return
+
+        # ONNX backends run on CPU only; GPU devices keep the torch backend
+        backend = self.encoder_backend if self.device == "cpu" else "torch"
+        self.encoder = build_encoder(
+            backend, self.sentence_model, self.model_dir, device=self.device
+        )
+        print(f"Sentence encoder backend: {self.encoder.name}")
+
+    @property
+    def artifact_dir(self) -> Path:
+        return self.model_dir / "email_classifier"
+
+    def feature_spec(self) -> Dict[str, Any]:
+        """Describe the feature vector this runtime produces"""
+        if self.encoder is not None:
+            embedding = {"model": ENCODER_MODEL_NAME, "dim": self.encoder.dim}
         else:
+            embedding = {"model": "simple_features", "dim": SIMPLE_FEATURES_DIM}
+        return {
+            "version": FEATURE_SPEC_VERSION,
+            "embedding": embedding,
+            "metadata_features": METADATA_FEATURES,
+            "n_features": embedding["dim"] + len(METADATA_FEATURES),
+        }
+
+    def _load_models(self):
+        """Load the pre-trained model artifact, refusing mismatched ones"""
+        self.ensemble_model = None
+        self.model_manifest = None
+        self.model_load_error = None
+
+        if not readable_dir(self.artifact_dir, MANIFEST_FILE).exists():
+            self._migrate_legacy_pickle()
+            return
+
+        try:
+            start = time.perf_counter()
+            model, classes, manifest = load_artifact(
+                self.artifact_dir,
+                self.feature_spec(),
+                verify_checksums=os.getenv("ARTIFACT_VERIFY", "1") != "0",
+            )
+            label_encoder = LabelEncoder()
+            label_encoder.classes_ = classes
+            set_n_jobs(model, allocation()["sklearn_serve_n_jobs"])
+            self.ensemble_model = model
+            self.label_encoder = label_encoder
+            self.model_manifest = manifest
+            self._load_online_head()
+            print(
+                f"Loaded model {manifest['model_version']} "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+            self._register_loaded(self.artifact_dir)
+        except ArtifactError as e:
+            self.model_load_error = str(e)
+            print(f"Refusing model artifact in {self.artifact_dir}: {e}")
+        except Exception as e:
+            self.model_load_error = str(e)
+            print(f"Could not load model: {e}")
+
+    def _register_loaded(self, artifact_dir: Path):
+        """Record the served artifact, e.g. one published before the registry"""
+        try:
+            self.registry.register(artifact_dir, self.model_manifest)
+        except Exception as e:
+            print(f"Could not register model {self.model_version}: {e}")
+
+    def activate_version(self, model_version: str) -> Dict[str, Any]:
+        """Serve a registered version (rollout or rollback) from now on
+
+        A version for this process's mode is loaded from the registry first,
+        so one this runtime cannot serve (e.g. built with another encoder)
+        is refused before the serving directory or the active pointer
+        change. It is then swapped in under the model lock like a newly
+        trained model. Other worker processes follow the active pointer
+        (see sync_published).
+        """
+        serves_here = version_kind(model_version) == self.mode
+        loaded = self._load_version(model_version) if serves_here else None
+        entry = self.registry.activate(model_version)
+        if serves_here:
+            self._swap_in_version(model_version, loaded)
+        return entry
+
+    def _load_version(self, model_version: str):
+        """Load a registered version of this mode without serving it yet"""
+        version_dir = self.registry.version_dir(model_version)
+        # Checksums are verified by the registry before it copies
+        if self.fast_classifier is not None:
+            load_artifact(version_dir, fast_feature_spec(), verify_checksums=False)
+            return None
+        return load_artifact(version_dir, self.feature_spec(), verify_checksums=False)
+
+    def _swap_in_version(self, model_version: str, loaded):
+        """Serve a version loaded by _load_version
+
+        Fast mode reloads its serving directory, where the registry installed
+        the version.
+        """
+        if self.fast_classifier is not None:
+            self.fast_classifier.load()
+            self._sync_fast_model()
+            if self.model_version != model_version:
+                raise ArtifactError(
+                    f"Could not load {model_version}: {self.model_load_error}"
+                )
+            return
+
+        model, classes, manifest = loaded
+        label_encoder = LabelEncoder()
+        label_encoder.classes_ = classes
+        set_n_jobs(model, allocation()["sklearn_serve_n_jobs"])
+        with self._model_lock:
+            self.ensemble_model = model
+            self.label_encoder = label_encoder
+            self.model_manifest = manifest
+            self.model_load_error = None
+        self._load_online_head()
+
+    def sync_published(self):
+        """Pick up what another process published since the last check
+
+        Each pre-fork worker serves its own copy of the model: a version
+        activated or trained in one worker, and the feedback snapshots it
+        saves, reach the others here. The routes call this before every
+        request; the registry pointer and the head snapshot are only
+        checked every MODEL_SYNC_SECONDS.
+        """
+        now = time.monotonic()
+        if now - self._synced_at < MODEL_SYNC_SECONDS:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return  # another request thread is checking
+        try:
+            self._synced_at = now
+            active = self.registry.active().get(self.mode)
+            if active not in (None, self.model_version, self._sync_failed):
+                try:
+                    self._swap_in_version(active, self._load_version(active))
+                    print(f"Serving {active}, published by another process")
+                except Exception as e:
+                    # Not retried until another version is activated
+                    self._sync_failed = active
+                    print(f"Could not load {active} published elsewhere: {e}")
+            elif (
+                self.fast_classifier is None
+                and self.ensemble_model is not None
+                and online_head_mtime(self.model_dir) != self._online_head_mtime
+            ):
+                self._load_online_head()
+        except Exception as e:
+            print(f"Could not check for published models: {e}")
+        finally:
+            self._sync_lock.release()
+
+    def _migrate_legacy_pickle(self):
+        """Convert an old email_classifier.pkl into a versioned artifact"""
+        legacy_path = self.model_dir / "email_classifier.pkl"
+        if not legacy_path.exists():
+            return
+
+        try:
+            with open(legacy_path, "rb") as f:
+                saved_data = pickle.load(f)
+            model = saved_data.get("model")
+            label_encoder = saved_data.get("label_encoder")
+            spec = self.feature_spec()
+            if getattr(model, "n_features_in_", None) != spec["n_features"]:
+                raise ArtifactError(
+                    f"legacy model expects {getattr(model, 'n_features_in_', '?')} "
+                    f"features, runtime produces {spec['n_features']}"
+                )
+            self.publish_model(
+                model, label_encoder, metadata={"migrated_from": legacy_path.name}
+            )
+            print(f"Migrated legacy {legacy_path.name} to {self.artifact_dir}")
+        except Exception as e:
             self.ensemble_model = None
+            self.model_load_error = str(e)
+            print(f"Could not load legacy model {legacy_path}: {e}")
+
+    def _load_online_head(self):
+        """Restore the feedback-updated head, or derive it from a linear model"""
+        head_mtime = online_head_mtime(self.model_dir)
+        online_model = load_online_head(self.model_dir, self.model_version)
+        if online_model is None and is_online_head(self.ensemble_model):
+            online_model = copy_online_head(self.ensemble_model)
+        with self._model_lock:
+            self.online_model = online_model
+            self.online_base_version = self.model_version
+            self._online_head_mtime = head_mtime
+
+    def online_head(self):
+        """``(online head, model_version it was built on)``, read together"""
+        with self._model_lock:
+            return self.online_model, self.online_base_version
+
+    def set_online_model(
+        self, model, base_version: str, head_mtime: Optional[int] = None
+    ) -> bool:
+        """Swap in an updated online head unless the model changed meanwhile
+
+        Returns False, leaving the current head, when a new model was
+        published or activated since the head being updated was read.
+        ``head_mtime`` is given when ``model`` was just saved as the snapshot.
+        """
+        with self._model_lock:
+            if base_version != self.online_base_version:
+                return False
+            self.online_model = model
+            if head_mtime is not None:
+                self._online_head_mtime = head_mtime
+            return True
+
+    @property
+    def serving_online_head(self) -> bool:
+        if self.online_model is None or self.serving_head == "ensemble":
+            return False
+        return self.serving_head == "online" or is_online_head(self.ensemble_model)
+
+    def _serving_model(self):
+        """Return a consistent ``(model, label_encoder)`` pair for prediction"""
+        with self._model_lock:
+            model = (
+                self.online_model if self.serving_online_head else self.ensemble_model
+            )
+            return model, self.label_encoder
+
+    @property
+    def model_version(self):
+        return self.model_manifest["model_version"] if self.model_manifest else None
+
+    @property
+    def results_version(self) -> Optional[str]:
+        """Version stored with predictions: the model and the taxonomy
+
+        Predictions carry category names from the taxonomy, so results stored
+        before a reload_categories are not reused after it.
+        """
+        if self.model_version is None:
+            return None
+        return f"{self.model_version}+taxonomy-{self.taxonomy_id}"
 
-    def _save_models(self):
-        """Save trained models"""
-        model_path = self.model_dir / "email_classifier.pkl"
+    def _save_models(
+        self,
+        model,
+        label_encoder: LabelEncoder,
+        online_model=None,
+        metadata: Dict[str, Any] = None,
+    ):
+        """Save a trained model as a versioned artifact directory
+
+        Errors propagate: a model that could not be persisted must not be
+        swapped in, so the training job fails and the old model keeps serving.
+        """
+        metadata = {
+            "encoder_backend": self.encoder.name if self.encoder else None,
+            "device": self.device,
+            **(metadata or {}),
+        }
 
         try:
-            with open(model_path, "wb") as f:
-                pickle.dump(
-                    {"model": self.ensemble_model, "label_encoder": self.label_encoder},
-                    f,
+            manifest = save_artifact(
+                self.artifact_dir,
+                model,
+                label_encoder.classes_,
+                self.feature_spec(),
+                metadata,
+            )
+            print(f"Model {manifest['model_version']} saved to {self.artifact_dir}")
+            self.registry.register(self.artifact_dir, manifest)
+            if online_model is not None:
+                save_online_head(
+                    self.model_dir,
+                    online_model,
+                    {
+                        "base_model_version": manifest["model_version"],
+                        "feedback_updates": 0,
+                    },
                 )
-            print("Model saved successfully")
+            return manifest
         except Exception as e:
             print(f"Could not save model: {e}")
+            raise
+
+    def publish_model(
+        self,
+        model,
+        label_encoder: LabelEncoder,
+        online_model=None,
+        metadata: Dict[str, Any] = None,
+    ):
+        """Persist a newly trained model and make it the active one.
+
+        The swap happens under a lock only after training has finished, so
+        concurrent predictions never see a half-trained classifier.
+        """
+        # Training may have used the whole thread budget; serving must not
+        set_n_jobs(model, allocation()["sklearn_serve_n_jobs"])
+        manifest = self._save_models(model, label_encoder, online_model, metadata)
+        with self._model_lock:
+            self.ensemble_model = model
+            self.label_encoder = label_encoder
+            self.online_model = online_model
+            self.online_base_version = manifest["model_version"]
+            self._online_head_mtime = online_head_mtime(self.model_dir)
+            self.model_manifest = manifest
+        return manifest
+
+    def _load_ann_index(self):
+        if self.encoder is None:
+            return
+        self.ann_index = load_index(self.model_dir, self.feature_spec()["embedding"])
+
+    def publish_ann_index(self, index: IVFIndex):
+        """Persist a similarity index and make it the one used for search"""
+        index.save(self.model_dir / ANN_INDEX_DIR)
+        self.ann_index = index
+
+    def _bulk_encoding_pool(self, n_texts: int) -> Optional[EncodingPool]:
+        """Process pool for encoding ``n_texts`` on CPU, or None to stay in-process
+
+        Enabled with ENCODER_WORKERS > 1; started on first use and kept until
+        close_encoding_pool, so chunked callers do not pay worker start-up twice.
+        """
+        if (
+            self.encoder is None
+            or self.device != "cpu"
+            or DEFAULT_ENCODER_WORKERS <= 1
+            or self._encoding_pool_failed
+            or n_texts < 2 * DEFAULT_POOL_CHUNK_SIZE
+        ):
+            return None
+        if self._encoding_pool is None or self._encoding_pool.pid != os.getpid():
+            self._encoding_pool = EncodingPool(self.encoder.name, self.model_dir)
+        return self._encoding_pool
+
+    def _encoding_pool_error(self, e: Exception):
+        print(f"Encoding pool failed ({e}); encoding in-process from now on")
+        self._encoding_pool_failed = True
+        self.close_encoding_pool()
+
+    def close_encoding_pool(self):
+        """Stop the encoder worker processes, freeing their model copies"""
+        if self._encoding_pool is not None:
+            if self._encoding_pool.pid == os.getpid():
+                self._encoding_pool.close()
+            self._encoding_pool = None
+
+    def embed_text(self, text: str) -> Optional[np.ndarray]:
+        """Sentence embedding of a single text, as used in the feature vector"""
+        if self.encoder is None:
+            return None
+        return self.encoder.encode([self.preprocess_text(text)], batch_size=1)[0]
 
     def preprocess_text(self, text: str) -> str:
         """Clean and preprocess email text"""
         if pd.isna(text) or not text:
             return ""
 
-        text = str(text).lower()
+        # Bounded window without quoted/forwarded history (see text_normalizer)
+        text = normalize_text(text, "encoder").lower()
         # Remove HTML tags
-        text = re.sub(r"<[^>]+>", "", text)
+        text = _HTML_TAG.sub("", text)
         # Remove email addresses and URLs
-        text = re.sub(r"\S+@\S+\.\S+", "[EMAIL]", text)
-        text = re.sub(r"http\S+|www\S+", "[URL]", text)
+        text = _EMAIL_ADDRESS.sub("[EMAIL]", text)
+        text = _URL.sub("[URL]", text)
         # Remove excessive whitespace
-        text = re.sub(r"\s+", " ", text).strip()
+        text = _WHITESPACE.sub(" ", text).strip()
 
         return text
 
-    def extract_embeddings(self, texts: List[str]) -> np.ndarray:
+    def extract_embeddings(
+        self, texts: List[str], progress: Optional[ProgressCallback] = None
+    ) -> np.ndarray:
         """Extract sentence embeddings using transformer model with GPU acceleration"""
-        if self.sentence_model is None:
+        if self.encoder is None:
             # Fallback to simple text features
             return self._extract_simple_features(texts)
 
         try:
-            # Use batch processing for better GPU utilization
-            batch_size = 32 if self.device in ["cuda", "mps"] else 16
+            # Larger token budget per batch on GPU
+            token_budget = (
+                DEFAULT_TOKEN_BUDGET * 2
+                if self.device in ["cuda", "mps"]
+                else DEFAULT_TOKEN_BUDGET
+            )
 
             print(
-                f"Extracting embeddings for {len(texts)} texts using {self.device}..."
+                f"Extracting embeddings for {len(texts)} texts using {self.device} "
+                f"({self.encoder.name} backend)..."
             )
 
-            # Process in batches to optimize GPU memory usage
-            embeddings = []
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i : i + batch_size]
-
-                # Clear GPU cache before processing each batch
-                if self.device == "cuda":
-                    torch.cuda.empty_cache()
-                elif self.device == "mps":
-                    torch.mps.empty_cache()
-
-                batch_embeddings = self.sentence_model.encode(
-                    batch_texts,
-                    show_progress_bar=False,
-                    convert_to_numpy=True,
-                    device=self.device,
+            embedding_progress = (
+                (lambda fraction: progress("embedding", fraction))
+                if progress is not None
+                else None
+            )
+            final_embeddings = None
+            pool = self._bulk_encoding_pool(len(texts))
+            if pool is not None:
+                try:
+                    final_embeddings = pool.encode(texts, progress=embedding_progress)
+                except TrainingCancelled:
+                    raise
+                except Exception as e:
+                    self._encoding_pool_error(e)
+
+            if final_embeddings is None:
+                # Length-bucketed batches sized by token budget, in input order
+                final_embeddings = encode_bucketed(
+                    self.encoder,
+                    texts,
+                    token_budget=token_budget,
+                    progress=embedding_progress,
                 )
-                embeddings.append(batch_embeddings)
-
-            # Concatenate all batch results
-            final_embeddings = np.vstack(embeddings)
 
             print(
                 f"Successfully extracted embeddings with shape: {final_embeddings.shape}"
             )
             return final_embeddings
 
+        except TrainingCancelled:
+            raise
         except Exception as e:
             print(f"Error extracting embeddings on {self.device}: {e}")
             print("Falling back to simple features...")
@@ -412,50 +1061,57 @@ class EnronEmailClassifier:
 
         return np.array(features)
 
-    def extract_features(self, email_data: pd.DataFrame) -> np.ndarray:
+    def extract_features(
+        self,
+        email_data: pd.DataFrame,
+        progress: Optional[ProgressCallback] = None,
+    ) -> np.ndarray:
         """Extract comprehensive features from email data with GPU acceleration"""
         print(f"Extracting features using {self.device}...")
 
-        # Combine subject and body
-        combined_text = (
-            email_data["subject"].fillna("").astype(str)
-            + " "
-            + email_data["body"].fillna("").astype(str)
-        )
+        # Combine subject and the cleaned body (stored at ingest when available)
+        clean_bodies = self.clean_bodies(email_data)
+        combined_text = [
+            f"{subject} {body}"
+            for subject, body in zip(
+                email_data["subject"].fillna("").astype(str), clean_bodies
+            )
+        ]
 
         # Preprocess text
         processed_texts = [self.preprocess_text(text) for text in combined_text]
 
         # Get embeddings with GPU acceleration
-        text_embeddings = self.extract_embeddings(processed_texts)
+        text_embeddings = self.extract_embeddings(processed_texts, progress=progress)
 
-        # Extract metadata features (this stays on CPU as it's lightweight)
-        print("Extracting metadata features...")
-        metadata_features = []
-        for _, row in email_data.iterrows():
-            # Get emotion analysis
+        # Metadata and emotion features: read from email_features when the
+        # rows were loaded with FEATURE_JOIN, computed only for the rest
+        metadata_features, stored = stored_metadata(email_data)
+        missing = np.flatnonzero(~stored)
+        n_rows = len(email_data)
+        print(
+            f"Extracting metadata features for {len(missing)} emails "
+            f"({n_rows - len(missing)} stored)..."
+        )
+        columns = [
+            column
+            for column in (
+                "subject",
+                "body",
+                "has_attachment",
+                "num_recipients",
+                "time_sent",
+            )
+            if column in email_data
+        ]
+        rows = email_data[columns].iloc[missing].to_dict("records")
+        for n, (i, row) in enumerate(zip(missing, rows)):
+            if n % 256 == 0:
+                _report(progress, "metadata", n / max(len(missing), 1))
             emotion_data = self.emotion_enhancer.enhance_emotion_analysis(
-                str(row.get("body", ""))
+                clean_bodies[i]
             )
-
-            meta_features = [
-                len(str(row.get("subject", ""))),
-                len(str(row.get("body", ""))),
-                int(row.get("has_attachment", False)),
-                row.get("num_recipients", 1),
-                (
-                    row.get("time_sent", pd.Timestamp("2000-01-01")).hour
-                    if pd.notna(row.get("time_sent"))
-                    else 12
-                ),
-                emotion_data.get("polarity", 0),
-                emotion_data.get("subjectivity", 0),
-                emotion_data.get("stress_score", 0),
-                emotion_data.get("relaxation_score", 0),
-            ]
-            metadata_features.append(meta_features)
-
-        metadata_features = np.array(metadata_features)
+            metadata_features[i] = metadata_row(row, emotion_data)
 
         # Combine embeddings and metadata
         if text_embeddings.shape[0] > 0:
@@ -466,6 +1122,111 @@ class EnronEmailClassifier:
         print(f"Final feature shape: {features.shape}")
         return features
 
+    def featurize_one(
+        self,
+        message: Dict[str, Any],
+        emotion_data: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        """Feature vector for a single email, without going through pandas
+
+        Produces the same vector as ``extract_features`` on a one-row frame,
+        written straight into a preallocated array.
+        """
+        dim = self.encoder.dim if self.encoder is not None else SIMPLE_FEATURES_DIM
+        features = np.empty(dim + len(METADATA_FEATURES), dtype=np.float64)
+
+        subject = message.get("subject")
+        with stage("preprocess"):
+            body = clean_body_of(message)
+            text = self.preprocess_text(f"{'' if subject is None else subject} {body}")
+        if self.encoder is not None:
+            try:
+                # The simple features below are computed on the whole text
+                truncated = truncate_texts([text], self.encoder.max_seq_length)[0]
+                with stage("encode"):
+                    features[:dim] = self.encoder.encode([truncated], batch_size=1)[0]
+            except Exception as e:
+                print(f"Error extracting embedding on {self.device}: {e}")
+                features[:dim] = self._extract_simple_features([text])[0]
+            else:
+                # Outside the try: a tokenizer error here is not an encoder failure
+                self._count_encoder_tokens([truncated])
+        else:
+            features[:dim] = self._extract_simple_features([text])[0]
+
+        if emotion_data is None:
+            with stage("emotion"):
+                emotion_data = self.emotion_enhancer.enhance_emotion_analysis(body)
+        with stage("metadata"):
+            features[dim:] = metadata_row(message, emotion_data)
+        return features
+
+    def featurize_many(
+        self,
+        messages: List[Dict[str, Any]],
+        emotions: Optional[List[Dict[str, Any]]] = None,
+    ) -> np.ndarray:
+        """featurize_one for several emails, with a single batched encoder call"""
+        dim = self.encoder.dim if self.encoder is not None else SIMPLE_FEATURES_DIM
+        features = np.empty(
+            (len(messages), dim + len(METADATA_FEATURES)), dtype=np.float64
+        )
+
+        with stage("preprocess"):
+            bodies = [clean_body_of(message) for message in messages]
+            texts = [
+                self.preprocess_text(f"{message.get('subject') or ''} {body}")
+                for message, body in zip(messages, bodies)
+            ]
+        if self.encoder is not None:
+            try:
+                with stage("encode"):
+                    features[:, :dim] = encode_bucketed(self.encoder, texts)
+            except Exception as e:
+                print(f"Error extracting embeddings on {self.device}: {e}")
+                features[:, :dim] = self._extract_simple_features(texts)
+            else:
+                self._count_encoder_tokens(texts)
+        else:
+            features[:, :dim] = self._extract_simple_features(texts)
+
+        if emotions is None:
+            with stage("emotion"):
+                emotions = [
+                    self.emotion_enhancer.enhance_emotion_analysis(body)
+                    for body in bodies
+                ]
+        with stage("metadata"):
+            for i, message in enumerate(messages):
+                features[i, dim:] = metadata_row(message, emotions[i])
+        return features
+
+    def _count_encoder_tokens(self, texts: List[str]):
+        """Record encoder input tokens in the active profile, if any"""
+        if current_profile() is None or self.encoder is None:
+            return
+        # A second tokenizer pass, so it only runs when profiling
+        with stage("token_count"):
+            profile_count(
+                "encoder_tokens",
+                token_lengths(
+                    self.encoder.tokenizer, texts, self.encoder.max_seq_length
+                ).sum(),
+            )
+        profile_count("encoder_texts", len(texts))
+
+    def _count_transformer_tokens(self, texts: List[str]):
+        """Record zero-shot pipeline input tokens in the active profile, if any"""
+        tokenizer = getattr(self.classifier_pipeline, "tokenizer", None)
+        if current_profile() is None or tokenizer is None:
+            return
+        with stage("token_count"):
+            profile_count(
+                "transformer_tokens",
+                token_lengths(tokenizer, texts, tokenizer.model_max_length).sum(),
+            )
+        profile_count("transformer_texts", len(texts))
+
     def classify_with_transformers(self, texts: List[str]) -> List[Dict]:
         """Use zero-shot classification with transformers and GPU acceleration"""
         if self.classifier_pipeline is None:
@@ -486,10 +1247,7 @@ class EnronEmailClassifier:
                 batch_texts = texts[i : i + batch_size]
 
                 # Clear GPU cache before each batch
-                if self.device == "cuda":
-                    torch.cuda.empty_cache()
-                elif self.device == "mps":
-                    torch.mps.empty_cache()
+                _empty_device_cache(self.device)
 
                 for text in batch_texts:
                     if not text.strip():
@@ -529,44 +1287,66 @@ class EnronEmailClassifier:
         self,
         texts: List[str],
         chunk_size: int = 256,
+        progress: Optional[ProgressCallback] = None,
     ) -> List[str]:
         """
         Fast “zero-shot” by embedding + cosine similarity.
         """
-        labels: List[str] = []
         print(f"[EmbedZeroShot] Encoding {len(texts)} texts in chunks of {chunk_size}")
 
-        # 1) Embed all emails in batches
-        email_embeds = []
+        # Fan out to encoder processes when configured; chunks stream back in
+        # order and are labelled as they arrive
+        pool = self._bulk_encoding_pool(len(texts))
+        if pool is not None:
+            try:
+                labels = []
+                for embs in pool.imap(texts):
+                    labels.extend(self.label_embeddings(embs))
+                    _report(progress, "labeling", len(labels) / len(texts))
+                print(f"[EmbedZeroShot] Assigned {len(labels)} labels")
+                return labels
+            except TrainingCancelled:
+                raise
+            except Exception as e:
+                self._encoding_pool_error(e)
+
+        # Embed each chunk and label it straight away, so only one chunk of
+        # float32 embeddings is ever held in memory
+        labels = []
         for i in range(0, len(texts), chunk_size):
             batch = texts[i : i + chunk_size]
-            embs = self.sentence_model.encode(
-                batch,
-                convert_to_tensor=True,
-                device="cpu",
-                batch_size=chunk_size,
-                show_progress_bar=False,
-            )
-            email_embeds.append(embs)
-            print(f"  • Encoded emails {i}–{i+len(batch)-1}")
+            embs = encode_bucketed(self.encoder, batch)
+            labels.extend(self.label_embeddings(embs))
+            print(f"  • Encoded and labelled emails {i}–{i+len(batch)-1}")
+            _report(progress, "labeling", (i + len(batch)) / len(texts))
 
-        # Concatenate into one tensor of shape (N_emails, dim)
-        email_embeds = torch.cat(email_embeds, dim=0)
+        print(f"[EmbedZeroShot] Assigned {len(labels)} labels")
+        return labels
 
-        # 2) Compute cosine similarities: (N_emails × N_categories)
-        print("[EmbedZeroShot] Computing cosine similarities…")
-        sims = util.cos_sim(email_embeds, self._category_embeds)
+    def label_embeddings(self, embeddings) -> List[str]:
+        """Assign each email embedding the category with the closest description
 
-        # 3) Pick best category per email
-        top_scores, top_idxs = sims.max(dim=1)
-        for idx, score in zip(top_idxs.tolist(), top_scores.tolist()):
-            cat_key = self._category_keys[idx]
-            labels.append(cat_key)
+        ``embeddings`` may be a float array or a compact store with its own
+        ``cosine_similarity`` kernel (QuantizedEmbeddings, IVFIndex), which is
+        scored block by block without dequantizing the whole corpus.
+        """
+        category_keys, category_embeds = self.category_index()
+        # (N_emails × N_categories)
+        if hasattr(embeddings, "cosine_similarity"):
+            sims = embeddings.cosine_similarity(category_embeds)
+        else:
+            sims = self._cosine_similarity(embeddings, category_embeds)
+        return [category_keys[idx] for idx in sims.argmax(axis=1).tolist()]
 
-        print(f"[EmbedZeroShot] Assigned {len(labels)} labels")
-        return labels
+    @staticmethod
+    def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Cosine similarity matrix between the rows of ``a`` and ``b``"""
+        a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+        b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+        return a @ b.T
 
-    def map_folder_to_category(self, folder_name: str) -> str:
+    @staticmethod
+    def map_folder_to_category(folder_name: str) -> str:
         """Map folder names to categories using keyword matching"""
         if pd.isna(folder_name) or not folder_name:
             return "operational"
@@ -737,42 +1517,91 @@ class EnronEmailClassifier:
         else:
             return "operational"  # Default category
 
+    @staticmethod
+    def prepare_email_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """Add the columns extract_features expects to rows read from SQLite"""
+        df["has_attachment"] = False
+        df["num_recipients"] = 1
+        df["time_sent"] = pd.to_datetime(df["time_sent"], errors="coerce")
+        # Clean each body once; later passes reuse the column
+        df["clean_body"] = EnronEmailClassifier.clean_bodies(df)
+        df["clean_body_version"] = CLEAN_BODY_VERSION
+        return df
+
+    @staticmethod
+    def clean_bodies(email_data: pd.DataFrame) -> List[str]:
+        """Stored ``clean_body`` per row when current, else the body cleaned now"""
+        columns = [
+            column
+            for column in ("body", "clean_body", "clean_body_version")
+            if column in email_data
+        ]
+        return [clean_body_of(row) for row in email_data[columns].to_dict("records")]
+
     def load_enron_emails(
-        self, enron_db_path: str, max_emails: int = 5000
+        self,
+        enron_db_path: str,
+        max_emails: int = 5000,
+        progress: Optional[ProgressCallback] = None,
     ) -> Tuple[pd.DataFrame, np.ndarray]:
         """Load emails from SQLite database"""
-        conn = sqlite3.connect(enron_db_path)
-        query = """
+        _report(progress, "loading", 0.0)
+        # The training source is only read; backfills add the derived columns
+        conn = connect_readonly(enron_db_path)
+        feature_columns, feature_join = stored_feature_sql(conn)
+        query = f"""
             SELECT
                 e.id AS email_id,
                 e.from_address AS sender,
                 e.subject AS subject,
                 e.body AS body,
+                {clean_body_columns(conn)},
                 f.name AS folder_name,
-                e.date AS time_sent
+                e.date AS time_sent,
+                {feature_columns}
             FROM emails e
             JOIN folders f ON e.folder_id = f.id
+            {feature_join}
             LIMIT ?
         """
         df = pd.read_sql_query(query, conn, params=(max_emails,))
         conn.close()
 
         # Add missing columns
-        df["has_attachment"] = False
-        df["num_recipients"] = 1
-        df["time_sent"] = pd.to_datetime(df["time_sent"], errors="coerce")
+        df = self.prepare_email_frame(df)
 
         # Map folders to categories
-        texts = (df.subject.fillna("") + " " + df.body.fillna("")).tolist()
-        labels = self.label_with_zero_shot(texts)
+        texts = (df.subject.fillna("") + " " + df.clean_body).tolist()
+        _report(progress, "loading", 1.0)
+        labels = self.label_with_zero_shot(texts, progress=progress)
 
         # Drop folder_name column
         df = df.drop(columns=["folder_name"])
 
         return df, np.array(labels)
 
-    def train(self, email_data: pd.DataFrame, labels: np.ndarray):
-        """Train the classifier with modern ensemble approach and GPU acceleration"""
+    def train(
+        self,
+        email_data: pd.DataFrame,
+        labels: np.ndarray,
+        progress: Optional[ProgressCallback] = None,
+        distill: Optional[bool] = None,
+        latency_budget_ms: Optional[float] = None,
+    ):
+        """Train the classifier with modern ensemble approach and GPU acceleration
+
+        The new model is built on the side and only swapped in (see
+        publish_model) once it is fitted, evaluated and saved. ``progress`` is
+        called as ``progress(stage, fraction)`` and may raise to abort.
+
+        With ``distill`` (default: CLASSIFIER_DISTILL) the ensemble is also
+        distilled into linear / small-MLP heads and the most accurate model
+        within ``latency_budget_ms`` is the one served.
+        """
+        if self.fast_classifier is not None:
+            raise ValueError("Fast mode is trained out of core with train_fast")
+        if distill is None:
+            distill = os.getenv("CLASSIFIER_DISTILL", "0") == "1"
         print(f"Training modern email classifier on {self.device}...")
 
         # Print label distribution for debugging
@@ -802,12 +1631,13 @@ class EnronEmailClassifier:
             label_counts = Counter(labels)
             print(f"Filtered label distribution: {dict(label_counts)}")
 
-        # Encode labels
-        encoded_labels = self.label_encoder.fit_transform(labels)
+        # Encode labels (a fresh encoder; the serving one stays untouched)
+        label_encoder = LabelEncoder()
+        encoded_labels = label_encoder.fit_transform(labels)
 
         # Extract features with GPU acceleration
         print("Extracting features with GPU acceleration...")
-        features = self.extract_features(email_data)
+        features = self.extract_features(email_data, progress=progress)
 
         # Check if we have enough samples for stratified split
         unique_labels, label_counts = np.unique(encoded_labels, return_counts=True)
@@ -840,10 +1670,12 @@ class EnronEmailClassifier:
 
         # Create ensemble model with optimized parameters for GPU-extracted features
         print("Training ensemble model...")
+        _report(progress, "fitting", 0.0)
+        fit_start = time.perf_counter()
         rf_model = RandomForestClassifier(
             n_estimators=200,  # Increased since we have better features
             random_state=42,
-            n_jobs=-1,
+            n_jobs=allocation()["sklearn_train_n_jobs"],
             class_weight="balanced",  # Handle class imbalance
             max_depth=15,  # Prevent overfitting with high-dim features
         )
@@ -854,81 +1686,322 @@ class EnronEmailClassifier:
             C=0.1,  # L2 regularization for high-dim features
         )
 
-        self.ensemble_model = VotingClassifier(
+        ensemble_model = VotingClassifier(
             estimators=[("rf", rf_model), ("lr", lr_model)], voting="soft"
         )
 
-        self.ensemble_model.fit(X_train, y_train)
+        ensemble_model.fit(X_train, y_train)
+        _report(progress, "fitting", 0.8)
+
+        # Linear head over the same features for online feedback updates
+        online_model = build_online_head(
+            X_train, y_train, np.arange(len(label_encoder.classes_))
+        )
+        _report(progress, "fitting", 1.0)
+
+        fit_seconds = time.perf_counter() - fit_start
 
         # Evaluate
-        y_pred = self.ensemble_model.predict(X_test)
+        _report(progress, "evaluation", 0.0)
+        y_pred = ensemble_model.predict(X_test)
 
         # Convert back to category names for evaluation
-        test_categories = self.label_encoder.inverse_transform(y_test)
-        pred_categories = self.label_encoder.inverse_transform(y_pred)
+        test_categories = label_encoder.inverse_transform(y_test)
+        pred_categories = label_encoder.inverse_transform(y_pred)
 
         print("\nClassification Report:")
         print(classification_report(test_categories, pred_categories, zero_division=0))
+        _report(progress, "evaluation", 1.0)
 
         # Print final model info
         print(
             f"\nModel trained on {len(features)} emails across {len(unique_labels)} categories"
         )
-        print(f"Categories: {list(self.label_encoder.classes_)}")
+        print(f"Categories: {list(label_encoder.classes_)}")
         print(f"Feature dimensionality: {features.shape[1]}")
         print(f"Device used: {self.device}")
 
-        # Clear GPU cache after training
-        if self.device == "cuda":
-            torch.cuda.empty_cache()
-        elif self.device == "mps":
-            torch.mps.empty_cache()
+        # Optionally serve a distilled student instead of the ensemble
+        served_model, distillation = ensemble_model, None
+        test_accuracy = float(accuracy_score(y_test, y_pred))
+        if distill:
+            _report(progress, "distillation", 0.0)
+            print("Distilling ensemble into faster candidate heads...")
+            # Time the candidates as they will be served
+            set_n_jobs(ensemble_model, allocation()["sklearn_serve_n_jobs"])
+            served_model, distillation = select_model(
+                ensemble_model, X_train, X_test, y_test, latency_budget_ms
+            )
+            test_accuracy = next(
+                c["accuracy"]
+                for c in distillation["candidates"]
+                if c["name"] == distillation["selected"]
+            )
+            _report(progress, "distillation", 1.0)
 
-        # Save model
-        self._save_models()
+        # Clear GPU cache after training
+        _empty_device_cache(self.device)
+
+        # Save the model and swap it in
+        _report(progress, "saving", 0.0)
+        self.publish_model(
+            served_model,
+            label_encoder,
+            online_model,
+            metadata={
+                "n_train": int(len(X_train)),
+                "n_test": int(len(X_test)),
+                "test_accuracy": test_accuracy,
+                "label_distribution": {
+                    str(k): int(v) for k, v in Counter(labels).items()
+                },
+                "fit_seconds": round(fit_seconds, 2),
+                "distillation": distillation,
+            },
+        )
+        _report(progress, "saving", 1.0)
+
+        # Keep the embeddings for similar-email search instead of dropping them,
+        # unless an index over more emails (e.g. the streaming trainer's
+        # full-corpus one, which topics also cluster) is already in place
+        if self.encoder is not None and "email_id" in email_data:
+            _report(progress, "indexing", 0.0)
+            if self.ann_index is None or len(email_data) >= len(self.ann_index):
+                self.publish_ann_index(
+                    IVFIndex.build(
+                        features[:, : self.encoder.dim],
+                        email_data["email_id"].to_numpy(dtype=np.int64),
+                        meta={"embedding": self.feature_spec()["embedding"]},
+                    )
+                )
+            else:
+                print(
+                    f"Keeping the ANN index over {len(self.ann_index):,} emails "
+                    f"(trained on {len(email_data):,})"
+                )
+            _report(progress, "indexing", 1.0)
 
         return self
 
+    def predict_one(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Low-latency prediction for one email given as a dict
+
+        Skips the DataFrame round trip of ``predict``: the feature vector is
+        built directly (see featurize_one) and emotion analysis runs once.
+        """
+        if self.ensemble_model is None:
+            raise ValueError("Model not trained yet. Please train the model first.")
+        if self.fast_classifier is not None:
+            return self.fast_classifier.predict_one(message)
+
+        # Clean the body once for the encoder, emotion analysis and transformer
+        with stage("clean_body"):
+            body = clean_body_of(message)
+        message = {
+            **message,
+            "clean_body": body,
+            "clean_body_version": CLEAN_BODY_VERSION,
+        }
+        with stage("emotion"):
+            emotion_data = self.emotion_enhancer.enhance_emotion_analysis(body)
+        features = self.featurize_one(message, emotion_data)
+        model, label_encoder = self._serving_model()
+
+        # Keep the features around so feedback on this email is cheap
+        email_id = message.get("email_id")
+        if email_id is not None:
+            self.feature_cache.put(str(email_id), features)
+
+        with stage("predict_proba"):
+            prediction_proba = model.predict_proba(features.reshape(1, -1))[0]
+        predicted_class = int(np.argmax(prediction_proba))
+        category_key = label_encoder.classes_[predicted_class]
+
+        combined_text = f"{message.get('subject', '')} {body}"
+        with stage("transformer"):
+            transformer_results = self.classify_with_transformers([combined_text])
+        self._count_transformer_tokens([combined_text])
+
+        return self._prediction_result(
+            category_key,
+            float(prediction_proba[predicted_class]),
+            transformer_results[0],
+            emotion_data,
+        )
+
+    def predict_batch(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """predict_one for several emails at once, in input order
+
+        One encoder forward pass and one predict_proba call cover the whole
+        batch, which is what the request micro-batcher (see micro_batcher)
+        feeds it with.
+        """
+        if self.ensemble_model is None:
+            raise ValueError("Model not trained yet. Please train the model first.")
+        if not messages:
+            return []
+        if self.fast_classifier is not None:
+            return self.fast_classifier.predict_batch(messages)
+
+        with stage("clean_body"):
+            bodies = [clean_body_of(message) for message in messages]
+        messages = [
+            {**message, "clean_body": body, "clean_body_version": CLEAN_BODY_VERSION}
+            for message, body in zip(messages, bodies)
+        ]
+        with stage("emotion"):
+            emotions = [
+                self.emotion_enhancer.enhance_emotion_analysis(body) for body in bodies
+            ]
+        features = self.featurize_many(messages, emotions)
+        model, label_encoder = self._serving_model()
+
+        for message, row in zip(messages, features):
+            if message.get("email_id") is not None:
+                self.feature_cache.put(str(message["email_id"]), row)
+
+        with stage("predict_proba"):
+            proba = model.predict_proba(features)
+        best = proba.argmax(axis=1)
+        combined_texts = [
+            f"{message.get('subject', '')} {body}"
+            for message, body in zip(messages, bodies)
+        ]
+        with stage("transformer"):
+            transformer_results = self.classify_with_transformers(combined_texts)
+        self._count_transformer_tokens(combined_texts)
+        return [
+            self._prediction_result(
+                label_encoder.classes_[predicted_class],
+                float(proba[i, predicted_class]),
+                transformer_results[i],
+                emotions[i],
+            )
+            for i, predicted_class in enumerate(best)
+        ]
+
+    def _prediction_result(
+        self,
+        category_key: str,
+        confidence: float,
+        transformer_result: Dict[str, Any],
+        emotion_data: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        return {
+            "category": category_key,
+            "category_name": self.categories.get(category_key, {}).get(
+                "name", category_key
+            ),
+            "confidence": confidence,
+            "transformer_category": transformer_result["category"],
+            "transformer_confidence": transformer_result["confidence"],
+            "emotion": {
+                "polarity": emotion_data.get("polarity", 0),
+                "subjectivity": emotion_data.get("subjectivity", 0),
+                "stress_score": emotion_data.get("stress_score", 0),
+                "relaxation_score": emotion_data.get("relaxation_score", 0),
+            },
+            "device_used": self.device,
+        }
+
+    def predict_frame(
+        self, email_data: pd.DataFrame, with_transformer: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Batched predictions for a DataFrame from prepare_email_frame
+
+        Features for the whole frame are extracted in one pass and the
+        emotion scores are read back from their metadata columns instead of
+        being recomputed. The zero-shot transformer costs a forward pass per
+        email, so it only runs with ``with_transformer``.
+        """
+        if self.ensemble_model is None:
+            raise ValueError("Model not trained yet. Please train the model first.")
+        if self.fast_classifier is not None:
+            return self.fast_classifier.predict_frame(email_data)
+
+        features = self.extract_features(email_data)
+        model, label_encoder = self._serving_model()
+        proba = model.predict_proba(features)
+        best = proba.argmax(axis=1)
+
+        offset = features.shape[1] - len(METADATA_FEATURES)
+        emotion_columns = {
+            name: offset + METADATA_FEATURES.index(name)
+            for name in ("polarity", "subjectivity", "stress_score", "relaxation_score")
+        }
+        if with_transformer:
+            transformer_results = self.classify_with_transformers(
+                [
+                    f"{subject} {body}"
+                    for subject, body in zip(
+                        email_data["subject"].fillna(""), self.clean_bodies(email_data)
+                    )
+                ]
+            )
+        else:
+            transformer_results = [{"category": "", "confidence": 0.0}] * len(best)
+
+        predictions = []
+        for i, predicted_class in enumerate(best):
+            category_key = label_encoder.classes_[predicted_class]
+            predictions.append(
+                {
+                    "category": category_key,
+                    "category_name": self.categories.get(category_key, {}).get(
+                        "name", category_key
+                    ),
+                    "confidence": float(proba[i, predicted_class]),
+                    "transformer_category": transformer_results[i]["category"],
+                    "transformer_confidence": transformer_results[i]["confidence"],
+                    "emotion": {
+                        name: float(features[i, column])
+                        for name, column in emotion_columns.items()
+                    },
+                }
+            )
+        return predictions
+
     def predict(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Predict category for a single email with GPU acceleration"""
         if self.ensemble_model is None:
             raise ValueError("Model not trained yet. Please train the model first.")
 
-        # Convert to DataFrame
+        # Single emails take the pandas-free path
         if isinstance(message, dict):
-            email_df = pd.DataFrame([message])
-        else:
-            email_df = message
+            return self.predict_one(message)
+        if self.fast_classifier is not None:
+            return self.fast_classifier.predict_frame(message)[0]
 
         # Extract features with GPU acceleration
-        features = self.extract_features(email_df)
+        with stage("extract_features"):
+            features = self.extract_features(message)
+        model, label_encoder = self._serving_model()
 
-        # Get ensemble prediction
-        prediction_proba = self.ensemble_model.predict_proba(features)[0]
+        # Get ensemble prediction (or the online head, see CLASSIFIER_HEAD)
+        with stage("predict_proba"):
+            prediction_proba = model.predict_proba(features)[0]
         predicted_class = np.argmax(prediction_proba)
         confidence = prediction_proba[predicted_class]
 
         # Get category name
-        category_key = self.label_encoder.inverse_transform([predicted_class])[0]
+        category_key = label_encoder.inverse_transform([predicted_class])[0]
 
         # Get emotion analysis
-        emotion_data = self.emotion_enhancer.enhance_emotion_analysis(
-            str(message.get("body", ""))
-        )
+        body = self.clean_bodies(message)[0]
+        emotion_data = self.emotion_enhancer.enhance_emotion_analysis(body)
 
         # Try transformer classification as additional signal with GPU acceleration
-        combined_text = f"{message.get('subject', '')} {message.get('body', '')}"
+        combined_text = f"{message.get('subject', '')} {body}"
         transformer_results = self.classify_with_transformers([combined_text])
 
         # Clear GPU cache after prediction
-        if self.device == "cuda":
-            torch.cuda.empty_cache()
-        elif self.device == "mps":
-            torch.mps.empty_cache()
+        _empty_device_cache(self.device)
 
         return {
             "category": category_key,
-            "category_name": self.categories[category_key]["name"],
+            "category_name": self.categories.get(category_key, {}).get(
+                "name", category_key
+            ),
             "confidence": float(confidence),
             "transformer_category": transformer_results[0]["category"],
             "transformer_confidence": transformer_results[0]["confidence"],
@@ -943,7 +2016,10 @@ class EnronEmailClassifier:
 
     @staticmethod
     def serialize_prediction(
-        email_id: str, prediction: Dict[str, Any]
+        email_id: str,
+        prediction: Dict[str, Any],
+        model_version: Optional[str] = None,
+        content_hash: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Serialize prediction results for storage"""
         return {
@@ -957,8 +2033,42 @@ class EnronEmailClassifier:
             "subjectivity": prediction["emotion"]["subjectivity"],
             "stress_score": prediction["emotion"]["stress_score"],
             "relaxation_score": prediction["emotion"]["relaxation_score"],
+            "model_version": model_version,
+            "content_hash": content_hash,
         }
 
+    @staticmethod
+    def deserialize_prediction(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Rebuild a prediction from a stored email_classifications row"""
+        return {
+            "category": row["category"],
+            "category_name": row["category_name"],
+            "confidence": row["confidence"],
+            "transformer_category": row.get("transformer_category") or "",
+            "transformer_confidence": row.get("transformer_confidence") or 0.0,
+            "emotion": {
+                "polarity": row.get("polarity") or 0,
+                "subjectivity": row.get("subjectivity") or 0,
+                "stress_score": row.get("stress_score") or 0,
+                "relaxation_score": row.get("relaxation_score") or 0,
+            },
+        }
+
+    def content_hash(self, message: Dict[str, Any]) -> str:
+        """Digest of everything a prediction for ``message`` depends on
+
+        Two emails with the same hash get the same prediction from the same
+        model, so a stored result can be reused for either.
+        """
+        parts = (
+            str(message.get("subject") or ""),
+            str(message.get("body") or ""),
+            str(int(message.get("has_attachment", False))),
+            str(message.get("num_recipients", 1)),
+            str(hour_sent(message.get("time_sent"))),
+        )
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
     def analyze_dataset(
         self, email_data: pd.DataFrame, labels: np.ndarray
     ) -> Dict[str, Any]:
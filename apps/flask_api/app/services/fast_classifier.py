@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+Fast mode: hashed word and character n-grams with a linear model.
+
+No sentence encoder, no zero-shot transformer and nothing to download. The
+vectorisers are stateless (HashingVectorizer), so the artifact is only the
+linear model, loaded in milliseconds, and this module imports nothing
+heavier than scikit-learn. It serves thousands of emails per second per
+core on edge boxes and in CI; the encoder + ensemble path in
+enron_classifier stays the high-accuracy option.
+
+Training is out of core. Emails are read from SQLite in id blocks, visited
+in a different random order each epoch, vectorised block by block and fed
+to SGDClassifier.partial_fit. Labels come from one of two sources. By
+default they are the categories the full model stored in
+email_classifications (see bulk_classifier), which distils it. With
+``--labels folders`` they come from the keyword folder mapping.
+
+    python -m app.services.fast_classifier --db ../SQLite_db/enron.db
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.preprocessing import LabelEncoder
+
+from app.services.db import connect_readonly
+from app.services.email_cleaning import clean_body_columns, clean_body_of
+from app.services.email_features import stored_metadata
+from app.services.model_artifacts import (
+    MANIFEST_FILE,
+    ArtifactError,
+    load_artifact,
+    readable_dir,
+    save_artifact,
+)
+from app.services.model_registry import ModelRegistry
+from app.services.profiling import stage
+from app.services.text_normalizer import normalize_text
+
+# Bump whenever the text fed to the vectorisers or their settings change
+FAST_SPEC_VERSION = 1
+
+FAST_ARTIFACT_DIR = "fast_classifier"
+# Fast model versions are told apart from full-model ones by this prefix,
+# so their stored results are never used as training labels
+FAST_VERSION_PREFIX = "fast-"
+
+WORD_FEATURES = 2**18
+CHAR_FEATURES = 2**18
+# Character n-grams only see the start of the text; they add robustness to
+# spelling and tokenisation but cost one hash per character
+CHAR_WINDOW = 512
+
+_word_vectorizer = HashingVectorizer(
+    analyzer="word",
+    ngram_range=(1, 2),
+    n_features=WORD_FEATURES,
+    alternate_sign=False,
+    dtype=np.float32,
+)
+_char_vectorizer = HashingVectorizer(
+    analyzer="char",
+    ngram_range=(3, 5),
+    n_features=CHAR_FEATURES,
+    alternate_sign=False,
+    dtype=np.float32,
+)
+
+EMOTION_FIELDS = ("polarity", "subjectivity", "stress_score", "relaxation_score")
+
+
+def fast_text(message: Mapping[str, Any]) -> str:
+    """Subject and clean body, in the window the fast vectorisers read"""
+    subject = message.get("subject")
+    return normalize_text(
+        f"{'' if subject is None else subject} {clean_body_of(message)}", "fast"
+    )
+
+
+def vectorize(texts: List[str]) -> sparse.csr_matrix:
+    """Hashed word 1-2-grams next to hashed character 3-5-grams"""
+    return sparse.hstack(
+        [
+            _word_vectorizer.transform(texts),
+            _char_vectorizer.transform([text[:CHAR_WINDOW] for text in texts]),
+        ],
+        format="csr",
+    )
+
+
+def fast_feature_spec() -> Dict[str, Any]:
+    """Feature spec of the fast mode, checked against saved artifacts"""
+    return {
+        "version": FAST_SPEC_VERSION,
+        "embedding": {
+            "model": "hashing",
+            "word_ngrams": [1, 2],
+            "char_ngrams": [3, 5],
+            "char_window": CHAR_WINDOW,
+            "dim": WORD_FEATURES + CHAR_FEATURES,
+        },
+        "metadata_features": [],
+        "n_features": WORD_FEATURES + CHAR_FEATURES,
+    }
+
+
+class FastEmailClassifier:
+    """Serve the fast-mode model; same prediction shape as EnronEmailClassifier"""
+
+    def __init__(
+        self,
+        model_dir: str = "models",
+        categories: Optional[Dict[str, Dict[str, Any]]] = None,
+        emotion_enhancer=None,
+        artifact_dir: Optional[str] = None,
+    ):
+        self.model_dir = Path(model_dir)
+        # Another artifact than the served one, e.g. a registry version
+        self._artifact_dir = Path(artifact_dir) if artifact_dir else None
+        # Display names; the artifact's own names are used for missing keys
+        self.categories = categories or {}
+        self._emotion_enhancer = emotion_enhancer
+        self._lock = threading.Lock()
+        self.model = None
+        self.label_encoder = LabelEncoder()
+        self.manifest = None
+        self.load_error = None
+        self.load()
+
+    @property
+    def artifact_dir(self) -> Path:
+        return self._artifact_dir or self.model_dir / FAST_ARTIFACT_DIR
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.manifest["model_version"] if self.manifest else None
+
+    @property
+    def emotion_enhancer(self):
+        # VADER's lexicon is only loaded once emotion scores are needed
+        if self._emotion_enhancer is None:
+            from app.services.emotion_enhancer import EmotionEnhancer
+
+            self._emotion_enhancer = EmotionEnhancer()
+        return self._emotion_enhancer
+
+    def load(self):
+        """Load the fast-mode artifact, if one has been trained"""
+        artifact_dir = readable_dir(self.artifact_dir, MANIFEST_FILE)
+        if not (artifact_dir / MANIFEST_FILE).exists():
+            return
+        try:
+            start = time.perf_counter()
+            model, classes, manifest = load_artifact(
+                self.artifact_dir, fast_feature_spec()
+            )
+            label_encoder = LabelEncoder()
+            label_encoder.classes_ = classes
+            with self._lock:
+                self.model = model
+                self.label_encoder = label_encoder
+                self.manifest = manifest
+                self.load_error = None
+            print(
+                f"[FastClassifier] Loaded model {manifest['model_version']} "
+                f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+        except ArtifactError as e:
+            self.load_error = str(e)
+            print(f"[FastClassifier] Refusing artifact in {self.artifact_dir}: {e}")
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"[FastClassifier] Could not load model: {e}")
+
+    def publish_model(
+        self,
+        model,
+        label_encoder: LabelEncoder,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Save a trained fast model and make it the one served"""
+        manifest = save_artifact(
+            self.artifact_dir,
+            model,
+            label_encoder.classes_,
+            fast_feature_spec(),
+            {"mode": "fast", **(metadata or {})},
+            version_prefix=FAST_VERSION_PREFIX,
+        )
+        ModelRegistry(self.model_dir).register(self.artifact_dir, manifest)
+        with self._lock:
+            self.model = model
+            self.label_encoder = label_encoder
+            self.manifest = manifest
+            self.load_error = None
+        print(f"[FastClassifier] Model {manifest['model_version']} published")
+        return manifest
+
+    def category_name(self, key: str) -> str:
+        if key in self.categories:
+            return self.categories[key].get("name", key)
+        names = (self.manifest or {}).get("metadata", {}).get("category_names", {})
+        return names.get(key, key)
+
+    def predict_texts(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """``(category_keys, confidences)`` for texts from ``fast_text``"""
+        with self._lock:
+            model, label_encoder = self.model, self.label_encoder
+        if model is None:
+            raise ValueError("Fast model not trained yet. Please train it first.")
+        with stage("vectorize"):
+            X = vectorize(texts)
+        with stage("predict_proba"):
+            proba = model.predict_proba(X)
+        best = proba.argmax(axis=1)
+        return label_encoder.classes_[best], proba[np.arange(len(best)), best]
+
+    def _results(
+        self,
+        keys: np.ndarray,
+        confidences: np.ndarray,
+        emotions: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "category": str(key),
+                "category_name": self.category_name(str(key)),
+                "confidence": float(confidence),
+                "transformer_category": "",
+                "transformer_confidence": 0.0,
+                "emotion": {
+                    field: float(emotion.get(field, 0)) for field in EMOTION_FIELDS
+                },
+                "device_used": "cpu",
+            }
+            for key, confidence, emotion in zip(keys, confidences, emotions)
+        ]
+
+    def predict_batch(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Predictions for several emails given as dicts, in input order"""
+        if not messages:
+            return []
+        with stage("preprocess"):
+            texts = [fast_text(message) for message in messages]
+        keys, confidences = self.predict_texts(texts)
+        with stage("emotion"):
+            emotions = [
+                self.emotion_enhancer.enhance_emotion_analysis(clean_body_of(message))
+                for message in messages
+            ]
+        return self._results(keys, confidences, emotions)
+
+    def predict_one(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        return self.predict_batch([message])[0]
+
+    def predict_frame(self, email_data) -> List[Dict[str, Any]]:
+        """Predictions for a DataFrame from prepare_email_frame
+
+        Emotion scores come from email_features when the frame was read with
+        FEATURE_JOIN; only the rows it does not cover are analysed.
+        """
+        records = email_data.to_dict("records")
+        keys, confidences = self.predict_texts([fast_text(r) for r in records])
+
+        stored, current = stored_metadata(email_data)
+        # The emotion scores are the last four METADATA_FEATURES
+        stored = stored[:, -len(EMOTION_FIELDS) :]
+        emotions = [
+            (
+                dict(zip(EMOTION_FIELDS, stored[i]))
+                if current[i]
+                else self.emotion_enhancer.enhance_emotion_analysis(
+                    clean_body_of(record)
+                )
+            )
+            for i, record in enumerate(records)
+        ]
+        return self._results(keys, confidences, emotions)
+
+
+# Labelled emails per label source; "{where}" narrows the id range
+_LABEL_SOURCES = {
+    "stored": {
+        "label": "c.category",
+        "from": """
+            FROM emails e
+            JOIN email_classifications c ON c.email_id = CAST(e.id AS TEXT)
+            WHERE c.model_version IS NOT NULL
+                AND c.model_version NOT LIKE 'fast-%'
+        """,
+    },
+    "folders": {
+        "label": "f.name",
+        "from": """
+            FROM emails e
+            JOIN folders f ON e.folder_id = f.id
+            WHERE 1 = 1
+        """,
+    },
+}
+
+
+# Table each label source needs
+_LABEL_TABLES = {"stored": "email_classifications", "folders": "folders"}
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return (
+        conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        is not None
+    )
+
+
+class FastTrainer:
+    """Train the fast-mode model out of core from enron.db
+
+    With ``labels="stored"`` it learns the full model's versioned stored
+    classifications, falling back to folder labels when there are none.
+    """
+
+    def __init__(
+        self,
+        fast_classifier: FastEmailClassifier,
+        db_path: str,
+        labels: str = "stored",
+        chunk_size: int = 4096,
+        epochs: int = 3,
+        holdout_fraction: float = 0.1,
+        alpha: float = 1e-5,
+    ):
+        if labels not in _LABEL_SOURCES:
+            raise ValueError(f"Unknown label source: {labels!r}")
+        self.fast_classifier = fast_classifier
+        self.db_path = db_path
+        self.labels = labels
+        self.chunk_size = chunk_size
+        self.epochs = epochs
+        self.holdout_fraction = holdout_fraction
+        self.alpha = alpha
+        # progress(stage, fraction); may raise to abort a background job
+        self.progress: Optional[Callable[[str, float], None]] = None
+        self._folder_categories: Dict[str, str] = {}
+
+    def _report(self, stage: str, fraction: float):
+        if self.progress is not None:
+            self.progress(stage, fraction)
+
+    def _holdout_mask(self, email_ids: np.ndarray) -> np.ndarray:
+        # Same deterministic split on email id as the streaming trainer
+        buckets = (email_ids * 2654435761) % 1000
+        return buckets < int(self.holdout_fraction * 1000)
+
+    def _label(self, raw: str) -> str:
+        if self.labels != "folders":
+            return raw
+        if raw not in self._folder_categories:
+            from app.services.enron_classifier import EnronEmailClassifier
+
+            self._folder_categories[raw] = EnronEmailClassifier.map_folder_to_category(
+                raw
+            )
+        return self._folder_categories[raw]
+
+    def _blocks(
+        self, conn: sqlite3.Connection, max_emails: Optional[int]
+    ) -> List[Tuple[int, int]]:
+        """``(first_id, last_id)`` ranges of at most ``chunk_size`` labelled emails"""
+        source = _LABEL_SOURCES[self.labels]
+        ids = [
+            row[0]
+            for row in conn.execute(
+                f"SELECT e.id {source['from']} ORDER BY e.id LIMIT ?",
+                (max_emails if max_emails is not None else -1,),
+            )
+        ]
+        return [
+            (ids[i], ids[min(i + self.chunk_size, len(ids)) - 1])
+            for i in range(0, len(ids), self.chunk_size)
+        ]
+
+    def _read_block(
+        self, conn: sqlite3.Connection, first_id: int, last_id: int
+    ) -> Tuple[np.ndarray, List[str], List[str]]:
+        source = _LABEL_SOURCES[self.labels]
+        rows = conn.execute(
+            f"""
+            SELECT
+                e.id AS email_id,
+                e.subject AS subject,
+                e.body AS body,
+                {clean_body_columns(conn)},
+                {source['label']} AS label
+            {source['from']} AND e.id BETWEEN ? AND ?
+            ORDER BY e.id
+            """,
+            (first_id, last_id),
+        ).fetchall()
+        return (
+            np.array([row["email_id"] for row in rows], dtype=np.int64),
+            [fast_text(dict(row)) for row in rows],
+            [self._label(row["label"]) for row in rows],
+        )
+
+    def _label_counts(self, conn: sqlite3.Connection, last_id: int) -> Counter:
+        source = _LABEL_SOURCES[self.labels]
+        counts = Counter()
+        for raw, count in conn.execute(
+            f"SELECT {source['label']}, COUNT(*) {source['from']} AND e.id <= ? "
+            f"GROUP BY {source['label']}",
+            (last_id,),
+        ):
+            counts[self._label(raw)] += count
+        return counts
+
+    def _category_names(self, conn: sqlite3.Connection) -> Dict[str, str]:
+        if self.labels == "stored":
+            return dict(
+                conn.execute(
+                    "SELECT category, category_name FROM email_classifications "
+                    "WHERE model_version IS NOT NULL GROUP BY category"
+                ).fetchall()
+            )
+        from app.services.enron_classifier import DEFAULT_CATEGORIES
+
+        return {key: value["name"] for key, value in DEFAULT_CATEGORIES.items()}
+
+    def run(self, max_emails: Optional[int] = None) -> Dict[str, Any]:
+        # The corpus is only read; nothing here changes its schema
+        conn = connect_readonly(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            blocks = (
+                self._blocks(conn, max_emails)
+                if _has_table(conn, _LABEL_TABLES[self.labels])
+                else []
+            )
+            if not blocks and self.labels == "stored" and _has_table(conn, "folders"):
+                # No full-model pass over the corpus yet: learn the categories
+                # derived from folder names instead
+                print("[FastTrainer] No stored classifications; using folder labels")
+                self.labels = "folders"
+                blocks = self._blocks(conn, max_emails)
+            if not blocks:
+                raise ValueError(
+                    "No labelled emails to train on: classify the corpus first "
+                    "(app.services.bulk_classifier) or import emails with folders"
+                )
+            counts = self._label_counts(conn, blocks[-1][1])
+            category_names = self._category_names(conn)
+            categories = sorted(counts)
+            if len(categories) < 2:
+                raise ValueError("Need at least two categories to train on")
+            label_index = {key: i for i, key in enumerate(categories)}
+            classes = np.arange(len(categories))
+            n_rows = sum(counts.values())
+
+            # Class weights (the "balanced" heuristic, which partial_fit cannot compute)
+            weights = np.array(
+                [n_rows / (len(categories) * counts[key]) for key in categories]
+            )
+
+            print(
+                f"[FastTrainer] {n_rows:,} emails in {len(blocks)} blocks, "
+                f"{len(categories)} categories ({self.labels} labels)"
+            )
+            sgd = SGDClassifier(loss="log_loss", alpha=self.alpha, random_state=42)
+            rng = np.random.default_rng(42)
+            fit_start = time.perf_counter()
+            n_seen = 0
+            for epoch in range(self.epochs):
+                for n, block in enumerate(rng.permutation(len(blocks))):
+                    email_ids, texts, labels = self._read_block(conn, *blocks[block])
+                    train_rows = np.flatnonzero(~self._holdout_mask(email_ids))
+                    if not len(train_rows):
+                        continue
+                    y = np.array([label_index[labels[i]] for i in train_rows])
+                    sgd.partial_fit(
+                        vectorize([texts[i] for i in train_rows]),
+                        y,
+                        classes=classes,
+                        sample_weight=weights[y],
+                    )
+                    n_seen += len(train_rows)
+                    self._report(
+                        "fitting", (epoch + (n + 1) / len(blocks)) / self.epochs
+                    )
+                rate = n_seen / max(time.perf_counter() - fit_start, 1e-9)
+                print(
+                    f"[FastTrainer] Epoch {epoch + 1}/{self.epochs} done "
+                    f"({rate:,.0f} emails/s)"
+                )
+            fit_seconds = time.perf_counter() - fit_start
+
+            self._report("evaluation", 0.0)
+            label_encoder = LabelEncoder()
+            label_encoder.classes_ = np.array(categories)
+            y_true, y_pred = [], []
+            for n, (first_id, last_id) in enumerate(blocks):
+                email_ids, texts, labels = self._read_block(conn, first_id, last_id)
+                holdout = np.flatnonzero(self._holdout_mask(email_ids))
+                if len(holdout):
+                    y_true.extend(labels[i] for i in holdout)
+                    y_pred.extend(
+                        label_encoder.classes_[
+                            sgd.predict(vectorize([texts[i] for i in holdout]))
+                        ]
+                    )
+                self._report("evaluation", (n + 1) / len(blocks))
+        finally:
+            conn.close()
+
+        test_accuracy = float(accuracy_score(y_true, y_pred)) if y_true else None
+        if y_true:
+            print("\nHold-out Classification Report:")
+            print(classification_report(y_true, y_pred, zero_division=0))
+
+        self._report("saving", 0.0)
+        label_distribution = {key: int(counts[key]) for key in categories}
+        self.fast_classifier.publish_model(
+            sgd,
+            label_encoder,
+            metadata={
+                "trainer": "fast",
+                "labels": self.labels,
+                "n_train": int(n_rows - len(y_true)),
+                "n_test": int(len(y_true)),
+                "test_accuracy": test_accuracy,
+                "label_distribution": label_distribution,
+                "category_names": {
+                    key: category_names.get(key, key) for key in categories
+                },
+                "fit_seconds": round(fit_seconds, 2),
+                "epochs": self.epochs,
+                "chunk_size": self.chunk_size,
+            },
+        )
+        self._report("saving", 1.0)
+
+        return {
+            "n_rows": n_rows,
+            "n_test": int(len(y_true)),
+            "test_accuracy": test_accuracy,
+            "label_distribution": label_distribution,
+            "fit_seconds": round(fit_seconds, 2),
+            "model_version": self.fast_classifier.model_version,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--max-emails", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument(
+        "--labels",
+        choices=sorted(_LABEL_SOURCES),
+        default="stored",
+        help="Learn the full model's stored classifications (folder categories "
+        "when there are none), or folder categories",
+    )
+    args = parser.parse_args()
+
+    trainer = FastTrainer(
+        FastEmailClassifier(model_dir=args.model_dir),
+        args.db,
+        labels=args.labels,
+        chunk_size=args.chunk_size,
+        epochs=args.epochs,
+    )
+    print(json.dumps(trainer.run(max_emails=args.max_emails), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# Generous upper bound on characters per wordpiece, so character truncation
+# never cuts text the encoder would actually have seen
+CHARS_PER_TOKEN = 8
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("EMBED_TOKEN_BUDGET", "8192"))
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "128"))
+
+
+def truncate_texts(texts: List[str], max_seq_length: int) -> List[str]:
+    """Cut texts to the character window the encoder can use before tokenizing"""
+    max_chars = max_seq_length * CHARS_PER_TOKEN
+    return [(text or "")[:max_chars] for text in texts]
+
+
+def token_lengths(tokenizer, texts: List[str], max_seq_length: int) -> np.ndarray:
+    """Number of tokens each text occupies after truncation to ``max_seq_length``"""
+    if not texts:
+        return np.zeros(0, dtype=np.int64)
+    encoded = tokenizer(
+        texts,
+        truncation=True,
+        max_length=max_seq_length,
+        padding=False,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return np.fromiter(
+        (len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts)
+    )
+
+
+def plan_batches(
+    lengths: np.ndarray,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+) -> List[np.ndarray]:
+    """Group text indices into batches whose padded size fits ``token_budget``.
+
+    Indices are sorted by token length (longest first), so every batch is
+    padded only to the length of its first member and short emails travel in
+    large batches while long ones travel in small ones.
+    """
+    order = np.argsort(-lengths, kind="stable")
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(1, min(max_batch_size, token_budget // longest))
+        batches.append(order[start : start + size])
+        start += size
+    return batches
+
+
+def encode_bucketed(
+    encoder,
+    texts: List[str],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    progress: Optional[Callable[[float], None]] = None,
+) -> np.ndarray:
+    """Encode ``texts`` in length-bucketed batches, returning rows in input order.
+
+    ``progress`` is called with the fraction of texts encoded after each batch.
+    """
+    if not texts:
+        return np.zeros((0, encoder.dim), dtype=np.float32)
+
+    texts = truncate_texts(texts, encoder.max_seq_length)
+    lengths = token_lengths(encoder.tokenizer, texts, encoder.max_seq_length)
+
+    embeddings = np.empty((len(texts), encoder.dim), dtype=np.float32)
+    done = 0
+    for batch_idx in plan_batches(lengths, token_budget, max_batch_size):
+        batch_texts = [texts[i] for i in batch_idx]
+        embeddings[batch_idx] = encoder.encode(batch_texts, batch_size=len(batch_idx))
+        done += len(batch_idx)
+        if progress is not None:
+            progress(done / len(texts))
+    return embeddings
@@ -0,0 +1,155 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.profiling import current_profile, profiling
+
+# Largest batch handed to the model in one call
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH", "32"))
+
+# How long the worker waits for more requests before running a batch (ms).
+# Requests that arrive while a batch is running are picked up by the next one
+# without waiting, so this only matters when traffic is light.
+DEFAULT_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "2"))
+
+
+class MicroBatcher:
+    """Gathers concurrent single-item requests into batches for one worker.
+
+    Request threads call ``submit`` (or ``predict``) and wait on a future; a
+    single background thread takes whatever has queued up, to at most
+    ``max_batch_size`` items, and makes one ``batch_fn(items)`` call that must
+    return one result per item in order. Only that thread runs the model, so
+    concurrent requests no longer compete for torch's intra-op threads.
+
+    A request submitted while its thread is being profiled gets its queue
+    wait and its batch's run time added to that profile, so profiling does
+    not change the path requests take.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        name: str = "micro-batcher",
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def submit(self, item: Any) -> Future:
+        """Queue ``item`` and return a future for its result"""
+        future = Future()
+        self._ensure_worker().put(
+            (item, future, current_profile(), time.perf_counter())
+        )
+        return future
+
+    def predict(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Submit ``item`` and block until its result (or exception) is ready"""
+        return self.submit(item).result(timeout)
+
+    def _ensure_worker(self) -> queue.Queue:
+        # Threads do not survive fork, so each process starts its own worker
+        with self._lock:
+            alive = self._thread is not None and self._thread.is_alive()
+            if not alive or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name=self.name, daemon=True
+                )
+                self._thread.start()
+            return self._queue
+
+    def _gather(self, requests: queue.Queue) -> list:
+        batch = [requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Take what is already queued without waiting
+                batch.append(requests.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, requests: queue.Queue):
+        while True:
+            batch = [
+                request
+                for request in self._gather(requests)
+                if request[1].set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            self._execute(batch)
+
+    def _execute(self, batch: list):
+        profiled = any(request[2] is not None for request in batch)
+        started = time.perf_counter()
+        try:
+            # Off the record: the batch is reported through its requests
+            with profiling(profiled, record=False) as batch_profile:
+                results = self.batch_fn([request[0] for request in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"batch_fn returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Retry one by one so a single bad request only fails itself
+            print(f"[{self.name}] Batch of {len(batch)} failed ({e}); retrying singly")
+            for single in batch:
+                self._execute([single])
+            return
+
+        if profiled:
+            compute_ms = (time.perf_counter() - started) * 1000
+            breakdown = {"size": len(batch), **batch_profile.to_dict()}
+            for _, _, profile, submitted in batch:
+                if profile is not None:
+                    profile.add("batched_inference_wait", (started - submitted) * 1000)
+                    profile.add("batched_inference_compute", compute_ms)
+                    profile.batch = breakdown
+        for (_, future, _, _), result in zip(batch, results):
+            future.set_result(result)
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": (
+                    round(self.items / self.batches, 2) if self.batches else 0.0
+                ),
+                "largest_batch": self.largest_batch,
+            }
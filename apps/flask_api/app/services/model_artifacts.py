@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import joblib
+import numpy as np
+
+# Bump when the on-disk layout changes in a way old loaders cannot read
+ARTIFACT_FORMAT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+FEATURE_SPEC_FILE = "feature_spec.json"
+MODEL_FILE = "model.joblib"
+CLASSES_FILE = "classes.npy"
+
+
+class ArtifactError(ValueError):
+    """Raised when a model artifact is missing, corrupt or incompatible"""
+
+
+def _sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def staging_dir(target_dir: Path) -> Path:
+    """Empty sibling directory to write a new version of ``target_dir`` into"""
+    target_dir = Path(target_dir)
+    tmp_dir = target_dir.with_name(f"{target_dir.name}.tmp-{os.getpid()}")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    return tmp_dir
+
+
+def swap_in_dir(staged_dir: Path, target_dir: Path):
+    """Move a fully written ``staged_dir`` into place as ``target_dir``
+
+    POSIX cannot exchange two directories atomically, so this takes two
+    renames: the current version moves aside to ``<name>.old-<pid>``, then
+    the new one takes its place. Readers never see a partly written
+    directory, but ``target_dir`` is missing between the renames; they go
+    through ``readable_dir`` to bridge that gap.
+    """
+    target_dir = Path(target_dir)
+    old_dir = target_dir.with_name(f"{target_dir.name}.old-{os.getpid()}")
+    if target_dir.exists():
+        os.replace(target_dir, old_dir)
+    os.replace(staged_dir, target_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def readable_dir(
+    target_dir: Path, marker: str, attempts: int = 20, wait: float = 0.005
+) -> Path:
+    """``target_dir``, or its previous version while swap_in_dir replaces it
+
+    ``marker`` is the file written last (the manifest). While a swap is in
+    progress the new directory is waited for briefly, then the moved-aside
+    one is used. With no swap in progress a missing ``target_dir`` is
+    returned as is.
+    """
+    target_dir = Path(target_dir)
+    previous = []
+    for _ in range(attempts):
+        if (target_dir / marker).exists():
+            return target_dir
+        previous = [
+            old_dir
+            for old_dir in target_dir.parent.glob(f"{target_dir.name}.old-*")
+            if (old_dir / marker).exists()
+        ]
+        if not previous:
+            return target_dir
+        time.sleep(wait)
+    return previous[0]
+
+
+def save_artifact(
+    artifact_dir: Path,
+    model,
+    classes: np.ndarray,
+    feature_spec: Dict[str, Any],
+    metadata: Dict[str, Any] = None,
+    version_prefix: str = "",
+) -> Dict[str, Any]:
+    """Write a model artifact directory atomically and return its manifest.
+
+    The model is dumped uncompressed with joblib so its numpy arrays (forest
+    node tables, coefficients) can be memory-mapped on load.
+    """
+    artifact_dir = Path(artifact_dir)
+    tmp_dir = staging_dir(artifact_dir)
+
+    joblib.dump(model, tmp_dir / MODEL_FILE)
+    np.save(tmp_dir / CLASSES_FILE, np.asarray(classes, dtype=str))
+    with open(tmp_dir / FEATURE_SPEC_FILE, "w") as f:
+        json.dump(feature_spec, f, indent=2, sort_keys=True)
+
+    checksums = {
+        name: _sha256(tmp_dir / name)
+        for name in (MODEL_FILE, CLASSES_FILE, FEATURE_SPEC_FILE)
+    }
+    created_at = datetime.now(timezone.utc)
+    manifest = {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "model_version": (
+            f"{version_prefix}{created_at.strftime('%Y%m%d%H%M%S')}"
+            f"-{checksums[MODEL_FILE][:8]}"
+        ),
+        "created_at": created_at.isoformat(),
+        "model_type": type(model).__name__,
+        "classes": [str(c) for c in classes],
+        "feature_spec": feature_spec,
+        "metadata": metadata or {},
+        "checksums": checksums,
+    }
+    with open(tmp_dir / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    # The manifest is written last, so a directory that has one is complete
+    swap_in_dir(tmp_dir, artifact_dir)
+    return manifest
+
+
+def read_manifest(artifact_dir: Path) -> Dict[str, Any]:
+    manifest_path = readable_dir(artifact_dir, MANIFEST_FILE) / MANIFEST_FILE
+    if not manifest_path.exists():
+        raise ArtifactError(f"No manifest found in {artifact_dir}")
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def check_feature_spec(saved: Dict[str, Any], expected: Dict[str, Any]):
+    """Raise ArtifactError if a saved feature spec cannot be served by ``expected``"""
+    problems = []
+    for key in ("version", "embedding", "metadata_features", "n_features"):
+        if saved.get(key) != expected.get(key):
+            problems.append(
+                f"{key}: artifact has {saved.get(key)!r}, "
+                f"runtime has {expected.get(key)!r}"
+            )
+    if problems:
+        raise ArtifactError("Feature spec mismatch - " + "; ".join(problems))
+
+
+def check_checksums(artifact_dir: Path, manifest: Dict[str, Any]):
+    """Raise ArtifactError if a file is missing or differs from the manifest"""
+    for name, expected in manifest.get("checksums", {}).items():
+        path = Path(artifact_dir) / name
+        if not path.exists():
+            raise ArtifactError(f"Artifact file missing: {name}")
+        if _sha256(path) != expected:
+            raise ArtifactError(f"Checksum mismatch for {name}")
+
+
+def load_artifact(
+    artifact_dir: Path,
+    expected_feature_spec: Dict[str, Any],
+    verify_checksums: bool = True,
+    mmap_mode: str = "r",
+) -> Tuple[Any, np.ndarray, Dict[str, Any]]:
+    """Load ``(model, classes, manifest)``, refusing corrupt or mismatched artifacts"""
+    artifact_dir = readable_dir(artifact_dir, MANIFEST_FILE)
+    manifest = read_manifest(artifact_dir)
+
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ArtifactError(
+            f"Unsupported artifact format {manifest.get('format_version')} "
+            f"(expected {ARTIFACT_FORMAT_VERSION})"
+        )
+
+    if verify_checksums:
+        check_checksums(artifact_dir, manifest)
+
+    with open(artifact_dir / FEATURE_SPEC_FILE) as f:
+        check_feature_spec(json.load(f), expected_feature_spec)
+
+    model = joblib.load(artifact_dir / MODEL_FILE, mmap_mode=mmap_mode)
+    classes = np.load(artifact_dir / CLASSES_FILE, allow_pickle=False)
+    return model, classes, manifest
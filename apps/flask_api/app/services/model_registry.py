@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Registry of every published classifier version.
+
+Each artifact published by training (full or fast mode) is copied to
+models/registry/<model_version>/, so a retrain no longer loses the model it
+replaces. registry.json keeps the active version per mode and an optional
+shadow version. Activating a version copies it back into the directory that
+mode serves from (email_classifier/ or fast_classifier/), which makes
+rollback a pointer move rather than a retrain. The shadow is evaluated
+against live traffic by shadow_evaluation.
+
+    python -m app.services.model_registry --list
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.services.model_artifacts import (
+    ArtifactError,
+    check_checksums,
+    read_manifest,
+    staging_dir,
+    swap_in_dir,
+)
+
+REGISTRY_DIR = "registry"
+REGISTRY_FILE = "registry.json"
+
+# Directory each mode serves its active artifact from
+SERVING_DIRS = {"full": "email_classifier", "fast": "fast_classifier"}
+
+# Versions kept on disk besides the active and shadow ones
+REGISTRY_KEEP = int(os.getenv("REGISTRY_KEEP", "10"))
+DEFAULT_SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+
+_write_lock = threading.Lock()
+
+
+def version_kind(model_version: str) -> str:
+    """The mode a version serves in, from the prefix fast models carry"""
+    # fast_classifier.FAST_VERSION_PREFIX (not imported: it imports this)
+    return "fast" if model_version.startswith("fast-") else "full"
+
+
+def _copy_dir(source: Path, target: Path):
+    """Copy a directory to a staging directory, then swap it in as ``target``"""
+    tmp_dir = staging_dir(target)
+    shutil.copytree(source, tmp_dir, dirs_exist_ok=True)
+    swap_in_dir(tmp_dir, target)
+
+
+class ModelRegistry:
+    """Published model versions with per-mode active and shadow pointers"""
+
+    def __init__(self, model_dir, keep: int = REGISTRY_KEEP):
+        self.model_dir = Path(model_dir)
+        self.root = self.model_dir / REGISTRY_DIR
+        self.keep = keep
+        self._cache = (None, None)
+
+    @property
+    def _path(self) -> Path:
+        return self.root / REGISTRY_FILE
+
+    def _read(self) -> Dict[str, Any]:
+        # Re-read only when another process (or the CLI) has rewritten it
+        try:
+            mtime = self._path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {"active": {}, "shadow": None, "versions": {}}
+        if self._cache[0] != mtime:
+            with open(self._path) as f:
+                self._cache = (mtime, json.load(f))
+        return json.loads(json.dumps(self._cache[1]))
+
+    def _write(self, state: Dict[str, Any]):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(f"{REGISTRY_FILE}.tmp-{os.getpid()}")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self._path)
+
+    # ── queries ─────────────────────────────────────────────────────────────
+    def versions(self) -> List[Dict[str, Any]]:
+        """Registered versions, newest first, flagged active / shadow"""
+        state = self._read()
+        shadow = (state.get("shadow") or {}).get("version")
+        active = set(state.get("active", {}).values())
+        return [
+            {**entry, "active": version in active, "shadow": version == shadow}
+            for version, entry in sorted(
+                state["versions"].items(),
+                key=lambda item: item[1]["created_at"],
+                reverse=True,
+            )
+        ]
+
+    def active(self) -> Dict[str, str]:
+        """Active version per mode (``{"full": ..., "fast": ...}``)"""
+        return self._read().get("active", {})
+
+    @property
+    def shadow(self) -> Optional[Dict[str, Any]]:
+        """``{"version", "sample_rate", "since"}`` of the shadow, or None"""
+        return self._read().get("shadow")
+
+    def version_dir(self, model_version: str) -> Path:
+        if model_version not in self._read()["versions"]:
+            raise ArtifactError(f"Unknown model version {model_version}")
+        return self.root / model_version
+
+    # ── updates ─────────────────────────────────────────────────────────────
+    def register(
+        self, artifact_dir: Path, manifest: Dict[str, Any], activate: bool = True
+    ) -> Dict[str, Any]:
+        """Copy a published artifact into the registry (once per version)"""
+        version = manifest["model_version"]
+        kind = version_kind(version)
+        with _write_lock:
+            state = self._read()
+            if version in state["versions"] and (
+                not activate or state.get("active", {}).get(kind) == version
+            ):
+                return state["versions"][version]
+            if version not in state["versions"]:
+                _copy_dir(Path(artifact_dir), self.root / version)
+                metadata = manifest.get("metadata", {})
+                state["versions"][version] = {
+                    "model_version": version,
+                    "kind": kind,
+                    "model_type": manifest.get("model_type"),
+                    "created_at": manifest.get("created_at"),
+                    "registered_at": datetime.now(timezone.utc).isoformat(),
+                    "classes": manifest.get("classes", []),
+                    # Enough to compare versions without opening the artifact
+                    "metadata": {
+                        key: metadata[key]
+                        for key in (
+                            "trainer",
+                            "labels",
+                            "encoder_backend",
+                            "n_train",
+                            "test_accuracy",
+                            "migrated_from",
+                        )
+                        if key in metadata
+                    },
+                }
+                print(f"[ModelRegistry] Registered {version}")
+            if activate:
+                state.setdefault("active", {})[kind] = version
+            self._prune(state, registering=version)
+            self._write(state)
+            return state["versions"][version]
+
+    def _prune(self, state: Dict[str, Any], registering: Optional[str] = None):
+        """Drop the oldest versions beyond ``keep``, never active or shadow
+
+        The version being registered is kept too, even when it is older than
+        ``keep`` others; it is dropped by a later registration.
+        """
+        pinned = set(state.get("active", {}).values())
+        if state.get("shadow"):
+            pinned.add(state["shadow"]["version"])
+        candidates = sorted(
+            (v for v in state["versions"] if v not in pinned),
+            key=lambda v: state["versions"][v]["created_at"],
+            reverse=True,
+        )
+        for version in candidates[self.keep :]:
+            if version == registering:
+                continue
+            shutil.rmtree(self.root / version, ignore_errors=True)
+            del state["versions"][version]
+            print(f"[ModelRegistry] Pruned {version}")
+
+    def activate(self, model_version: str) -> Dict[str, Any]:
+        """Install a version into its mode's serving directory and point at it
+
+        Processes serving that mode pick it up from the pointer (see
+        EnronEmailClassifier.sync_published). A corrupt copy is
+        refused before the serving directory or the pointer change.
+        """
+        source = self.version_dir(model_version)
+        check_checksums(source, read_manifest(source))
+        kind = version_kind(model_version)
+        with _write_lock:
+            _copy_dir(source, self.model_dir / SERVING_DIRS[kind])
+            state = self._read()
+            state.setdefault("active", {})[kind] = model_version
+            if (state.get("shadow") or {}).get("version") == model_version:
+                state["shadow"] = None
+            self._write(state)
+        print(f"[ModelRegistry] Activated {model_version} ({kind} mode)")
+        return state["versions"][model_version]
+
+    def set_shadow(
+        self, model_version: str, sample_rate: float = DEFAULT_SHADOW_SAMPLE_RATE
+    ) -> Dict[str, Any]:
+        """Evaluate ``model_version`` on a ``sample_rate`` share of live traffic"""
+        self.version_dir(model_version)
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be in (0, 1]")
+        with _write_lock:
+            state = self._read()
+            state["shadow"] = {
+                "version": model_version,
+                "sample_rate": sample_rate,
+                "since": datetime.now(timezone.utc).isoformat(),
+            }
+            self._write(state)
+        print(f"[ModelRegistry] Shadowing {model_version} on {sample_rate:.0%}")
+        return state["shadow"]
+
+    def clear_shadow(self):
+        with _write_lock:
+            state = self._read()
+            state["shadow"] = None
+            self._write(state)
+
+    def remove(self, model_version: str):
+        with _write_lock:
+            state = self._read()
+            if model_version in state.get("active", {}).values():
+                raise ValueError(f"{model_version} is active; activate another first")
+            if (state.get("shadow") or {}).get("version") == model_version:
+                raise ValueError(f"{model_version} is the shadow; clear it first")
+            if state["versions"].pop(model_version, None) is None:
+                raise ArtifactError(f"Unknown model version {model_version}")
+            shutil.rmtree(self.root / model_version, ignore_errors=True)
+            self._write(state)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--activate", metavar="VERSION")
+    parser.add_argument("--shadow", metavar="VERSION")
+    parser.add_argument(
+        "--sample-rate", type=float, default=DEFAULT_SHADOW_SAMPLE_RATE
+    )
+    parser.add_argument("--clear-shadow", action="store_true")
+    parser.add_argument("--remove", metavar="VERSION")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.model_dir)
+    if args.activate:
+        registry.activate(args.activate)
+        print("Running servers switch to it within MODEL_SYNC_SECONDS")
+    if args.shadow:
+        registry.set_shadow(args.shadow, args.sample_rate)
+    if args.clear_shadow:
+        registry.clear_shadow()
+    if args.remove:
+        registry.remove(args.remove)
+    print(
+        json.dumps(
+            {
+                "active": registry.active(),
+                "shadow": registry.shadow,
+                "versions": registry.versions() if args.list else None,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
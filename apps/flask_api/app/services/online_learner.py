@@ -0,0 +1,323 @@
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+try:
+    import fcntl
+except ImportError:  # Windows: no pre-fork workers, the thread lock suffices
+    fcntl = None
+
+from app.services.model_artifacts import ArtifactError, read_manifest
+
+ONLINE_HEAD_FILE = "online_head.joblib"
+ONLINE_HEAD_META_FILE = "online_head.json"
+ONLINE_HEAD_LOCK_FILE = "online_head.lock"
+
+_head_write_lock = threading.RLock()
+_head_lock_depth = 0
+
+
+@contextmanager
+def head_write_lock(model_dir: Path):
+    """Held while the head snapshot is read back and written
+
+    A re-entrant lock covers this process's threads and a lock file the
+    other worker processes, so feedback snapshots from several workers and
+    the head saved with a newly published model never interleave.
+    """
+    global _head_lock_depth
+    with _head_write_lock:
+        lock_file = None
+        if _head_lock_depth == 0 and fcntl is not None:
+            lock_file = open(Path(model_dir) / ONLINE_HEAD_LOCK_FILE, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        _head_lock_depth += 1
+        try:
+            yield
+        finally:
+            _head_lock_depth -= 1
+            if lock_file is not None:
+                lock_file.close()  # releases the flock
+
+
+def build_online_head(
+    X: np.ndarray, y: np.ndarray, classes: np.ndarray, epochs: int = 5
+) -> Pipeline:
+    """Fit a StandardScaler + log-loss SGDClassifier head that supports partial_fit"""
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+
+    # "balanced" class weights as sample weights, since partial_fit rejects them
+    counts = np.bincount(y, minlength=len(classes))
+    weights = np.where(counts > 0, len(y) / (len(classes) * np.maximum(counts, 1)), 0)
+
+    sgd = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=42)
+    rng = np.random.default_rng(42)
+    for _ in range(epochs):
+        order = rng.permutation(len(y))
+        sgd.partial_fit(
+            X_scaled[order], y[order], classes=classes, sample_weight=weights[y[order]]
+        )
+    return Pipeline([("scaler", scaler), ("clf", sgd)])
+
+
+def copy_online_head(model: Pipeline) -> Pipeline:
+    """In-memory, writable copy of a (possibly memory-mapped) linear head"""
+    return pickle.loads(pickle.dumps(model))
+
+
+def is_online_head(model) -> bool:
+    """Whether ``model`` is a scaler + SGD head that feedback can update
+
+    Checked by type rather than by ``partial_fit``: a distilled MLP student
+    has one too, but must keep serving as selected and takes no sample
+    weights.
+    """
+    return isinstance(model, Pipeline) and isinstance(
+        model.steps[-1][1], SGDClassifier
+    )
+
+
+def save_online_head(model_dir: Path, model: Pipeline, meta: Dict[str, Any]):
+    """Atomically write the online head snapshot and its metadata"""
+    model_dir = Path(model_dir)
+    with head_write_lock(model_dir):
+        tmp_path = model_dir / f"{ONLINE_HEAD_FILE}.tmp-{os.getpid()}"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, model_dir / ONLINE_HEAD_FILE)
+
+        tmp_meta = model_dir / f"{ONLINE_HEAD_META_FILE}.tmp-{os.getpid()}"
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_meta, model_dir / ONLINE_HEAD_META_FILE)
+
+
+def load_online_head(model_dir: Path, base_model_version: str) -> Optional[Pipeline]:
+    """Load the online head snapshot if it was built on ``base_model_version``"""
+    model_dir = Path(model_dir)
+    meta_path = model_dir / ONLINE_HEAD_META_FILE
+    if not meta_path.exists() or not (model_dir / ONLINE_HEAD_FILE).exists():
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("base_model_version") != base_model_version:
+        print(
+            f"Ignoring online head built on {meta.get('base_model_version')} "
+            f"(active model is {base_model_version})"
+        )
+        return None
+    return joblib.load(model_dir / ONLINE_HEAD_FILE)
+
+
+def online_head_mtime(model_dir: Path) -> Optional[int]:
+    """When the head snapshot was last saved (its metadata is written last)"""
+    try:
+        return (Path(model_dir) / ONLINE_HEAD_META_FILE).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class FeatureCache:
+    """Small thread-safe LRU of feature vectors keyed by email id"""
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value: np.ndarray):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class OnlineLearner:
+    """Applies user corrections to the classifier's linear head with partial_fit.
+
+    Updates are made on a copy of the SGD head which is then swapped in, so
+    concurrent predictions never see a half-updated model. A background
+    thread snapshots the head to disk when there are pending updates, tagged
+    with the model version the head was built on. The corrected examples are
+    kept until then: when another worker process saved the head meanwhile,
+    they are replayed on its snapshot instead of overwriting it.
+    """
+
+    def __init__(self, classifier, snapshot_interval: float = None):
+        self.classifier = classifier
+        self.snapshot_interval = snapshot_interval or float(
+            os.getenv("FEEDBACK_SNAPSHOT_SECONDS", "300")
+        )
+        self.feedback_weight = float(os.getenv("FEEDBACK_WEIGHT", "5.0"))
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.total_updates = 0
+        self.last_snapshot = None
+        # (features, label index) of the updates not saved yet, and the base
+        # version of the head they were applied to
+        self._pending = []
+        self._pending_base = None
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._pending)
+
+    def features_for(self, email_id, email_data: Optional[Dict[str, Any]] = None):
+        """Feature vector for an email, from the classifier's cache if possible"""
+        cached = self.classifier.feature_cache.get(str(email_id))
+        if cached is not None:
+            return cached
+        if email_data is None:
+            return None
+        return self.classifier.featurize_one(email_data)
+
+    def apply_feedback(self, features: np.ndarray, category: str) -> Dict[str, Any]:
+        """Incrementally fit the online head on one corrected example"""
+        current, base_version = self.classifier.online_head()
+        if current is None:
+            raise ValueError("No online head available. Please retrain the model.")
+        if category not in set(self.classifier.label_encoder.classes_):
+            raise ValueError(f"Unknown category: {category}")
+
+        start = time.perf_counter()
+        with self._lock:
+            current, base_version = self.classifier.online_head()
+            scaler = current.named_steps["scaler"]
+            sgd = pickle.loads(pickle.dumps(current.named_steps["clf"]))
+
+            X = scaler.transform(np.asarray(features, dtype=np.float64).reshape(1, -1))
+            y = self.classifier.label_encoder.transform([category])
+            sgd.partial_fit(X, y, sample_weight=[self.feedback_weight])
+
+            if not self.classifier.set_online_model(
+                Pipeline([("scaler", scaler), ("clf", sgd)]), base_version
+            ):
+                raise ValueError("The model changed during the update; retry")
+            if self._pending_base != base_version:
+                # Updates to the previous model's head are not worth saving
+                self._pending_base, self._pending = base_version, []
+            self._pending.append((np.asarray(features, dtype=np.float64), y[0]))
+            self.total_updates += 1
+
+        self._ensure_consolidation_thread()
+        return {
+            "applied": True,
+            "category": category,
+            "update_ms": round((time.perf_counter() - start) * 1000, 3),
+            "pending_updates": self.pending_updates,
+        }
+
+    def snapshot(self) -> bool:
+        """Persist the current online head if it has unsaved updates
+
+        A snapshot another worker saved since is read back and the pending
+        updates are replayed on it, so that worker's feedback is kept too.
+        """
+        model_dir = self.classifier.model_dir
+        with self._lock:
+            model, base_version = self.classifier.online_head()
+            if not self._pending or model is None:
+                return False
+            pending, self._pending = self._pending, []
+            updates = len(pending)
+            if base_version != self._pending_base:
+                print(
+                    f"[OnlineLearner] Dropped {updates} updates made on "
+                    f"{self._pending_base}; the head now belongs to {base_version}"
+                )
+                return False
+
+            with head_write_lock(model_dir):
+                # A model published since then has saved its own head; keep it
+                if self._published_version() != base_version:
+                    print(
+                        f"[OnlineLearner] Not saving {updates} updates: the head "
+                        f"was built on {base_version}, which is no longer published"
+                    )
+                    return False
+                saved = load_online_head(model_dir, base_version)
+                if saved is not None:
+                    model = self._replay(saved, pending)
+                save_online_head(
+                    model_dir,
+                    model,
+                    {
+                        "base_model_version": base_version,
+                        "feedback_updates": self.total_updates,
+                        "saved_at": time.time(),
+                    },
+                )
+                self.classifier.set_online_model(
+                    model, base_version, head_mtime=online_head_mtime(model_dir)
+                )
+        self.last_snapshot = time.time()
+        print(f"[OnlineLearner] Snapshot saved ({updates} new updates)")
+        return True
+
+    def _replay(self, head: Pipeline, pending) -> Pipeline:
+        """Apply the pending updates, in order, to a freshly loaded head"""
+        scaler, sgd = head.named_steps["scaler"], head.named_steps["clf"]
+        for features, label in pending:
+            sgd.partial_fit(
+                scaler.transform(features.reshape(1, -1)),
+                [label],
+                sample_weight=[self.feedback_weight],
+            )
+        return head
+
+    def _published_version(self) -> Optional[str]:
+        """Version of the artifact currently on disk, or None"""
+        try:
+            return read_manifest(self.classifier.artifact_dir)["model_version"]
+        except (ArtifactError, OSError, ValueError, KeyError):
+            return None
+
+    def _ensure_consolidation_thread(self):
+        # Threads do not survive fork, so restart the loop in each new process
+        alive = self._thread is not None and self._thread.is_alive()
+        if alive and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(
+            target=self._consolidation_loop, name="online-learner", daemon=True
+        )
+        self._thread.start()
+
+    def _consolidation_loop(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"[OnlineLearner] Snapshot failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "available": self.classifier.online_model is not None,
+            "serving": self.classifier.serving_online_head,
+            "pending_updates": self.pending_updates,
+            "total_updates": self.total_updates,
+            "last_snapshot": self.last_snapshot,
+            "snapshot_interval": self.snapshot_interval,
+        }
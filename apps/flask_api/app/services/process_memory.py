@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Per-process memory of the serving master and its forked workers.
+
+RSS counts every resident page, including the model weights a worker shares
+copy-on-write with the master, so N workers' RSS adds up to far more than
+the machine actually uses. USS (pages private to the process) is what each
+extra worker really costs, and PSS splits shared pages evenly between their
+users, so PSS summed over the group is its true footprint. Linux only; other
+platforms report RSS from ``resource`` alone.
+
+    python -m app.services.process_memory <master_pid>
+"""
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+# smaps_rollup fields summed into USS and shared memory
+_PRIVATE_FIELDS = ("Private_Clean", "Private_Dirty")
+_SHARED_FIELDS = ("Shared_Clean", "Shared_Dirty")
+
+
+def _read_kib_fields(path: str) -> Dict[str, int]:
+    fields = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, Any]:
+    """RSS, PSS, USS and shared memory of one process, in MiB"""
+    pid = pid or os.getpid()
+    try:
+        rollup = _read_kib_fields(f"/proc/{pid}/smaps_rollup")
+    except OSError:
+        rollup = None
+
+    if rollup:
+        return {
+            "pid": pid,
+            "rss_mb": round(rollup.get("Rss", 0) / 1024, 1),
+            "pss_mb": round(rollup.get("Pss", 0) / 1024, 1),
+            "uss_mb": round(sum(rollup.get(k, 0) for k in _PRIVATE_FIELDS) / 1024, 1),
+            "shared_mb": round(
+                sum(rollup.get(k, 0) for k in _SHARED_FIELDS) / 1024, 1
+            ),
+        }
+
+    # No smaps_rollup (non-Linux or an old kernel): RSS only
+    rss_mb = None
+    try:
+        rss_mb = round(_read_kib_fields(f"/proc/{pid}/status")["VmRSS"] / 1024, 1)
+    except (OSError, KeyError):
+        if pid == os.getpid():
+            import resource
+
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in KiB on Linux and bytes on macOS
+            unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+            rss_mb = round(maxrss / unit, 1)
+    return {"pid": pid, "rss_mb": rss_mb, "pss_mb": None, "uss_mb": None}
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of ``pid``"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+
+    children = []
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid follows its ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def serving_memory(master_pid: Optional[int] = None) -> Dict[str, Any]:
+    """Memory of a pre-fork master and each of its workers, with totals
+
+    Called from inside a worker, the master is the parent process.
+    """
+    master_pid = master_pid or os.getppid()
+    master = memory_usage(master_pid)
+    workers = [memory_usage(pid) for pid in child_pids(master_pid)]
+
+    def total(key):
+        values = [p[key] for p in [master, *workers] if p.get(key) is not None]
+        return round(sum(values), 1) if values else None
+
+    return {
+        "master": master,
+        "workers": workers,
+        "current_pid": os.getpid(),
+        "total_rss_mb": total("rss_mb"),
+        # The group's real footprint; compare with total_rss_mb
+        "total_pss_mb": total("pss_mb"),
+        "total_uss_mb": total("uss_mb"),
+    }
+
+
+def main():
+    master_pid = int(sys.argv[1]) if len(sys.argv) > 1 else os.getpid()
+    print(json.dumps(serving_memory(master_pid), indent=2))
+
+
+if __name__ == "__main__":
+    main()
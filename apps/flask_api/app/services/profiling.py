@@ -0,0 +1,193 @@
+"""
+Opt-in per-stage timing of inference.
+
+Code on the inference path wraps its stages in ``stage("encode")`` and
+reports sizes with ``count("encoder_tokens", n)``. Both do nothing unless
+the calling thread is inside ``profiling()``: a request asking for a
+profile (or every request, with PROFILE_INFERENCE=1) gets a breakdown of
+where its time went. Each finished profile is also folded into rolling
+per-stage histograms, served by /api/system/metrics.
+
+Requests still go through the micro-batcher when profiled. The batcher
+adds how long the request queued (``batched_inference_wait``) and how long
+its batch ran (``batched_inference_compute``) to the request's profile,
+along with the stage breakdown of that batch under ``"batch"``.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# Profile every classify request, not just those asking for it
+PROFILE_INFERENCE = os.getenv("PROFILE_INFERENCE", "0") == "1"
+
+# Most recent samples kept per stage for the rolling histograms
+PROFILE_WINDOW = int(os.getenv("PROFILE_WINDOW", "2048"))
+
+# Histogram bucket upper bounds, in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_local = threading.local()
+
+
+class Profile:
+    """Stage timings (ms) and counters of one profiled call"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total_ms = None
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        # Breakdown of the micro-batch that ran this call's inference
+        self.batch: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, ms: float):
+        """Add ``ms`` to stage ``name``, for time measured elsewhere"""
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def count(self, name: str, value: int):
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        total_ms = self.total_ms
+        if total_ms is None:
+            total_ms = (time.perf_counter() - self.start) * 1000
+        result = {
+            "stages_ms": {name: round(ms, 3) for name, ms in self.stages.items()},
+            "total_ms": round(total_ms, 3),
+            # Time spent outside any named stage (routing, serialisation...)
+            "unaccounted_ms": round(max(0.0, total_ms - sum(self.stages.values())), 3),
+            "counts": dict(self.counts),
+        }
+        if self.batch is not None:
+            result["batch"] = self.batch
+        return result
+
+
+def current_profile() -> Optional[Profile]:
+    return getattr(_local, "profile", None)
+
+
+@contextmanager
+def profiling(
+    enabled: bool = True, record: bool = True
+) -> Iterator[Optional[Profile]]:
+    """Profile what runs on this thread inside the block; yields the Profile
+
+    Yields None when ``enabled`` is false, so callers can write
+    ``with profiling(flag) as profile`` unconditionally. ``record=False``
+    keeps the profile out of the histograms (the micro-batcher's, which is
+    reported through the requests it served).
+    """
+    if not enabled:
+        yield None
+        return
+    previous = current_profile()
+    profile = _local.profile = Profile()
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+        profile.finish()
+        if record:
+            stage_histograms.record(profile)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the block as ``name`` if this thread is being profiled"""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    with profile.stage(name):
+        yield
+
+
+def count(name: str, value: int):
+    profile = current_profile()
+    if profile is not None:
+        profile.count(name, value)
+
+
+class StageHistograms:
+    """Rolling latency histograms per stage over the last ``window`` samples"""
+
+    def __init__(self, window: int = PROFILE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self.profiles = 0
+
+    def record(self, profile: Profile):
+        with self._lock:
+            self.profiles += 1
+            stages = [*profile.stages.items(), ("total", profile.total_ms)]
+            if profile.batch is not None:
+                stages += [
+                    (f"batch.{name}", ms)
+                    for name, ms in profile.batch["stages_ms"].items()
+                ]
+            for name, ms in stages:
+                if ms is None:
+                    continue
+                samples = self._samples.get(name)
+                if samples is None:
+                    samples = self._samples[name] = deque(maxlen=self.window)
+                samples.append(ms)
+
+    @staticmethod
+    def _summary(samples) -> Dict[str, Any]:
+        ordered = sorted(samples)
+        n = len(ordered)
+
+        def percentile(q):
+            return round(ordered[min(n - 1, int(q * n))], 3)
+
+        buckets = [0] * (len(BUCKETS_MS) + 1)
+        for ms in ordered:
+            buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        return {
+            "n": n,
+            "mean_ms": round(sum(ordered) / n, 3),
+            "p50_ms": percentile(0.5),
+            "p90_ms": percentile(0.9),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(ordered[-1], 3),
+            # Samples per bucket, keyed by the bucket's upper bound in ms
+            "buckets": {
+                **{str(le): c for le, c in zip(BUCKETS_MS, buckets)},
+                "+Inf": buckets[-1],
+            },
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            profiles = self.profiles
+        return {
+            "profiles": profiles,
+            "window": self.window,
+            "stages": {
+                name: self._summary(values)
+                for name, values in samples.items()
+                if values
+            },
+        }
+
+
+stage_histograms = StageHistograms()
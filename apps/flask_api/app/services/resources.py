@@ -0,0 +1,141 @@
+"""
+One CPU thread budget per process, shared out between torch, BLAS/OpenMP,
+scikit-learn and the app's own executors.
+
+Left alone, each of these sizes itself to the machine's core count: torch's
+intra-op pool, OpenBLAS/MKL, ``RandomForestClassifier(n_jobs=-1)`` on every
+predict_proba, and request thread pools. On a 16-core host several such
+pools running at once means hundreds of OS threads fighting for 16 cores.
+Here the budget is computed once (CPU_THREADS, else the CPUs this process may
+actually use divided by the number of serving processes) and everything else
+is sized from it.
+"""
+import os
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # shipped with scikit-learn; BLAS limits are skipped without it
+    threadpool_limits = None
+
+_lock = threading.Lock()
+_configured: Optional[Dict[str, Any]] = None
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on: affinity mask and cgroup quota aware"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS / Windows
+        cpus = os.cpu_count() or 1
+
+    # Container CPU limit (cgroup v2), e.g. "200000 100000" for 2 CPUs
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, -(-int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def thread_allocation(
+    budget: Optional[int] = None, processes: int = 1
+) -> Dict[str, int]:
+    """How ``budget`` threads are shared out within one process.
+
+    Model inference runs on a single thread (see micro_batcher), so torch
+    and BLAS each get the whole budget in turn rather than a slice each.
+    Serving-time scikit-learn calls are single-threaded: joblib start-up
+    costs more than it saves on one micro-batch.
+    """
+    if budget is None:
+        budget = int(os.getenv("CPU_THREADS", "0")) or max(
+            1, available_cpus() // max(1, processes)
+        )
+    return {
+        "budget": budget,
+        "torch_intra_op": budget,
+        "torch_inter_op": 1,
+        "blas": budget,
+        "sklearn_train_n_jobs": budget,
+        "sklearn_serve_n_jobs": 1,
+        # Request pools mostly wait on the inference thread or SQLite
+        "request_pool": max(2, min(budget, 8)),
+    }
+
+
+def configure(
+    budget: Optional[int] = None, processes: int = 1, force: bool = False
+) -> Dict[str, int]:
+    """Apply the allocation to torch and BLAS for this process.
+
+    Idempotent unless ``force``; pre-fork servers call it again in each
+    worker with the number of worker processes.
+    """
+    global _configured
+    with _lock:
+        if _configured is not None and not force:
+            return _configured
+        allocation = thread_allocation(budget, processes)
+
+        # Only read by OpenMP/BLAS runtimes that have not started yet
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ.setdefault(var, str(allocation["blas"]))
+        if threadpool_limits is not None:
+            threadpool_limits(limits=allocation["blas"])
+
+        print(f"[Resources] Thread allocation: {allocation}")
+        _configured = allocation
+
+    # torch is only imported by full mode; when it is not loaded yet, the
+    # code that loads it calls configure_torch itself
+    if "torch" in sys.modules:
+        configure_torch()
+    return allocation
+
+
+def configure_torch():
+    """Apply the current allocation to torch, importing it"""
+    import torch
+
+    threads = allocation()
+    torch.set_num_threads(threads["torch_intra_op"])
+    try:
+        torch.set_num_interop_threads(threads["torch_inter_op"])
+    except RuntimeError:
+        # Can only be set before the first inter-op parallel call
+        pass
+
+
+def allocation() -> Dict[str, int]:
+    """The allocation in effect, configuring with defaults on first use"""
+    return _configured if _configured is not None else configure()
+
+
+def set_n_jobs(estimator, n_jobs: int):
+    """Set ``n_jobs`` on a fitted estimator and every estimator nested in it"""
+    if hasattr(estimator, "n_jobs"):
+        estimator.n_jobs = n_jobs
+    for _, step in getattr(estimator, "steps", []):
+        set_n_jobs(step, n_jobs)
+    for child in getattr(estimator, "estimators_", None) or []:
+        # Tree ensembles keep plain trees here; only meta-estimators recurse
+        if hasattr(child, "n_jobs") or hasattr(child, "steps"):
+            set_n_jobs(child, n_jobs)
+    return estimator
+
+
+def os_thread_count() -> Optional[int]:
+    """Native threads in this process (Linux), including torch/BLAS workers"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,314 @@
+"""
+Shadow evaluation of a candidate classifier version on live traffic.
+
+When the model registry names a shadow version, a ``sample_rate`` share of
+the emails the API classifies is queued here once the response has been
+computed. A background thread scores each one with the active and the
+shadow model on the same feature rows (without the zero-shot transformer,
+which does not depend on the version), and logs categories, confidences
+and ``predict_proba`` latencies to ``shadow_evaluations``. ``report``
+summarises agreement, latency percentiles and, for emails users corrected,
+the accuracy of each.
+
+Nothing here runs on the request path or competes with the inference
+thread for the encoder: full-mode features are the ones the request just
+computed, taken from the classifier's feature cache (a sample whose entry
+was evicted is skipped), and fast-mode features are cheap hashed n-grams.
+When the queue is full, samples are dropped.
+"""
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sklearn.preprocessing import LabelEncoder
+
+from app.services.db import get_db_connection
+from app.services.fast_classifier import fast_feature_spec, fast_text, vectorize
+from app.services.model_artifacts import load_artifact
+from app.services.model_registry import version_kind
+from app.services.resources import set_n_jobs
+
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", "256"))
+
+# Latency percentiles are taken over this many recent evaluations
+REPORT_WINDOW = 5000
+
+
+def _latency_summary(values: List[float]) -> Optional[Dict[str, float]]:
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    n = len(values)
+    return {
+        "mean_ms": round(sum(values) / n, 3),
+        "p50_ms": round(values[min(n - 1, int(0.5 * n))], 3),
+        "p95_ms": round(values[min(n - 1, int(0.95 * n))], 3),
+        "p99_ms": round(values[min(n - 1, int(0.99 * n))], 3),
+    }
+
+
+def _score(model, label_encoder, features):
+    """``(category, confidence, milliseconds)`` of one model on one row"""
+    start = time.perf_counter()
+    proba = model.predict_proba(features)[0]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    best = int(proba.argmax())
+    return str(label_encoder.classes_[best]), float(proba[best]), elapsed_ms
+
+
+class ShadowEvaluator:
+    """Scores sampled live requests with the registry's shadow version"""
+
+    def __init__(self, classifier, max_queue: int = SHADOW_QUEUE_SIZE):
+        self.classifier = classifier
+        self.registry = classifier.registry
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._thread = None
+        self._pid = None
+        # (version, kind, model, label encoder) of the loaded shadow model
+        self._shadow = (None, None, None, None)
+        self.sampled = 0
+        self.evaluated = 0
+        self.dropped = 0
+        self.uncached = 0
+        self.errors = 0
+        self.last_error = None
+
+    def offer(self, message: Dict[str, Any]) -> bool:
+        """Queue ``message`` for shadow scoring if the sample picks it"""
+        shadow = self.registry.shadow
+        active_version = self.classifier.model_version
+        if (
+            shadow is None
+            or active_version is None
+            or shadow["version"] == active_version
+            or message.get("email_id") is None
+            or random.random() >= shadow["sample_rate"]
+        ):
+            return False
+        try:
+            self._ensure_worker().put_nowait(
+                (message, active_version, shadow["version"])
+            )
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.sampled += 1
+        return True
+
+    def _ensure_worker(self) -> queue.Queue:
+        # Threads do not survive fork, so each process starts its own worker
+        with self._lock:
+            alive = self._thread is not None and self._thread.is_alive()
+            if not alive or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(self._queue,),
+                    name="shadow-evaluator",
+                    daemon=True,
+                )
+                self._thread.start()
+            return self._queue
+
+    def _run(self, items: queue.Queue):
+        while True:
+            message, active_version, shadow_version = items.get()
+            try:
+                self._evaluate(message, active_version, shadow_version)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"[ShadowEvaluator] Scoring with {shadow_version} failed: {e}")
+
+    def _shadow_model(self, version: str):
+        """``(kind, model, label_encoder)`` of ``version``, loaded once"""
+        with self._lock:
+            if self._shadow[0] == version:
+                return self._shadow[1:]
+
+        kind = version_kind(version)
+        if kind == "fast":
+            feature_spec = fast_feature_spec()
+        elif self.classifier.encoder is None:
+            raise ValueError(
+                f"{version} needs the sentence encoder; shadow it from a "
+                "server running in full mode"
+            )
+        else:
+            feature_spec = self.classifier.feature_spec()
+        model, classes, _ = load_artifact(
+            self.registry.version_dir(version), feature_spec
+        )
+        label_encoder = LabelEncoder()
+        label_encoder.classes_ = classes
+        # Off the request path: leave the cores to the serving model
+        set_n_jobs(model, 1)
+
+        print(f"[ShadowEvaluator] Loaded shadow model {version}")
+        with self._lock:
+            self._shadow = (version, kind, model, label_encoder)
+        return kind, model, label_encoder
+
+    def _features(self, kind: str, message: Dict[str, Any]):
+        """One feature row for models of ``kind``, or None if not cached"""
+        if kind == "fast":
+            return vectorize([fast_text(message)])
+        row = self.classifier.feature_cache.get(str(message["email_id"]))
+        return None if row is None else row.reshape(1, -1)
+
+    def _evaluate(self, message: Dict[str, Any], active_version, shadow_version):
+        if self.classifier.model_version != active_version:
+            return  # another version was activated since this was sampled
+        shadow_kind, shadow_model, shadow_encoder = self._shadow_model(shadow_version)
+        active_model, active_encoder = self.classifier._serving_model()
+
+        # Featurised once per kind, shared by both models when they match
+        features = {}
+        for kind in {self.classifier.mode, shadow_kind}:
+            features[kind] = self._features(kind, message)
+            if features[kind] is None:
+                self.uncached += 1
+                return
+        active = _score(active_model, active_encoder, features[self.classifier.mode])
+        shadow = _score(shadow_model, shadow_encoder, features[shadow_kind])
+
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                """
+                INSERT INTO shadow_evaluations (
+                    email_id, active_version, shadow_version,
+                    active_category, shadow_category, agree,
+                    active_confidence, shadow_confidence, active_ms, shadow_ms
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    str(message["email_id"]),
+                    active_version,
+                    shadow_version,
+                    active[0],
+                    shadow[0],
+                    int(active[0] == shadow[0]),
+                    active[1],
+                    shadow[1],
+                    round(active[2], 3),
+                    round(shadow[2], 3),
+                ),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self.evaluated += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "shadow": self.registry.shadow,
+            "sampled": self.sampled,
+            "evaluated": self.evaluated,
+            "dropped": self.dropped,
+            "uncached": self.uncached,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    def report(self, shadow_version: Optional[str] = None) -> Dict[str, Any]:
+        """Agreement, latency and feedback accuracy of a shadow version"""
+        if shadow_version is None:
+            shadow_version = (self.registry.shadow or {}).get("version")
+        if shadow_version is None:
+            return {"shadow_version": None, "evaluations": 0}
+
+        conn = get_db_connection()
+        try:
+            per_active = conn.execute(
+                """
+                SELECT active_version, COUNT(*) AS evaluations,
+                       AVG(agree) AS agreement,
+                       AVG(active_confidence) AS active_mean_confidence,
+                       AVG(shadow_confidence) AS shadow_mean_confidence
+                FROM shadow_evaluations
+                WHERE shadow_version = ?
+                GROUP BY active_version
+                ORDER BY evaluations DESC
+                """,
+                (shadow_version,),
+            ).fetchall()
+            # Accuracy against the latest user correction of each email
+            feedback = conn.execute(
+                """
+                SELECT s.active_version, COUNT(*) AS n,
+                       SUM(s.active_category = f.category) AS active_correct,
+                       SUM(s.shadow_category = f.category) AS shadow_correct
+                FROM shadow_evaluations s
+                JOIN (
+                    SELECT email_id, category, MAX(id)
+                    FROM classification_feedback
+                    GROUP BY email_id
+                ) f ON f.email_id = s.email_id
+                WHERE s.shadow_version = ?
+                GROUP BY s.active_version
+                """,
+                (shadow_version,),
+            ).fetchall()
+            recent = conn.execute(
+                """
+                SELECT active_ms, shadow_ms FROM shadow_evaluations
+                WHERE shadow_version = ?
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (shadow_version, REPORT_WINDOW),
+            ).fetchall()
+            disagreements = conn.execute(
+                """
+                SELECT active_category, shadow_category, COUNT(*) AS n
+                FROM shadow_evaluations
+                WHERE shadow_version = ? AND agree = 0
+                GROUP BY active_category, shadow_category
+                ORDER BY n DESC
+                LIMIT 10
+                """,
+                (shadow_version,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        feedback = {row["active_version"]: row for row in feedback}
+        by_active = []
+        for row in per_active:
+            entry = {
+                key: round(row[key], 4) if isinstance(row[key], float) else row[key]
+                for key in row.keys()
+            }
+            corrected = feedback.get(row["active_version"])
+            if corrected is not None:
+                entry["feedback"] = {
+                    "emails": corrected["n"],
+                    "active_accuracy": round(
+                        corrected["active_correct"] / corrected["n"], 4
+                    ),
+                    "shadow_accuracy": round(
+                        corrected["shadow_correct"] / corrected["n"], 4
+                    ),
+                }
+            by_active.append(entry)
+
+        return {
+            "shadow_version": shadow_version,
+            "evaluations": sum(row["evaluations"] for row in per_active),
+            "by_active_version": by_active,
+            "latency": {
+                "window": len(recent),
+                "active": _latency_summary([row["active_ms"] for row in recent]),
+                "shadow": _latency_summary([row["shadow_ms"] for row in recent]),
+            },
+            "top_disagreements": [dict(row) for row in disagreements],
+        }
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Out-of-core training over the full Enron corpus.
+
+Emails are read from SQLite in id-ordered chunks, featurised with the
+classifier's own extract_features, labelled from the same embeddings and
+appended to an on-disk float32 feature store. A StandardScaler and an
+SGDClassifier are then fitted with partial_fit over memory-mapped blocks of
+that store, so peak memory depends on the chunk size, not the corpus size.
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from app.services.db import connect_readonly
+from app.services.email_cleaning import clean_body_columns
+from app.services.email_features import stored_feature_sql
+from app.services.model_artifacts import check_feature_spec
+from app.services.online_learner import copy_online_head
+
+# Filled in per database: derived columns are NULL where not backfilled
+STREAM_QUERY = """
+    SELECT
+        e.id AS email_id,
+        e.from_address AS sender,
+        e.subject AS subject,
+        e.body AS body,
+        {clean_body_columns},
+        e.date AS time_sent,
+        {feature_columns}
+    FROM emails e
+    {feature_join}
+    WHERE e.id > ?
+    ORDER BY e.id
+    LIMIT ?
+"""
+
+
+class StreamingTrainer:
+    """Train a linear email classifier chunk by chunk from enron.db"""
+
+    def __init__(
+        self,
+        classifier,
+        db_path: str,
+        store_dir: Optional[str] = None,
+        chunk_size: int = 2048,
+        holdout_fraction: float = 0.1,
+        epochs: int = 3,
+    ):
+        self.classifier = classifier
+        self.db_path = db_path
+        self.store_dir = Path(store_dir or classifier.model_dir / "feature_store")
+        self.chunk_size = chunk_size
+        self.holdout_fraction = holdout_fraction
+        self.epochs = epochs
+        # progress(stage, fraction); may raise to abort a background job
+        self.progress: Optional[Callable[[str, float], None]] = None
+
+    def _report(self, stage: str, fraction: float):
+        if self.progress is not None:
+            self.progress(stage, fraction)
+
+    # ── feature store ───────────────────────────────────────────────────────
+    @property
+    def _features_path(self) -> Path:
+        return self.store_dir / "features.f32"
+
+    @property
+    def _labels_path(self) -> Path:
+        return self.store_dir / "labels.i16"
+
+    @property
+    def _ids_path(self) -> Path:
+        return self.store_dir / "email_ids.i64"
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.store_dir / "meta.json"
+
+    def iter_chunks(self, max_emails: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Yield email DataFrames of at most ``chunk_size`` rows in id order"""
+        # The corpus is only read; backfills add the derived columns
+        conn = connect_readonly(self.db_path)
+        try:
+            feature_columns, feature_join = stored_feature_sql(conn)
+            query = STREAM_QUERY.format(
+                clean_body_columns=clean_body_columns(conn),
+                feature_columns=feature_columns,
+                feature_join=feature_join,
+            )
+            last_id = 0
+            remaining = max_emails if max_emails is not None else float("inf")
+            while remaining > 0:
+                limit = int(min(self.chunk_size, remaining))
+                df = pd.read_sql_query(query, conn, params=(last_id, limit))
+                if df.empty:
+                    break
+                last_id = int(df["email_id"].iloc[-1])
+                remaining -= len(df)
+                yield self.classifier.prepare_email_frame(df)
+        finally:
+            conn.close()
+
+    def _count_emails(self, max_emails: Optional[int] = None) -> int:
+        conn = connect_readonly(self.db_path)
+        try:
+            total = conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0]
+        finally:
+            conn.close()
+        return min(total, max_emails) if max_emails is not None else total
+
+    def build_feature_store(self, max_emails: Optional[int] = None) -> Dict[str, Any]:
+        """Featurise and label the corpus into the on-disk store (pass 1)"""
+        if self.classifier.encoder is None:
+            raise ValueError("Streaming training needs a sentence encoder")
+
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        category_keys, _ = self.classifier.category_index()
+        label_index = {key: i for i, key in enumerate(category_keys)}
+        dim = self.classifier.encoder.dim
+
+        n_rows = 0
+        n_features = None
+        total = self._count_emails(max_emails)
+        start = time.perf_counter()
+        with open(self._features_path, "wb") as f_feat, open(
+            self._labels_path, "wb"
+        ) as f_lab, open(self._ids_path, "wb") as f_ids:
+            for chunk in self.iter_chunks(max_emails):
+                features = self.classifier.extract_features(chunk).astype(np.float32)
+                labels = self.classifier.label_embeddings(features[:, :dim])
+
+                n_features = features.shape[1]
+                f_feat.write(np.ascontiguousarray(features).tobytes())
+                f_lab.write(
+                    np.array(
+                        [label_index[label] for label in labels], dtype=np.int16
+                    ).tobytes()
+                )
+                f_ids.write(chunk["email_id"].to_numpy(dtype=np.int64).tobytes())
+
+                n_rows += len(chunk)
+                rate = n_rows / (time.perf_counter() - start)
+                print(
+                    f"[StreamingTrainer] Featurised {n_rows:,} emails ({rate:.1f}/s)"
+                )
+                self._report("embedding", n_rows / max(total, 1))
+
+        meta = {
+            "n_rows": n_rows,
+            "n_features": n_features,
+            "categories": category_keys,
+            "feature_spec": self.classifier.feature_spec(),
+        }
+        with open(self._meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+    def has_store(self) -> bool:
+        return self._meta_path.exists() and self._features_path.exists()
+
+    def relabel_store(self) -> Dict[str, Any]:
+        """Rewrite the store's labels for the classifier's current taxonomy.
+
+        Labels come from the stored embedding columns, so no email is
+        re-encoded; ``fit`` can then retrain on the new categories directly.
+        """
+        start = time.perf_counter()
+        features, _, _, meta = self.open_store()
+        check_feature_spec(meta["feature_spec"], self.classifier.feature_spec())
+        n_rows = meta["n_rows"]
+        dim = meta["feature_spec"]["embedding"]["dim"]
+        category_keys, _ = self.classifier.category_index()
+        label_index = {key: i for i, key in enumerate(category_keys)}
+
+        tmp_path = self._labels_path.with_name(f"labels.i16.tmp-{os.getpid()}")
+        labels = np.empty(n_rows, dtype=np.int16)
+        for start_row, end_row in self._blocks(n_rows):
+            labels[start_row:end_row] = [
+                label_index[label]
+                for label in self.classifier.label_embeddings(
+                    features[start_row:end_row, :dim]
+                )
+            ]
+        labels.tofile(tmp_path)
+        os.replace(tmp_path, self._labels_path)
+
+        meta["categories"] = category_keys
+        with open(self._meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+
+        counts = np.bincount(labels, minlength=len(category_keys))
+        return {
+            "n_rows": n_rows,
+            "relabel_ms": round((time.perf_counter() - start) * 1000, 2),
+            "label_distribution": {
+                category_keys[i]: int(c) for i, c in enumerate(counts) if c
+            },
+        }
+
+    def open_store(self):
+        """Memory-map ``(features, labels, email_ids, meta)`` from disk"""
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        n, d = meta["n_rows"], meta["n_features"]
+        features = np.memmap(
+            self._features_path, dtype=np.float32, mode="r", shape=(n, d)
+        )
+        labels = np.memmap(self._labels_path, dtype=np.int16, mode="r", shape=(n,))
+        email_ids = np.memmap(self._ids_path, dtype=np.int64, mode="r", shape=(n,))
+        return features, labels, email_ids, meta
+
+    # ── training ────────────────────────────────────────────────────────────
+    def _blocks(self, n_rows: int):
+        return [
+            (start, min(start + self.chunk_size, n_rows))
+            for start in range(0, n_rows, self.chunk_size)
+        ]
+
+    def _holdout_mask(self, email_ids: np.ndarray) -> np.ndarray:
+        # Deterministic split on email id so reruns evaluate on the same emails
+        buckets = (email_ids * 2654435761) % 1000
+        return buckets < int(self.holdout_fraction * 1000)
+
+    def fit(self) -> Dict[str, Any]:
+        """Fit scaler and SGD head over the feature store (pass 2+)"""
+        features, labels, email_ids, meta = self.open_store()
+        check_feature_spec(meta["feature_spec"], self.classifier.feature_spec())
+        n_rows = meta["n_rows"]
+        if n_rows < 10:
+            raise ValueError("Not enough emails in the feature store to train")
+
+        categories = meta["categories"]
+        classes = np.arange(len(categories))
+        blocks = self._blocks(n_rows)
+
+        # Class weights (the "balanced" heuristic, which partial_fit cannot compute)
+        counts = np.bincount(np.asarray(labels), minlength=len(categories))
+        label_distribution = {categories[i]: int(c) for i, c in enumerate(counts) if c}
+        weights = np.where(
+            counts > 0, n_rows / (len(categories) * np.maximum(counts, 1)), 0.0
+        )
+
+        self._report("fitting", 0.0)
+        scaler = StandardScaler()
+        for start, end in blocks:
+            train_rows = ~self._holdout_mask(email_ids[start:end])
+            if train_rows.any():
+                scaler.partial_fit(features[start:end][train_rows])
+
+        sgd = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=42)
+        rng = np.random.default_rng(42)
+        fit_start = time.perf_counter()
+        for epoch in range(self.epochs):
+            for block in rng.permutation(len(blocks)):
+                start, end = blocks[block]
+                train_rows = ~self._holdout_mask(email_ids[start:end])
+                if not train_rows.any():
+                    continue
+                X = scaler.transform(features[start:end][train_rows])
+                y = np.asarray(labels[start:end][train_rows])
+                sgd.partial_fit(X, y, classes=classes, sample_weight=weights[y])
+            print(f"[StreamingTrainer] Epoch {epoch + 1}/{self.epochs} done")
+            self._report("fitting", (epoch + 1) / self.epochs)
+        fit_seconds = time.perf_counter() - fit_start
+
+        model = Pipeline([("scaler", scaler), ("clf", sgd)])
+
+        self._report("evaluation", 0.0)
+        y_true, y_pred = [], []
+        for start, end in blocks:
+            holdout = self._holdout_mask(email_ids[start:end])
+            if holdout.any():
+                y_true.append(np.asarray(labels[start:end][holdout]))
+                y_pred.append(model.predict(features[start:end][holdout]))
+        y_true = np.concatenate(y_true) if y_true else np.array([], dtype=int)
+        y_pred = np.concatenate(y_pred) if y_pred else np.array([], dtype=int)
+
+        label_encoder = LabelEncoder()
+        label_encoder.classes_ = np.array(categories)
+
+        test_accuracy = float(accuracy_score(y_true, y_pred)) if len(y_true) else None
+        if len(y_true):
+            print("\nHold-out Classification Report:")
+            print(
+                classification_report(
+                    label_encoder.inverse_transform(y_true),
+                    label_encoder.inverse_transform(y_pred),
+                    zero_division=0,
+                )
+            )
+
+        self._report("saving", 0.0)
+        self.classifier.publish_model(
+            model,
+            label_encoder,
+            copy_online_head(model),
+            metadata={
+                "trainer": "streaming",
+                "n_train": int(n_rows - len(y_true)),
+                "n_test": int(len(y_true)),
+                "test_accuracy": test_accuracy,
+                "label_distribution": label_distribution,
+                "fit_seconds": round(fit_seconds, 2),
+                "epochs": self.epochs,
+                "chunk_size": self.chunk_size,
+            },
+        )
+        self._report("saving", 1.0)
+
+        return {
+            "n_rows": n_rows,
+            "n_test": int(len(y_true)),
+            "test_accuracy": test_accuracy,
+            "label_distribution": label_distribution,
+            "model_version": self.classifier.model_version,
+        }
+
+    def run(self, max_emails: Optional[int] = None) -> Dict[str, Any]:
+        from app.services.ann_index import build_from_feature_store
+
+        self.build_feature_store(max_emails)
+        stats = self.fit()
+
+        # The store already holds every embedding; index them for search
+        self._report("indexing", 0.0)
+        index = build_from_feature_store(self.classifier, self.store_dir)
+        stats["ann_index"] = {"n_vectors": len(index), "nlist": index.nlist}
+        self._report("indexing", 1.0)
+        return stats
+
+
+def main():
+    from app.services.enron_classifier import EnronEmailClassifier
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--max-emails", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=2048)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument(
+        "--reuse-store",
+        action="store_true",
+        help="Skip featurisation and train on the existing feature store",
+    )
+    args = parser.parse_args()
+
+    classifier = EnronEmailClassifier(model_dir=args.model_dir)
+    trainer = StreamingTrainer(
+        classifier, args.db, chunk_size=args.chunk_size, epochs=args.epochs
+    )
+    if not args.reuse_store:
+        trainer.build_feature_store(args.max_emails)
+    print(json.dumps(trainer.fit(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,12 @@ from sumy.nlp.tokenizers import Tokenizer
 from sumy.summarizers.lsa import LsaSummarizer
 import nltk
 
+from app.services.email_cleaning import clean_email_body
+
+# extract_email_body patterns, compiled once
+_EMAIL_ADDRESS = re.compile(r"[\w\.-]+@[\w\.-]+\.\w{2,3}")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
 
 def download_nltk_resources():
     """
@@ -29,43 +35,27 @@ class EmailSummarizer:
         # Ensure punkt is downloaded
         download_nltk_resources()
 
-    def extract_email_body(self, email_text):
+    def extract_email_body(self, email_text, cleaned=False):
         """
         Extracts only the actual email message
         and removes metadata like headers,
         CC/BCC, and signatures.
+
+        Pass ``cleaned=True`` for text that is already a stored clean_body.
         """
-        # Remove common email headers
-        email_text = re.sub(
-            r"^(Message-ID|From|To|Subject|Date|Cc|Bcc|Mime-Version|Content-Type|"
-            r"Content-Transfer-Encoding|X-[\w-]+):.*$",
-            "",
-            email_text,
-            flags=re.MULTILINE,
-        )
-
-        # Remove Enron-specific metadata (folder, origin, file name, etc.)
-        email_text = re.sub(
-            r"X-Folder:.*|X-Origin:.*|X-FileName:.*", "", email_text, flags=re.MULTILINE
-        )
-
-        # Remove email forwarding/reply metadata
-        email_text = re.sub(
-            r"(-{2,}|={2,})\s*(Original Message|Forwarded by).*",
-            "",
-            email_text,
-            flags=re.DOTALL,
-        )
+        # Headers, metadata, history, quotes and signature (see email_cleaning)
+        if not cleaned:
+            email_text = clean_email_body(email_text)
 
         # Remove repeated email addresses (from CC, BCC, etc.)
-        email_text = re.sub(r"[\w\.-]+@[\w\.-]+\.\w{2,3}", "", email_text)
+        email_text = _EMAIL_ADDRESS.sub("", email_text)
 
         # Remove excessive new lines
-        email_text = re.sub(r"\n\s*\n+", "\n\n", email_text).strip()
+        email_text = _BLANK_LINES.sub("\n\n", email_text).strip()
 
         return email_text
 
-    def summarize_email(self, email_text, num_sentences=3):
+    def summarize_email(self, email_text, num_sentences=3, cleaned=False):
         """
         Summarize the email using LSA (Latent Semantic Analysis) method
 
@@ -73,13 +63,15 @@ class EmailSummarizer:
             email_text (str): Full email text
             num_sentences (int, optional):
                 Number of sentences in summary. Defaults to 3.
+            cleaned (bool, optional):
+                True when email_text is a stored clean_body. Defaults to False.
 
         Returns:
             str: Summarized email text
         """
         try:
             # Clean the email body first
-            cleaned_text = self.extract_email_body(email_text)
+            cleaned_text = self.extract_email_body(email_text, cleaned)
 
             # Parse and summarize
             parser = PlaintextParser.from_string(cleaned_text, Tokenizer("english"))
@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+try:
+    import yaml
+except ImportError:  # YAML taxonomies are optional; JSON always works
+    yaml = None
+
+
+def validate_categories(categories: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Check a category mapping and return it with normalised fields.
+
+    Expected shape, as in DEFAULT_CATEGORIES::
+
+        {"financial": {"name": "Financial", "description": "...",
+                       "keywords": ["budget", ...]}, ...}
+    """
+    if not isinstance(categories, dict) or not categories:
+        raise ValueError("Categories must be a non-empty mapping of key -> details")
+
+    validated = {}
+    for key, details in categories.items():
+        if not isinstance(key, str) or not key.strip():
+            raise ValueError(f"Invalid category key: {key!r}")
+        if isinstance(details, str):
+            details = {"name": details}
+        if not isinstance(details, dict) or not str(details.get("name", "")).strip():
+            raise ValueError(f"Category {key!r} needs a non-empty 'name'")
+        keywords = details.get("keywords", [])
+        if not isinstance(keywords, list):
+            raise ValueError(f"Category {key!r}: 'keywords' must be a list")
+        validated[key] = {
+            **details,
+            "name": str(details["name"]).strip(),
+            "description": str(details.get("description", "")),
+            "keywords": [str(k) for k in keywords],
+        }
+    return validated
+
+
+def load_taxonomy(path: str) -> Dict[str, Dict[str, Any]]:
+    """Read categories from a .json or .yaml/.yml file.
+
+    The file may hold the mapping itself or wrap it as ``{"categories": {...}}``.
+    """
+    path = Path(path)
+    with open(path) as f:
+        if path.suffix.lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise ValueError("PyYAML is not installed; use a JSON taxonomy file")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    if isinstance(data, dict) and isinstance(data.get("categories"), dict):
+        data = data["categories"]
+    return validate_categories(data)
@@ -0,0 +1,123 @@
+"""
+Shared, bounded-cost text normalisation for email bodies.
+
+Every consumer (sentence encoder, emotion analysis, the stored clean body
+that the summariser and NER read) calls
+``normalize_text`` before running its own regexes. The text is cut to a hard
+window first, so no later pass is ever run over a multi-megabyte forwarded
+attachment; quoted replies and forwarded history are then stripped once (a
+body that is only a forward keeps the forwarded text) and the result is
+capped to the consumer's working length. How much text each step dropped is
+recorded per consumer (see ``normalization_stats``).
+"""
+import re
+import threading
+from typing import Any, Dict, Tuple
+
+# Characters each consumer actually works on. The encoder sees at most 256
+# wordpieces (~2k characters); the heuristic scorers need more context.
+CONSUMER_LIMITS = {
+    "encoder": 4096,
+    "emotion": 20000,
+    "clean_body": 20000,
+    "fast": 2000,
+}
+DEFAULT_LIMIT = 20000
+
+# Regexes only ever see this many characters (a multiple of the consumer cap,
+# so history that starts past the cap can still be found and skipped)
+SCAN_FACTOR = 4
+
+# Start of forwarded / replied history: everything from here on is dropped
+_HISTORY_MARKER = re.compile(
+    r"^[ \t>]*(?:"
+    r"-{2,}\s*(?:Original Message|Forwarded by)"
+    r"|={2,}\s*(?:Original Message|Forwarded by)"
+    r"|On .{0,200} wrote:\s*$"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Quoted reply lines ("> ...")
+_QUOTED_LINE = re.compile(r"^[ \t]*>.*(?:\n|$)", re.MULTILINE)
+
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _record(consumer: str, original: int, history: int, quoted: int, capped: int):
+    with _lock:
+        s = _stats.setdefault(
+            consumer,
+            {
+                "texts": 0,
+                "original_chars": 0,
+                "history_chars_dropped": 0,
+                "quoted_chars_dropped": 0,
+                "capped_chars_dropped": 0,
+                "texts_capped": 0,
+            },
+        )
+        s["texts"] += 1
+        s["original_chars"] += original
+        s["history_chars_dropped"] += history
+        s["quoted_chars_dropped"] += quoted
+        s["capped_chars_dropped"] += capped
+        s["texts_capped"] += int(capped > 0)
+
+
+def normalize_with_stats(text, consumer: str = "encoder") -> Tuple[str, Dict[str, int]]:
+    """Normalised text and the number of characters each step dropped"""
+    if text is None or (isinstance(text, float) and text != text):
+        return "", {"original_chars": 0, "history": 0, "quoted": 0, "capped": 0}
+    text = str(text)
+    original = len(text)
+    limit = CONSUMER_LIMITS.get(consumer, DEFAULT_LIMIT)
+
+    # 1) Hard window: nothing below runs over more than SCAN_FACTOR * limit
+    window = text[: limit * SCAN_FACTOR]
+
+    # 2) Forwarded / replied history. It is cut only when something was
+    #    written above it; a body that is just a forward keeps the forwarded
+    #    text and loses only the marker line.
+    body, history, cut = window, 0, False
+    marker = _HISTORY_MARKER.search(body)
+    while marker is not None:
+        if body[: marker.start()].strip():
+            history += len(body) - marker.start() + original - len(window)
+            body, cut = body[: marker.start()], True
+            break
+        line_end = body.find("\n", marker.start())
+        rest = "" if line_end < 0 else body[line_end + 1 :]
+        history += len(body) - len(rest)
+        body = rest
+        marker = _HISTORY_MARKER.search(body)
+
+    # 3) Quoted lines
+    stripped = _QUOTED_LINE.sub("", body) if ">" in body else body
+    quoted = len(body) - len(stripped)
+
+    # 4) Consumer cap
+    result = stripped[:limit]
+    capped = len(stripped) - len(result)
+    if not cut:
+        # Text beyond the window that was never scanned counts as capped
+        capped += original - len(window)
+
+    _record(consumer, original, history, quoted, capped)
+    return result, {
+        "original_chars": original,
+        "history": history,
+        "quoted": quoted,
+        "capped": capped,
+    }
+
+
+def normalize_text(text, consumer: str = "encoder") -> str:
+    """Bounded, history-free text for ``consumer`` (see CONSUMER_LIMITS)"""
+    return normalize_with_stats(text, consumer)[0]
+
+
+def normalization_stats() -> Dict[str, Any]:
+    """Cumulative per-consumer counts of characters dropped in this process"""
+    with _lock:
+        return {consumer: dict(s) for consumer, s in _stats.items()}
@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+"""
+Topic clusters of the corpus beyond the fixed categories.
+
+Spherical mini-batch k-means over the stored email embeddings (the ANN
+index's vectors, or the streaming trainer's feature store). Centroids are
+seeded by full k-means on a sample, then refined by streaming the whole
+corpus through in random mini-batches, so memory stays bounded by the batch
+size. Each topic is labelled with its top TF-IDF terms, treating the text
+of a topic's most central emails as one document.
+
+Centroids and labels are saved under models/topics. Per-email assignments
+go to ``email_topics``, and per-user topic counts go to the ``user_topics``
+aggregate that /api/topics reads. Emails added later are embedded and
+assigned incrementally (``--assign-new``, or POST /api/topics/assign)
+without moving the centroids.
+
+    python -m app.services.topics --db ../SQLite_db/enron.db --topics 50
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+
+from app.services.ann_index import spherical_kmeans
+from app.services.db import ensure_email_schema
+from app.services.email_cleaning import clean_body_of
+from app.services.model_artifacts import readable_dir, staging_dir, swap_in_dir
+from app.services.text_normalizer import normalize_text
+
+TOPICS_FORMAT_VERSION = 1
+TOPICS_DIR = "topics"
+
+DEFAULT_TOPICS = int(os.getenv("TOPIC_COUNT", "50"))
+TOP_TERMS = 8
+# Most central emails per topic whose text is used for its label
+LABEL_SAMPLE = 200
+
+# Mail boilerplate that says nothing about a topic
+LABEL_STOP_WORDS = sorted(
+    ENGLISH_STOP_WORDS
+    | {"cc", "com", "ect", "enron", "fw", "fwd", "hou", "http", "pm", "re", "www"}
+)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def ensure_topic_tables(conn: sqlite3.Connection):
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS email_topics (
+            email_id INTEGER PRIMARY KEY,
+            topic_id INTEGER NOT NULL,
+            score REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_email_topics_topic
+            ON email_topics (topic_id, score);
+
+        -- Emails per (user, topic); kept in step with email_topics
+        CREATE TABLE IF NOT EXISTS user_topics (
+            username TEXT NOT NULL,
+            topic_id INTEGER NOT NULL,
+            n_emails INTEGER NOT NULL,
+            PRIMARY KEY (username, topic_id)
+        );
+        """
+    )
+    conn.commit()
+
+
+class TopicModel:
+    """Unit-norm topic centroids plus their labels (``meta["topics"]``)"""
+
+    def __init__(self, centroids: np.ndarray, meta: Dict[str, Any]):
+        self.centroids = centroids
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.centroids)
+
+    @property
+    def topics(self) -> List[Dict[str, Any]]:
+        return self.meta.get("topics", [])
+
+    def assign(self, vectors: np.ndarray, block_size: int = 65536):
+        """``(topic_ids, cosine_scores)`` of the closest centroid per row"""
+        topic_ids = np.empty(len(vectors), dtype=np.int32)
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), block_size):
+            sims = _normalize(vectors[start : start + block_size]) @ self.centroids.T
+            best = np.argmax(sims, axis=1)
+            topic_ids[start : start + len(best)] = best
+            scores[start : start + len(best)] = sims[np.arange(len(best)), best]
+        return topic_ids, scores
+
+    def save(self, topics_dir: Path):
+        """Write the model to a staging directory, then swap it in"""
+        tmp_dir = staging_dir(topics_dir)
+        np.save(tmp_dir / "centroids.npy", self.centroids)
+        with open(tmp_dir / "meta.json", "w") as f:
+            json.dump(self.meta, f, indent=2)
+        swap_in_dir(tmp_dir, topics_dir)
+
+    @classmethod
+    def load(cls, topics_dir: Path) -> "TopicModel":
+        topics_dir = readable_dir(topics_dir, "meta.json")
+        with open(topics_dir / "meta.json") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != TOPICS_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported topic model format {meta.get('format_version')}"
+            )
+        return cls(np.load(topics_dir / "centroids.npy"), meta)
+
+
+def load_topic_model(
+    model_dir: Path, embedding_spec: Dict[str, Any]
+) -> Optional[TopicModel]:
+    """Load the persisted topics if they were built with the current encoder"""
+    topics_dir = readable_dir(Path(model_dir) / TOPICS_DIR, "meta.json")
+    if not (topics_dir / "meta.json").exists():
+        return None
+    try:
+        model = TopicModel.load(topics_dir)
+    except Exception as e:
+        print(f"Error loading topic model: {e}")
+        return None
+    if model.meta.get("embedding") != embedding_spec:
+        print(
+            f"Ignoring topics built with {model.meta.get('embedding')} "
+            f"(runtime encoder is {embedding_spec})"
+        )
+        return None
+    return model
+
+
+def minibatch_kmeans(
+    vectors,
+    n_topics: int,
+    batch_size: int = 4096,
+    epochs: int = 3,
+    sample_size: int = 50_000,
+    seed: int = 42,
+) -> Tuple[np.ndarray, List[float]]:
+    """Spherical mini-batch k-means over an (n, dim) array or memmap
+
+    Returns the unit-norm centroids and the mean cosine similarity of each
+    epoch's batches to their centroid, before the update.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    n_topics = int(min(n_topics, n))
+
+    sample_idx = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+    centroids = spherical_kmeans(
+        _normalize(vectors[sample_idx]), n_topics, n_iter=10, seed=seed
+    )
+
+    # Per-centroid learning rate 1 / (emails seen so far), as in Sculley's
+    # web-scale k-means
+    seen = np.zeros(n_topics, dtype=np.float64)
+    epoch_similarity = []
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        order = rng.permutation(n)
+        total_similarity = 0.0
+        for lo in range(0, n, batch_size):
+            rows = np.sort(order[lo : lo + batch_size])
+            x = _normalize(vectors[rows])
+            sims = x @ centroids.T
+            labels = np.argmax(sims, axis=1)
+            total_similarity += float(sims[np.arange(len(x)), labels].sum())
+
+            counts = np.bincount(labels, minlength=n_topics)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, x)
+            hit = counts > 0
+            seen[hit] += counts[hit]
+            rate = (counts[hit] / seen[hit])[:, None].astype(np.float32)
+            centroids[hit] = (1 - rate) * centroids[hit] + rate * (
+                sums[hit] / counts[hit][:, None]
+            )
+            centroids[hit] = _normalize(centroids[hit])
+
+        epoch_similarity.append(round(total_similarity / n, 4))
+        print(
+            f"[Topics] Epoch {epoch + 1}/{epochs}: mean similarity "
+            f"{epoch_similarity[-1]} ({n / (time.perf_counter() - start):.0f} "
+            f"emails/s)"
+        )
+    return centroids, epoch_similarity
+
+
+def _email_texts(conn: sqlite3.Connection, email_ids) -> Dict[int, str]:
+    """Subject and clean body of each email, keyed by id"""
+    email_ids = [int(email_id) for email_id in email_ids]
+    texts = {}
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(email_ids), 900):
+        batch = email_ids[i : i + 900]
+        placeholders = ",".join("?" for _ in batch)
+        rows = conn.execute(
+            f"""
+            SELECT id, subject, body, clean_body, clean_body_version
+            FROM emails WHERE id IN ({placeholders})
+            """,
+            batch,
+        ).fetchall()
+        for email_id, subject, body, clean_body, clean_body_version in rows:
+            text = clean_body_of(
+                {
+                    "body": body,
+                    "clean_body": clean_body,
+                    "clean_body_version": clean_body_version,
+                }
+            )
+            texts[email_id] = f"{subject or ''} {normalize_text(text, 'fast')}"
+    return texts
+
+
+def label_topics(
+    conn: sqlite3.Connection,
+    email_ids: np.ndarray,
+    topic_ids: np.ndarray,
+    scores: np.ndarray,
+    n_topics: int,
+    sample: int = LABEL_SAMPLE,
+    top_terms: int = TOP_TERMS,
+) -> List[List[str]]:
+    """Top TF-IDF terms per topic, one document per topic"""
+    documents = []
+    for topic in range(n_topics):
+        members = np.flatnonzero(topic_ids == topic)
+        central = members[np.argsort(-scores[members])[:sample]]
+        texts = _email_texts(conn, email_ids[central])
+        documents.append(" ".join(texts.values()))
+
+    vectorizer = TfidfVectorizer(
+        stop_words=LABEL_STOP_WORDS,
+        token_pattern=r"(?u)\b[a-zA-Z][a-zA-Z]{2,}\b",
+        sublinear_tf=True,
+        # A term in most topics describes none of them
+        max_df=0.5 if n_topics >= 4 else 1.0,
+        max_features=100_000,
+    )
+    try:
+        weights = vectorizer.fit_transform(documents)
+    except ValueError:
+        # No usable text at all (e.g. the emails are missing from this DB)
+        return [[] for _ in range(n_topics)]
+    terms = vectorizer.get_feature_names_out()
+    labels = []
+    for topic in range(n_topics):
+        row = weights.getrow(topic)
+        best = row.indices[np.argsort(-row.data)[:top_terms]]
+        labels.append([str(terms[i]) for i in best])
+    return labels
+
+
+def _embedding_source(classifier, store_dir: Optional[str] = None):
+    """``(vectors, email_ids, embedding_spec)`` of the stored embeddings"""
+    if store_dir is not None:
+        from app.services.streaming_trainer import StreamingTrainer
+
+        trainer = StreamingTrainer(classifier, db_path=None, store_dir=store_dir)
+        features, _, email_ids, meta = trainer.open_store()
+        embedding = meta["feature_spec"]["embedding"]
+        return features[:, : embedding["dim"]], email_ids, embedding
+
+    index = classifier.ann_index
+    if index is None:
+        raise ValueError(
+            "No similarity index with stored embeddings. Train the model first, "
+            "or pass the streaming trainer's --store-dir."
+        )
+
+    class _IndexVectors:
+        """Row access to the index's (possibly int8) vectors"""
+
+        def __len__(self):
+            return len(index)
+
+        def __getitem__(self, rows):
+            return index.dense_vectors(rows)
+
+    return _IndexVectors(), np.asarray(index.ids), index.meta["embedding"]
+
+
+def _rebuild_user_topics(conn: sqlite3.Connection):
+    conn.execute("DELETE FROM user_topics")
+    conn.execute(
+        """
+        INSERT INTO user_topics (username, topic_id, n_emails)
+        SELECT users.username, t.topic_id, COUNT(*)
+        FROM email_topics t
+        JOIN emails ON emails.id = t.email_id
+        JOIN folders ON emails.folder_id = folders.id
+        JOIN users ON folders.user_id = users.id
+        GROUP BY users.username, t.topic_id
+        """
+    )
+
+
+def build_topics(
+    classifier,
+    db_path: str,
+    n_topics: int = DEFAULT_TOPICS,
+    batch_size: int = 4096,
+    epochs: int = 3,
+    store_dir: Optional[str] = None,
+) -> TopicModel:
+    """Cluster the stored embeddings, label the topics and persist everything"""
+    start = time.perf_counter()
+    vectors, email_ids, embedding = _embedding_source(classifier, store_dir)
+    if len(email_ids) == 0:
+        raise ValueError("No stored embeddings to cluster")
+    print(f"[Topics] Clustering {len(email_ids):,} emails into {n_topics} topics")
+
+    centroids, epoch_similarity = minibatch_kmeans(
+        vectors, n_topics, batch_size=batch_size, epochs=epochs
+    )
+    model = TopicModel(centroids, {})
+    topic_ids = np.empty(len(email_ids), dtype=np.int32)
+    scores = np.empty(len(email_ids), dtype=np.float32)
+    for lo in range(0, len(email_ids), batch_size * 16):
+        rows = slice(lo, lo + batch_size * 16)
+        topic_ids[rows], scores[rows] = model.assign(vectors[rows])
+    email_ids = np.asarray(email_ids, dtype=np.int64)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_email_schema(conn)
+        ensure_topic_tables(conn)
+        labels = label_topics(conn, email_ids, topic_ids, scores, len(centroids))
+        sizes = np.bincount(topic_ids, minlength=len(centroids))
+
+        model.meta = {
+            "format_version": TOPICS_FORMAT_VERSION,
+            "version": datetime.now(timezone.utc).strftime("topics-%Y%m%d%H%M%S"),
+            "embedding": embedding,
+            "n_topics": len(centroids),
+            "n_emails": int(len(email_ids)),
+            "epochs": epochs,
+            "batch_size": batch_size,
+            "epoch_mean_similarity": epoch_similarity,
+            "topics": [
+                {
+                    "topic_id": topic,
+                    "terms": labels[topic],
+                    "label": ", ".join(labels[topic][:3]),
+                    "size": int(sizes[topic]),
+                }
+                for topic in range(len(centroids))
+            ],
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            "build_seconds": round(time.perf_counter() - start, 2),
+        }
+        model.save(Path(classifier.model_dir) / TOPICS_DIR)
+
+        with conn:
+            conn.execute("DELETE FROM email_topics")
+            conn.executemany(
+                "INSERT INTO email_topics (email_id, topic_id, score) VALUES (?, ?, ?)",
+                zip(
+                    email_ids.tolist(),
+                    topic_ids.tolist(),
+                    np.round(scores, 4).tolist(),
+                ),
+            )
+            _rebuild_user_topics(conn)
+    finally:
+        conn.close()
+
+    print(
+        f"[Topics] Built {len(model)} topics over {len(email_ids):,} emails "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    return model
+
+
+def topic_sizes(conn: sqlite3.Connection) -> Dict[int, int]:
+    """Emails per topic, from the per-user aggregate"""
+    return dict(
+        conn.execute(
+            "SELECT topic_id, SUM(n_emails) FROM user_topics GROUP BY topic_id"
+        ).fetchall()
+    )
+
+
+def user_topic_counts(conn: sqlite3.Connection, username: str) -> Dict[int, int]:
+    """Emails per topic for one user, largest first"""
+    return dict(
+        conn.execute(
+            "SELECT topic_id, n_emails FROM user_topics WHERE username = ? "
+            "ORDER BY n_emails DESC",
+            (username,),
+        ).fetchall()
+    )
+
+
+def topic_members(
+    conn: sqlite3.Connection, topic_id: int, limit: int = 20
+) -> List[Tuple[int, float]]:
+    """``(email_id, score)`` of a topic's most central emails"""
+    return conn.execute(
+        "SELECT email_id, score FROM email_topics WHERE topic_id = ? "
+        "ORDER BY score DESC LIMIT ?",
+        (topic_id, limit),
+    ).fetchall()
+
+
+# Emails without a topic yet, with their owner, in id order
+_UNASSIGNED_QUERY = """
+    SELECT e.id, e.subject, e.body, e.clean_body, e.clean_body_version,
+           users.username
+    FROM emails e
+    JOIN folders ON e.folder_id = folders.id
+    JOIN users ON folders.user_id = users.id
+    LEFT JOIN email_topics t ON t.email_id = e.id
+    WHERE e.id > ? AND t.email_id IS NULL
+    ORDER BY e.id
+    LIMIT ?
+"""
+
+
+def assign_new_emails(
+    classifier,
+    model: TopicModel,
+    db_path: str,
+    batch_size: int = 256,
+    max_emails: Optional[int] = None,
+    progress: Optional[Callable[[str, float], None]] = None,
+) -> Dict[str, Any]:
+    """Embed and assign emails that have no topic yet; centroids stay put
+
+    ``progress(stage, fraction)`` is called before each batch, so a training
+    job's ``report`` can cancel the run between batches.
+    """
+    if classifier.encoder is None:
+        raise ValueError("Topic assignment needs the sentence encoder")
+
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    assigned = 0
+    try:
+        ensure_email_schema(conn)
+        ensure_topic_tables(conn)
+        last_id = 0
+        while max_emails is None or assigned < max_emails:
+            if progress is not None:
+                progress("assigning", assigned / max_emails if max_emails else 0.0)
+            limit = batch_size
+            if max_emails is not None:
+                limit = min(limit, max_emails - assigned)
+            rows = conn.execute(_UNASSIGNED_QUERY, (last_id, limit)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            texts = [
+                classifier.preprocess_text(
+                    f"{subject or ''} "
+                    + clean_body_of(
+                        {
+                            "body": body,
+                            "clean_body": clean_body,
+                            "clean_body_version": clean_body_version,
+                        }
+                    )
+                )
+                for _, subject, body, clean_body, clean_body_version, _ in rows
+            ]
+            topic_ids, scores = model.assign(classifier.extract_embeddings(texts))
+
+            per_user = Counter(
+                (row[5], int(topic)) for row, topic in zip(rows, topic_ids)
+            )
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO email_topics (email_id, topic_id, score) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (row[0], int(topic), round(float(score), 4))
+                        for row, topic, score in zip(rows, topic_ids, scores)
+                    ],
+                )
+                conn.executemany(
+                    """
+                    INSERT INTO user_topics (username, topic_id, n_emails)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(username, topic_id) DO UPDATE SET
+                        n_emails = n_emails + excluded.n_emails
+                    """,
+                    [(user, topic, n) for (user, topic), n in per_user.items()],
+                )
+            assigned += len(rows)
+            print(f"[Topics] Assigned {assigned} new emails (last id {last_id})")
+    finally:
+        conn.close()
+
+    return {
+        "assigned": assigned,
+        "topics_version": model.meta.get("version"),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    from app.services.enron_classifier import EnronEmailClassifier
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--topics", type=int, default=DEFAULT_TOPICS)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument(
+        "--store-dir",
+        default=None,
+        help="Cluster the streaming trainer's feature store instead of the "
+        "similarity index",
+    )
+    parser.add_argument(
+        "--assign-new",
+        action="store_true",
+        help="Only assign emails without a topic to the existing topics",
+    )
+    args = parser.parse_args()
+
+    classifier = EnronEmailClassifier(model_dir=args.model_dir)
+    if args.assign_new:
+        model = load_topic_model(
+            classifier.model_dir, classifier.feature_spec()["embedding"]
+        )
+        if model is None:
+            raise SystemExit("No topic model for this encoder; build one first")
+        print(json.dumps(assign_new_emails(classifier, model, args.db), indent=2))
+        return
+
+    model = build_topics(
+        classifier,
+        args.db,
+        n_topics=args.topics,
+        batch_size=args.batch_size,
+        epochs=args.epochs,
+        store_dir=args.store_dir,
+    )
+    for topic in model.topics:
+        print(f"{topic['topic_id']:>4} {topic['size']:>8,}  {' '.join(topic['terms'])}")
+
+
+if __name__ == "__main__":
+    main()
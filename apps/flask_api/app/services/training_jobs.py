@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Stages reported by EnronEmailClassifier.train / StreamingTrainer, in order
+TRAINING_STAGES = [
+    "queued",
+    "loading",
+    "labeling",
+    "embedding",
+    "metadata",
+    "fitting",
+    "evaluation",
+    "distillation",
+    "saving",
+    "indexing",
+]
+
+
+class TrainingCancelled(Exception):
+    """Raised from a progress callback once the job has been cancelled"""
+
+
+class TrainingJob:
+    """State of one background training run, updated from the worker thread"""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.cancel_event = threading.Event()
+
+    def report(self, stage: str, fraction: float):
+        """Progress callback handed to the trainers; aborts the run on cancel"""
+        if self.cancel_event.is_set():
+            raise TrainingCancelled(f"Training job {self.id} was cancelled")
+        self.stage = stage
+        self.progress = round(min(max(float(fraction), 0.0), 1.0), 4)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "stage_progress": self.progress,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": (
+                round(end - self.started_at, 2) if self.started_at else None
+            ),
+            "cancel_requested": self.cancel_event.is_set(),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class TrainingJobManager:
+    """Runs training functions one at a time on a background thread.
+
+    A job function receives the TrainingJob and should pass ``job.report`` to
+    the trainer as its progress callback. The trainers build the new model on
+    the side and publish it only once it is saved, so a failed or cancelled
+    job leaves the serving model untouched. Finished job records are written
+    to ``<model_dir>/training_jobs`` so their results outlive the process.
+    """
+
+    def __init__(self, model_dir: Path, max_history: int = 50):
+        self.jobs_dir = Path(model_dir) / "training_jobs"
+        self.max_history = max_history
+        self._jobs: Dict[str, TrainingJob] = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Executor threads do not survive fork, so create one per process
+        if self._executor is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="training-job"
+            )
+        return self._executor
+
+    def submit(
+        self, fn: Callable[[TrainingJob], Dict[str, Any]], params: Dict[str, Any]
+    ) -> TrainingJob:
+        job = TrainingJob(params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._get_executor().submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: TrainingJob, fn: Callable[[TrainingJob], Dict[str, Any]]):
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            self._persist(job)
+            return
+
+        job.status = "running"
+        job.started_at = time.time()
+        print(f"[TrainingJob {job.id}] Started with {job.params}")
+        try:
+            job.result = fn(job)
+            job.status = "succeeded"
+            job.stage, job.progress = "done", 1.0
+        except TrainingCancelled as e:
+            job.status = "cancelled"
+            job.error = str(e)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            job.traceback = traceback.format_exc()
+            print(f"[TrainingJob {job.id}] Failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            print(
+                f"[TrainingJob {job.id}] {job.status} after "
+                f"{job.finished_at - job.started_at:.1f}s"
+            )
+            self._persist(job)
+
+    def _persist(self, job: TrainingJob):
+        try:
+            self.jobs_dir.mkdir(parents=True, exist_ok=True)
+            record = job.to_dict()
+            record["traceback"] = job.traceback
+            with open(self.jobs_dir / f"{job.id}.json", "w") as f:
+                json.dump(record, f, indent=2, default=str)
+        except Exception as e:
+            print(f"[TrainingJob {job.id}] Could not save job record: {e}")
+
+    def _prune(self):
+        finished = [
+            job
+            for job in self._jobs.values()
+            if job.status not in ("queued", "running")
+        ]
+        finished.sort(key=lambda job: job.created_at)
+        for job in finished[: max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        path = self.jobs_dir / f"{job_id}.json"
+        if path.exists() and path.parent == self.jobs_dir:
+            with open(path) as f:
+                return json.load(f)
+        return None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: -job.created_at)
+        return [job.to_dict() for job in jobs]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Request cancellation; the run stops at its next progress report"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status in ("queued", "running"):
+            job.cancel_event.set()
+        return job.to_dict()
+
+    def active_job(self) -> Optional[TrainingJob]:
+        for job in self._jobs.values():
+            if job.status in ("queued", "running"):
+                return job
+        return None
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_ann_index.py
+
+Compare top-k latency and recall of the IVF index against a brute-force
+cosine scan. Uses the persisted index under models/ann_index, or random
+unit vectors with --synthetic to size-test without a trained model.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.ann_index import ANN_INDEX_DIR, IVFIndex
+
+
+def brute_force(vectors, query, k):
+    scores = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), 65536):
+        scores[start : start + 65536] = vectors[start : start + 65536] @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--synthetic", type=int, default=0, help="random vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        # Clustered data, so IVF has structure to exploit like real embeddings
+        centers = rng.normal(size=(256, 384)).astype(np.float32)
+        data = centers[rng.integers(0, 256, args.synthetic)] + rng.normal(
+            scale=0.5, size=(args.synthetic, 384)
+        ).astype(np.float32)
+        index = IVFIndex.build(data, np.arange(args.synthetic))
+    else:
+        index = IVFIndex.load(f"{args.model_dir}/{ANN_INDEX_DIR}")
+
+    vectors = index.dense_vectors()
+    query_rows = rng.choice(len(index), size=args.queries, replace=False)
+    queries = vectors[query_rows] + rng.normal(
+        scale=0.01, size=(args.queries, index.dim)
+    ).astype(np.float32)
+
+    start = time.perf_counter()
+    truth = [set(index.ids[brute_force(vectors, q, args.k)]) for q in queries]
+    brute_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+    print(f"\n=== ANN benchmark: {len(index):,} vectors, {index.nlist} lists ===")
+    print(f"  brute force     : {brute_ms:7.2f} ms/query  recall@{args.k} 1.000")
+    for nprobe in args.nprobe:
+        latencies, recalls = [], []
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            ids, _ = index.search(q, k=args.k, nprobe=nprobe)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(expected & set(ids)) / args.k)
+        print(
+            f"  nprobe={nprobe:<4d}     : {np.median(latencies):7.2f} ms/query  "
+            f"(p99 {np.percentile(latencies, 99):.2f})  "
+            f"recall@{args.k} {np.mean(recalls):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_embedding_batching.py
+
+Compare CPU embedding throughput of fixed-size batches in corpus order (the
+old extract_embeddings behaviour) against length-bucketed, token-budget
+batches on a random mix of short and long Enron emails.
+"""
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from app.services.encoder_backends import ENCODER_MODEL_NAME, TorchSentenceEncoder
+from app.services.length_batching import encode_bucketed
+
+
+def load_texts(db_path: str, limit: int):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT subject, body FROM emails ORDER BY RANDOM() LIMIT ?", (limit,)
+    ).fetchall()
+    conn.close()
+    return [f"{subject or ''} {body or ''}" for subject, body in rows]
+
+
+def encode_fixed(encoder, texts, batch_size: int = 16):
+    return np.vstack(
+        [
+            encoder.encode(texts[i : i + batch_size], batch_size=batch_size)
+            for i in range(0, len(texts), batch_size)
+        ]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--num-emails", type=int, default=2000)
+    parser.add_argument("--token-budget", type=int, default=8192)
+    args = parser.parse_args()
+
+    texts = load_texts(args.db, args.num_emails)
+    lengths = np.array([len(t) for t in texts])
+    print(
+        f"Loaded {len(texts)} emails: median {np.median(lengths):.0f} chars, "
+        f"p99 {np.percentile(lengths, 99):.0f} chars, max {lengths.max()} chars"
+    )
+
+    encoder = TorchSentenceEncoder(
+        SentenceTransformer(ENCODER_MODEL_NAME, device="cpu"), device="cpu"
+    )
+    encoder.encode(texts[:16])  # warm-up
+
+    start = time.perf_counter()
+    fixed = encode_fixed(encoder, texts)
+    fixed_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bucketed = encode_bucketed(encoder, texts, token_budget=args.token_budget)
+    bucketed_secs = time.perf_counter() - start
+
+    print("\n=== Embedding batching benchmark (CPU) ===")
+    print(f"  fixed batches of 16 : {len(texts) / fixed_secs:8.1f} emails/s")
+    print(f"  length-bucketed     : {len(texts) / bucketed_secs:8.1f} emails/s")
+    print(f"  speed-up            : {fixed_secs / bucketed_secs:8.2f}x")
+    print(f"  max |Δ| embeddings  : {np.max(np.abs(fixed - bucketed)):.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_encoder_backends.py
+
+Benchmark the sentence encoder backends (torch, onnx, onnx-int8) on Enron
+emails: encoding throughput on CPU, embedding deviation from the torch
+reference, and the impact on zero-shot labels.
+"""
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from app.services.encoder_backends import (
+    ENCODER_MODEL_NAME,
+    TorchSentenceEncoder,
+    build_encoder,
+    compare_encoders,
+)
+from app.services.enron_classifier import DEFAULT_CATEGORIES, EnronEmailClassifier
+
+
+def load_texts(db_path: str, limit: int):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT subject, body FROM emails ORDER BY id LIMIT ?", (limit,)
+    ).fetchall()
+    conn.close()
+    return [f"{subject or ''} {body or ''}" for subject, body in rows]
+
+
+def time_encoder(encoder, texts, batch_size: int, repeats: int = 3):
+    encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    best = float("inf")
+    embeddings = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embeddings = encoder.encode(texts, batch_size=batch_size)
+        best = min(best, time.perf_counter() - start)
+    return embeddings, len(texts) / best
+
+
+def zero_shot_labels(embeddings, category_embeds):
+    sims = EnronEmailClassifier._cosine_similarity(embeddings, category_embeds)
+    return sims.argmax(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--num-emails", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    texts = load_texts(args.db, args.num_emails)
+    print(f"Loaded {len(texts)} emails from {args.db}")
+
+    sentence_model = SentenceTransformer(ENCODER_MODEL_NAME, device="cpu")
+    reference = TorchSentenceEncoder(sentence_model, device="cpu")
+
+    category_names = [v["name"] for v in DEFAULT_CATEGORIES.values()]
+
+    results = []
+    ref_embeddings = None
+    ref_labels = None
+    for backend in ("torch", "onnx", "onnx-int8"):
+        encoder = (
+            reference
+            if backend == "torch"
+            else build_encoder(
+                backend, sentence_model, Path(args.model_dir), tolerance=0.0
+            )
+        )
+        if encoder.name != backend:
+            print(f"Skipping {backend}: backend unavailable")
+            continue
+
+        embeddings, throughput = time_encoder(encoder, texts, args.batch_size)
+        labels = zero_shot_labels(
+            embeddings, encoder.encode(category_names, batch_size=16)
+        )
+
+        row = {"backend": backend, "emails_per_sec": throughput}
+        if ref_embeddings is None:
+            ref_embeddings, ref_labels = embeddings, labels
+        else:
+            row.update(compare_encoders(reference, encoder, texts[:200]))
+            row["label_agreement"] = float(np.mean(labels == ref_labels))
+        results.append(row)
+
+    print("\n=== Encoder backend benchmark ===")
+    base = results[0]["emails_per_sec"]
+    for row in results:
+        line = (
+            f"{row['backend']:>10}: {row['emails_per_sec']:8.1f} emails/s "
+            f"({row['emails_per_sec'] / base:4.2f}x)"
+        )
+        if "min_cosine" in row:
+            line += (
+                f" | min cos {row['min_cosine']:.4f}"
+                f" | max |Δ| {row['max_abs_diff']:.4f}"
+                f" | label agreement {row['label_agreement']:.2%}"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_encoding_pool.py
+
+CPU embedding throughput of the in-process encoder against EncodingPool with
+an increasing number of worker processes, to check labelling scales with
+cores and that pooled embeddings match the in-process ones.
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+from app.services.encoder_backends import ENCODER_MODEL_NAME, TorchSentenceEncoder
+from app.services.encoding_pool import EncodingPool
+from app.services.length_batching import encode_bucketed
+
+
+def load_texts(db_path: str, limit: int):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT subject, body FROM emails ORDER BY RANDOM() LIMIT ?", (limit,)
+    ).fetchall()
+    conn.close()
+    return [f"{subject or ''} {body or ''}" for subject, body in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--num-emails", type=int, default=4000)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()]
+    )
+    args = parser.parse_args()
+
+    texts = load_texts(args.db, args.num_emails)
+
+    torch.set_num_threads(os.cpu_count())
+    encoder = TorchSentenceEncoder(
+        SentenceTransformer(ENCODER_MODEL_NAME, device="cpu"), device="cpu"
+    )
+    encoder.encode(texts[:16])  # warm-up
+    start = time.perf_counter()
+    reference = encode_bucketed(encoder, texts)
+    base_secs = time.perf_counter() - start
+
+    print(f"\n=== Encoding pool benchmark ({len(texts)} emails, CPU) ===")
+    print(
+        f"  in-process ({os.cpu_count()} threads) : "
+        f"{len(texts) / base_secs:8.1f} emails/s"
+    )
+    for n_workers in sorted(set(args.workers)):
+        with EncodingPool("torch", args.model_dir, n_workers=n_workers) as pool:
+            pool.encode(texts[: pool.chunk_size * n_workers])  # start + warm-up
+            start = time.perf_counter()
+            pooled = pool.encode(texts)
+            secs = time.perf_counter() - start
+        print(
+            f"  {n_workers:2d} worker(s)               : "
+            f"{len(texts) / secs:8.1f} emails/s  ({base_secs / secs:.2f}x)  "
+            f"max |Δ| {np.max(np.abs(pooled - reference)):.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
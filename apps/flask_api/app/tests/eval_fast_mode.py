@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_fast_mode.py
+
+Start-up time and single-core throughput of the fast-mode classifier
+(hashed n-grams + linear model), with and without emotion analysis, and its
+agreement with the full model's stored classifications on the same emails.
+"""
+import argparse
+import sqlite3
+import time
+
+start = time.perf_counter()
+from app.services.fast_classifier import FastEmailClassifier, fast_text  # noqa: E402
+
+IMPORT_SECONDS = time.perf_counter() - start
+
+
+def load_labelled(db_path: str, limit: int):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        """
+        SELECT e.id AS email_id, e.subject AS subject, e.body AS body,
+               c.category AS category, c.model_version AS model_version
+        FROM emails e
+        LEFT JOIN email_classifications c ON c.email_id = CAST(e.id AS TEXT)
+        ORDER BY RANDOM()
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--num-emails", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fast = FastEmailClassifier(model_dir=args.model_dir)
+    load_seconds = time.perf_counter() - start
+    if fast.model is None:
+        raise SystemExit(
+            "Train a fast model first: python -m app.services.fast_classifier"
+        )
+    print(f"Import : {IMPORT_SECONDS * 1000:8.1f} ms")
+    print(f"Load   : {load_seconds * 1000:8.1f} ms ({fast.model_version})")
+
+    messages = load_labelled(args.db, args.num_emails)
+    batches = [
+        messages[i : i + args.batch_size]
+        for i in range(0, len(messages), args.batch_size)
+    ]
+
+    start = time.perf_counter()
+    predicted = []
+    for batch in batches:
+        keys, _ = fast.predict_texts([fast_text(message) for message in batch])
+        predicted.extend(keys)
+    rate = len(messages) / (time.perf_counter() - start)
+    print(f"\nClassification only   : {rate:8.1f} emails/s")
+
+    start = time.perf_counter()
+    for batch in batches:
+        fast.predict_batch(batch)
+    rate = len(messages) / (time.perf_counter() - start)
+    print(f"With emotion analysis : {rate:8.1f} emails/s")
+
+    # Only emails in FastTrainer's hold-out split were not trained on
+    pairs = [
+        (message["category"], key)
+        for message, key in zip(messages, predicted)
+        if message["category"] is not None
+        and not (message["model_version"] or "").startswith("fast-")
+        and (message["email_id"] * 2654435761) % 1000 < 100
+    ]
+    if pairs:
+        agreement = sum(stored == key for stored, key in pairs) / len(pairs)
+        print(
+            f"\nHold-out agreement with the full model's stored labels: "
+            f"{agreement:.1%} ({len(pairs)} emails)"
+        )
+
+
+if __name__ == "__main__":
+    main()
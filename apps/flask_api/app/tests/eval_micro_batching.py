@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_micro_batching.py
+
+Throughput and p50/p99 latency of single-email classification under
+concurrent load, with every thread calling predict_one directly versus
+going through the MicroBatcher, against the offline predict_batch throughput
+on the same emails.
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from app.services.enron_classifier import EnronEmailClassifier
+from app.services.micro_batcher import MicroBatcher
+from app.tests.eval_single_email_latency import load_messages
+
+
+def run_concurrent(fn, messages, concurrency):
+    """Call ``fn`` on every message from ``concurrency`` threads"""
+    latencies = []
+    lock = threading.Lock()
+    next_index = [0]
+
+    def worker():
+        while True:
+            with lock:
+                i = next_index[0]
+                next_index[0] += 1
+            if i >= len(messages):
+                return
+            start = time.perf_counter()
+            fn(messages[i])
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    secs = time.perf_counter() - start
+    return (
+        len(messages) / secs,
+        np.percentile(latencies, 50),
+        np.percentile(latencies, 99),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--num-emails", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    classifier = EnronEmailClassifier(model_dir=args.model_dir)
+    if classifier.ensemble_model is None:
+        raise SystemExit("Train a model first")
+    messages = load_messages(args.db, args.num_emails)
+    classifier.predict_batch(messages[:8])  # warm-up
+
+    start = time.perf_counter()
+    for i in range(0, len(messages), args.max_batch):
+        classifier.predict_batch(messages[i : i + args.max_batch])
+    offline = len(messages) / (time.perf_counter() - start)
+    print(f"\n=== Offline predict_batch (batches of {args.max_batch}) ===")
+    print(f"  throughput : {offline:8.1f} emails/s")
+
+    batcher = MicroBatcher(
+        classifier.predict_batch,
+        max_batch_size=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+    )
+    for concurrency in args.concurrency:
+        print(f"\n=== Concurrency {concurrency} ({len(messages)} emails) ===")
+        rate, p50, p99 = run_concurrent(classifier.predict_one, messages, concurrency)
+        print(
+            f"  predict_one directly : {rate:8.1f} emails/s   "
+            f"p50 {p50:7.1f} ms   p99 {p99:7.1f} ms"
+        )
+        rate, p50, p99 = run_concurrent(batcher.predict, messages, concurrency)
+        print(
+            f"  micro-batched        : {rate:8.1f} emails/s   "
+            f"p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   "
+            f"({rate / offline:.0%} of offline)"
+        )
+    print(f"\nBatcher: {batcher.status()}")
+
+
+if __name__ == "__main__":
+    main()
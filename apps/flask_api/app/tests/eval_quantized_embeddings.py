@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_quantized_embeddings.py
+
+Measure int8 embedding storage against exact float32: memory, brute-force
+recall@k, category-label agreement and cosine-kernel throughput. Reads the
+embedding columns of the streaming trainer's feature store, or random
+clustered vectors with --synthetic.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.embedding_store import QuantizedEmbeddings, measure_recall
+
+
+def load_store_embeddings(model_dir: str):
+    from app.services.streaming_trainer import StreamingTrainer
+
+    trainer = StreamingTrainer(None, None, store_dir=f"{model_dir}/feature_store")
+    features, _, _, meta = trainer.open_store()
+    dim = meta["feature_spec"]["embedding"]["dim"]
+    return np.ascontiguousarray(features[:, :dim])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--synthetic", type=int, default=0, help="random vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--categories", type=int, default=15)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        centers = rng.normal(size=(256, 384)).astype(np.float32)
+        exact = centers[rng.integers(0, 256, args.synthetic)] + rng.normal(
+            scale=0.5, size=(args.synthetic, 384)
+        ).astype(np.float32)
+    else:
+        exact = load_store_embeddings(args.model_dir)
+    exact /= np.linalg.norm(exact, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    quantized = QuantizedEmbeddings.from_float(exact)
+    quantize_secs = time.perf_counter() - start
+
+    recall = measure_recall(exact, quantized, n_queries=args.queries, k=args.k)
+
+    # Category labelling: argmax over a handful of "category" directions
+    categories = exact[rng.choice(len(exact), size=args.categories, replace=False)]
+    start = time.perf_counter()
+    exact_labels = np.argmax(exact @ categories.T, axis=1)
+    exact_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    quant_labels = np.argmax(quantized.cosine_similarity(categories), axis=1)
+    quant_secs = time.perf_counter() - start
+
+    print(f"\n=== int8 embeddings: {len(exact):,} x {exact.shape[1]} ===")
+    print(f"  float32 size        : {exact.nbytes / 2**20:8.1f} MB")
+    print(f"  int8 size           : {quantized.nbytes / 2**20:8.1f} MB")
+    print(f"  quantize time       : {quantize_secs:8.2f} s")
+    print(f"  recall@{args.k:<3d}         : {recall['recall_at_k']:8.4f}")
+    print(f"  max |Δ cosine|      : {recall['max_abs_score_error']:8.5f}")
+    print(f"  label agreement     : {np.mean(exact_labels == quant_labels):8.4f}")
+    print(f"  labelling float32   : {exact_secs * 1000:8.1f} ms")
+    print(f"  labelling int8      : {quant_secs * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
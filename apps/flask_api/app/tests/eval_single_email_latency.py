@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_single_email_latency.py
+
+Single-email latency (p50/p99) of the pandas-free featurize_one/predict_one
+path against extract_features on a one-row DataFrame, reported separately
+from batch featurisation throughput. Also checks both paths produce the same
+feature vector.
+"""
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services.enron_classifier import EnronEmailClassifier
+
+
+def load_messages(db_path: str, limit: int):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        "SELECT id, subject, body, from_address, date FROM emails "
+        "ORDER BY RANDOM() LIMIT ?",
+        (limit,),
+    ).fetchall()
+    conn.close()
+    return [
+        {
+            "email_id": row["id"],
+            "subject": row["subject"] or "",
+            "body": row["body"] or "",
+            "sender": row["from_address"] or "",
+            "has_attachment": False,
+            "num_recipients": 1,
+            "time_sent": row["date"],
+        }
+        for row in rows
+    ]
+
+
+def percentiles(latencies_ms):
+    return np.percentile(latencies_ms, 50), np.percentile(latencies_ms, 99)
+
+
+def time_each(fn, messages):
+    latencies = []
+    for message in messages:
+        start = time.perf_counter()
+        fn(message)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--num-emails", type=int, default=200)
+    parser.add_argument("--batch-emails", type=int, default=1000)
+    args = parser.parse_args()
+
+    classifier = EnronEmailClassifier(model_dir=args.model_dir)
+    messages = load_messages(args.db, args.num_emails)
+
+    def frame_features(message):
+        frame = pd.DataFrame([message])
+        frame["time_sent"] = pd.to_datetime(frame["time_sent"], errors="coerce")
+        return classifier.extract_features(frame)[0]
+
+    # Warm-up, and check the fast path reproduces the DataFrame features
+    diffs = [
+        np.max(np.abs(frame_features(m) - classifier.featurize_one(m)))
+        for m in messages[:20]
+    ]
+
+    print(f"\n=== Single-email latency ({len(messages)} emails) ===")
+    p50, p99 = time_each(frame_features, messages)
+    print(f"  extract_features (DataFrame) : p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+    p50, p99 = time_each(classifier.featurize_one, messages)
+    print(f"  featurize_one                : p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+    if classifier.ensemble_model is not None:
+        p50, p99 = time_each(classifier.predict_one, messages)
+        print(f"  predict_one (end to end)     : p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+    print(f"  max |Δ| between feature paths: {max(diffs):.2e}")
+
+    batch = pd.DataFrame(load_messages(args.db, args.batch_emails))
+    batch["time_sent"] = pd.to_datetime(batch["time_sent"], errors="coerce")
+    start = time.perf_counter()
+    classifier.extract_features(batch)
+    secs = time.perf_counter() - start
+    print(f"\n=== Batch featurisation ({len(batch)} emails) ===")
+    print(f"  throughput                   : {len(batch) / secs:8.1f} emails/s")
+
+
+if __name__ == "__main__":
+    main()
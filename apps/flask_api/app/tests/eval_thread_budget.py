@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+app/tests/eval_thread_budget.py
+
+Classification throughput and p50/p99 latency against thread allocation:
+torch/BLAS thread budget, scikit-learn n_jobs at predict time and request
+concurrency, all through the MicroBatcher as the API serves them. The
+native thread count of the process is reported alongside, since
+oversubscription shows up there before it shows up in latency.
+"""
+import argparse
+
+from app.services.enron_classifier import EnronEmailClassifier
+from app.services.micro_batcher import MicroBatcher
+from app.services.resources import (
+    available_cpus,
+    configure,
+    os_thread_count,
+    set_n_jobs,
+)
+from app.tests.eval_micro_batching import run_concurrent
+from app.tests.eval_single_email_latency import load_messages
+
+
+def main():
+    cpus = available_cpus()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="../SQLite_db/enron.db")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--num-emails", type=int, default=512)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, max(1, cpus // 2), cpus}),
+        help="torch/BLAS thread budgets to try",
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        nargs="+",
+        default=[1, -1],
+        help="scikit-learn n_jobs values to try at predict time",
+    )
+    args = parser.parse_args()
+
+    classifier = EnronEmailClassifier(model_dir=args.model_dir)
+    if classifier.ensemble_model is None:
+        raise SystemExit("Train a model first")
+    messages = load_messages(args.db, args.num_emails)
+    print(f"{cpus} usable CPUs, {len(messages)} emails")
+
+    results = []
+    for threads in args.threads:
+        configure(budget=threads, force=True)
+        for n_jobs in args.n_jobs:
+            set_n_jobs(classifier.ensemble_model, n_jobs)
+            batcher = MicroBatcher(classifier.predict_batch)
+            batcher.predict(messages[0])  # warm-up
+            print(f"\n=== {threads} torch/BLAS threads, sklearn n_jobs={n_jobs} ===")
+            for concurrency in args.concurrency:
+                rate, p50, p99 = run_concurrent(batcher.predict, messages, concurrency)
+                native = os_thread_count()
+                results.append((threads, n_jobs, concurrency, rate))
+                print(
+                    f"  concurrency {concurrency:3d} : {rate:8.1f} emails/s   "
+                    f"p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   "
+                    f"{native if native is not None else '?'} OS threads"
+                )
+
+    threads, n_jobs, concurrency, rate = max(results, key=lambda r: r[3])
+    print(
+        f"\nBest: {rate:.1f} emails/s with {threads} torch/BLAS threads, "
+        f"n_jobs={n_jobs}, concurrency {concurrency}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+MicroBatcher: batching of concurrent items and the one-by-one retry of a
+failed batch.
+"""
+import threading
+
+import pytest
+
+from app.services.micro_batcher import MicroBatcher
+
+
+class RecordingModel:
+    """Doubles numbers; fails the whole batch if any item is negative"""
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, items):
+        with self.lock:
+            self.batches.append(list(items))
+        if any(item < 0 for item in items):
+            raise ValueError(f"bad item in {items}")
+        return [item * 2 for item in items]
+
+
+def submit_together(batcher, items):
+    """Submit while the worker is busy, so the items queue up as one batch"""
+    busy = threading.Event()
+    release = threading.Event()
+    original = batcher.batch_fn
+
+    def hold(batch):
+        busy.set()
+        release.wait()
+        return original(batch)
+
+    batcher.batch_fn = hold
+    first = batcher.submit(0)
+    busy.wait(5)
+    futures = [batcher.submit(item) for item in items]
+    batcher.batch_fn = original
+    release.set()
+    assert first.result(5) == 0
+    return futures
+
+
+def test_queued_items_run_as_one_batch():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_wait_ms=0)
+
+    futures = submit_together(batcher, [1, 2, 3, 4])
+
+    assert [future.result(5) for future in futures] == [2, 4, 6, 8]
+    assert model.batches == [[0], [1, 2, 3, 4]]
+    assert batcher.status()["largest_batch"] == 4
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=3, max_wait_ms=0)
+
+    futures = submit_together(batcher, list(range(1, 8)))
+
+    assert [future.result(5) for future in futures] == [2, 4, 6, 8, 10, 12, 14]
+    assert [len(batch) for batch in model.batches] == [1, 3, 3, 1]
+
+
+def test_failed_batch_is_retried_one_item_at_a_time():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_wait_ms=0)
+
+    futures = submit_together(batcher, [1, -1, 3])
+
+    assert futures[0].result(5) == 2
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert futures[2].result(5) == 6
+    assert model.batches[1:] == [[1, -1, 3], [1], [-1], [3]]
+
+
+def test_wrong_number_of_results_fails_only_that_item():
+    batcher = MicroBatcher(lambda items: [] if len(items) == 1 else items)
+
+    with pytest.raises(RuntimeError):
+        batcher.predict("lost", timeout=5)
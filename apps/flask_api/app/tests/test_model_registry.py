@@ -0,0 +1,82 @@
+"""
+ModelRegistry pruning keeps the newest versions and never drops the active
+or shadow version.
+"""
+from app.services.model_registry import ModelRegistry
+
+
+def publish(tmp_path, version, day):
+    artifact_dir = tmp_path / "artifacts" / version
+    artifact_dir.mkdir(parents=True)
+    (artifact_dir / "model.joblib").write_bytes(version.encode("utf-8"))
+    manifest = {
+        "model_version": version,
+        "model_type": "ensemble",
+        "created_at": f"2026-01-{day:02d}T00:00:00+00:00",
+        "classes": ["financial", "legal"],
+    }
+    return artifact_dir, manifest
+
+
+def test_prune_keeps_newest_and_pinned_versions(tmp_path):
+    registry = ModelRegistry(tmp_path / "models", keep=1)
+
+    registry.register(*publish(tmp_path, "v1", 1), activate=True)
+    registry.register(*publish(tmp_path, "v2", 2), activate=False)
+    registry.set_shadow("v2", sample_rate=0.5)
+    for day in (3, 4, 5):
+        registry.register(*publish(tmp_path, f"v{day}", day), activate=False)
+
+    versions = {entry["model_version"]: entry for entry in registry.versions()}
+    assert set(versions) == {"v1", "v2", "v5"}
+    assert versions["v1"]["active"] and versions["v2"]["shadow"]
+    assert registry.active() == {"full": "v1"}
+    for version in ("v1", "v2", "v5"):
+        assert (registry.root / version / "model.joblib").exists()
+    for version in ("v3", "v4"):
+        assert not (registry.root / version).exists()
+
+
+def test_unpinned_versions_are_pruned_once_shadow_clears(tmp_path):
+    registry = ModelRegistry(tmp_path / "models", keep=1)
+    registry.register(*publish(tmp_path, "v1", 1), activate=True)
+    registry.register(*publish(tmp_path, "v2", 2), activate=False)
+    registry.set_shadow("v2")
+    registry.register(*publish(tmp_path, "v3", 3), activate=False)
+    registry.clear_shadow()
+
+    registry.register(*publish(tmp_path, "v4", 4), activate=False)
+
+    assert {entry["model_version"] for entry in registry.versions()} == {"v1", "v4"}
+
+
+def test_fast_and_full_versions_are_pinned_separately(tmp_path):
+    registry = ModelRegistry(tmp_path / "models", keep=0)
+    registry.register(*publish(tmp_path, "v1", 1), activate=True)
+    registry.register(*publish(tmp_path, "fast-v2", 2), activate=True)
+    registry.register(*publish(tmp_path, "v3", 3), activate=False)
+
+    assert registry.active() == {"full": "v1", "fast": "fast-v2"}
+    # keep=0: the version just registered survives only until the next one
+    assert {entry["model_version"] for entry in registry.versions()} == {
+        "v1",
+        "fast-v2",
+        "v3",
+    }
+    registry.register(*publish(tmp_path, "v4", 4), activate=False)
+    assert {entry["model_version"] for entry in registry.versions()} == {
+        "v1",
+        "fast-v2",
+        "v4",
+    }
+
+
+def test_registering_an_older_version_keeps_it(tmp_path):
+    registry = ModelRegistry(tmp_path / "models", keep=1)
+    registry.register(*publish(tmp_path, "v1", 1), activate=True)
+    registry.register(*publish(tmp_path, "v3", 3), activate=False)
+
+    entry = registry.register(*publish(tmp_path, "v2", 2), activate=False)
+
+    assert entry["model_version"] == "v2"
+    assert (registry.root / "v2").exists()
@@ -0,0 +1,129 @@
+"""
+MinHash/LSH near-duplicate clustering on a small corpus of known duplicates.
+"""
+import random
+import sqlite3
+
+from app.services.near_duplicates import (
+    analysis_text,
+    band_keys,
+    build_clusters,
+    minhash,
+    shingle_hashes,
+)
+
+WORDS = [
+    "gas", "power", "trading", "desk", "contract", "meeting", "houston",
+    "schedule", "pipeline", "deal", "price", "volume", "report", "review",
+    "credit", "risk", "legal", "team", "forward", "curve", "settlement",
+    "invoice", "counterparty", "capacity", "storage", "weather", "demand",
+]
+
+
+def memo(seed: int, n_words: int = 200) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def make_db(path, emails):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE emails (
+            id INTEGER PRIMARY KEY, subject TEXT, body TEXT,
+            starred INTEGER DEFAULT 0, flagged INTEGER DEFAULT 0,
+            deleted INTEGER DEFAULT 0, archived INTEGER DEFAULT 0,
+            read INTEGER DEFAULT 0
+        )
+        """
+    )
+    conn.executemany("INSERT INTO emails (id, subject, body) VALUES (?, ?, ?)", emails)
+    conn.commit()
+    conn.close()
+
+
+def clusters(path):
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT email_id, cluster_id, cluster_size FROM email_clusters"
+        ).fetchall()
+    finally:
+        conn.close()
+    return {email_id: (cluster_id, size) for email_id, cluster_id, size in rows}
+
+
+def test_reply_prefixes_do_not_change_the_analysis_text():
+    assert analysis_text({"subject": "Re: FW: Q3 curve", "body": "x"}) == (
+        analysis_text({"subject": "Q3 curve", "body": "x"})
+    )
+
+
+def test_identical_texts_share_signature_and_band_keys():
+    a = minhash(shingle_hashes(memo(1)))
+    b = minhash(shingle_hashes(memo(1).upper()))
+    assert (a == b).all()
+    assert (band_keys(a) == band_keys(b)).all()
+
+
+def test_empty_text_has_no_shingles():
+    assert len(shingle_hashes("  ...  ")) == 0
+
+
+def test_duplicates_cluster_under_the_lowest_id(tmp_path):
+    path = str(tmp_path / "emails.db")
+    original = memo(1)
+    edited = original.split()
+    edited[100] = "amended"
+    make_db(
+        path,
+        [
+            (1, "Q3 forward curve", original),
+            (2, "Fw: Q3 forward curve", original),
+            (3, "Re: Q3 forward curve", " ".join(edited)),
+            (4, "Storage capacity", memo(2)),
+            (5, "Weather desk", memo(3)),
+            (6, "", ""),
+        ],
+    )
+
+    stats = build_clusters(path)
+
+    assert clusters(path) == {1: (1, 3), 2: (1, 3), 3: (1, 3)}
+    assert stats["clusters"] == 1
+    assert stats["redundant_emails"] == 2
+    assert stats["signed"] == 5
+
+
+def test_unrelated_texts_stay_singletons(tmp_path):
+    path = str(tmp_path / "emails.db")
+    make_db(path, [(i, f"memo {i}", memo(i)) for i in range(1, 21)])
+
+    stats = build_clusters(path)
+
+    assert clusters(path) == {}
+    assert stats["clusters"] == 0
+
+
+
+def test_members_must_match_the_representative_not_just_a_neighbour(tmp_path):
+    path = str(tmp_path / "emails.db")
+    # Sliding windows: each text is close to the next, further from the rest
+    words = memo(7, 600).split()
+    chain = [" ".join(words[i * 20 : i * 20 + 200]) for i in range(12)]
+    make_db(path, [(i + 1, "memo", text) for i, text in enumerate(chain)])
+
+    build_clusters(path, threshold=0.7)
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT email_id, cluster_id, similarity FROM email_clusters"
+        ).fetchall()
+    finally:
+        conn.close()
+    assert rows
+    for email_id, cluster_id, similarity in rows:
+        assert similarity >= 0.7
+        # Windows three steps apart share under 0.7 of their shingles
+        assert email_id - cluster_id < 3
@@ -0,0 +1,87 @@
+"""
+Feedback snapshots from several worker processes sharing one models/
+directory are merged rather than overwriting each other.
+"""
+import threading
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+
+from app.services.online_learner import (
+    OnlineLearner,
+    build_online_head,
+    copy_online_head,
+    load_online_head,
+)
+
+CLASSES = ["financial", "legal", "personal"]
+
+
+class Worker:
+    """The parts of EnronEmailClassifier an OnlineLearner uses"""
+
+    def __init__(self, model_dir, head):
+        self.model_dir = model_dir
+        self.label_encoder = LabelEncoder().fit(CLASSES)
+        self.online_model = copy_online_head(head)
+        self.online_base_version = "v1"
+        self.serving_online_head = True
+        self._lock = threading.Lock()
+
+    def online_head(self):
+        with self._lock:
+            return self.online_model, self.online_base_version
+
+    def set_online_model(self, model, base_version, head_mtime=None):
+        with self._lock:
+            if base_version != self.online_base_version:
+                return False
+            self.online_model = model
+            return True
+
+
+def learner_for(worker, monkeypatch):
+    learner = OnlineLearner(worker, snapshot_interval=3600)
+    monkeypatch.setattr(learner, "_published_version", lambda: "v1")
+    monkeypatch.setattr(learner, "_ensure_consolidation_thread", lambda: None)
+    return learner
+
+
+def test_snapshots_from_two_workers_keep_both_updates(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(60, 4))
+    y = np.arange(60) % len(CLASSES)
+    head = build_online_head(X, y, np.arange(len(CLASSES)))
+    first, second = Worker(tmp_path, head), Worker(tmp_path, head)
+    first_learner = learner_for(first, monkeypatch)
+    second_learner = learner_for(second, monkeypatch)
+    a, b = rng.normal(size=4), rng.normal(size=4)
+
+    first_learner.apply_feedback(a, "legal")
+    second_learner.apply_feedback(b, "personal")
+    assert first_learner.snapshot() and second_learner.snapshot()
+
+    # Both corrections, in the order they were saved, on the original head
+    expected = copy_online_head(head)
+    scaler, sgd = expected.named_steps["scaler"], expected.named_steps["clf"]
+    for features, label in ((a, 1), (b, 2)):
+        sgd.partial_fit(scaler.transform([features]), [label], sample_weight=[5.0])
+
+    saved = load_online_head(tmp_path, "v1")
+    np.testing.assert_allclose(saved.named_steps["clf"].coef_, sgd.coef_)
+    np.testing.assert_allclose(second.online_model.named_steps["clf"].coef_, sgd.coef_)
+    assert second_learner.pending_updates == 0
+
+
+def test_updates_to_a_replaced_head_are_dropped(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    head = build_online_head(rng.normal(size=(30, 4)), np.arange(30) % 3, np.arange(3))
+    worker = Worker(tmp_path, head)
+    learner = learner_for(worker, monkeypatch)
+
+    learner.apply_feedback(rng.normal(size=4), "legal")
+    worker.online_base_version = "v2"
+
+    assert not learner.snapshot()
+    assert load_online_head(tmp_path, "v1") is None
+    assert learner.pending_updates == 0
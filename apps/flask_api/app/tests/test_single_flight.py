@@ -0,0 +1,92 @@
+"""
+SingleFlight: concurrent calls with one key share a single execution.
+"""
+import threading
+import time
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def run_concurrently(flight, key, fn, n):
+    """Start a leader, then ``n - 1`` callers that join its flight"""
+    outcomes = [None] * n
+
+    def call(i):
+        try:
+            outcomes[i] = flight.do(key, fn)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    threads[0].start()
+    wait_until(lambda: flight.in_flight() == 1)
+    for thread in threads[1:]:
+        thread.start()
+    wait_until(lambda: flight.shared_calls == n - 1)
+    return threads, outcomes
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait()
+        return {"category": "financial"}
+
+    threads, outcomes = run_concurrently(flight, "key", compute, 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [shared for _, shared in outcomes] == [False, True, True, True, True]
+    assert all(result is outcomes[0][0] for result, _ in outcomes)
+    assert flight.in_flight() == 0
+
+
+def test_waiting_callers_get_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def compute():
+        release.wait()
+        raise ValueError("model not loaded")
+
+    threads, outcomes = run_concurrently(flight, "key", compute, 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert flight.in_flight() == 0
+
+
+def test_finished_calls_are_not_cached_and_keys_are_separate():
+    flight = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert flight.do("a", compute) == (1, False)
+    assert flight.do("a", compute) == (2, False)
+    assert flight.do("b", compute) == (3, False)
+    assert flight.shared_calls == 0
+
+
+def test_leader_exception_propagates():
+    with pytest.raises(KeyError):
+        SingleFlight().do("key", lambda: {}["missing"])
@@ -0,0 +1,43 @@
+"""
+History stripping in the shared text normaliser, including bodies that are
+nothing but a forward.
+"""
+from app.services.email_cleaning import clean_email_body
+from app.services.text_normalizer import normalize_text, normalize_with_stats
+
+FORWARD = (
+    "---------------------- Forwarded by Jeff Dasovich/NA/Enron on 01/02/2001 "
+    "10:15 AM ---------------------------\n\n"
+    "The gas desk budget is due Friday.\n"
+)
+
+
+def test_reply_history_is_cut_below_the_new_text():
+    text, stats = normalize_with_stats(
+        "Thanks, see below.\n-----Original Message-----\nFrom: a\nold thread"
+    )
+    assert text == "Thanks, see below.\n"
+    assert stats["history"] == len("-----Original Message-----\nFrom: a\nold thread")
+
+
+def test_forward_only_body_keeps_the_forwarded_text():
+    for body in (FORWARD, "\n" + FORWARD, "  \n\n" + FORWARD):
+        assert "The gas desk budget is due Friday." in normalize_text(body)
+        assert "Forwarded by" not in normalize_text(body)
+        assert clean_email_body(body) == "The gas desk budget is due Friday."
+
+
+def test_forward_keeps_its_text_but_not_older_history():
+    body = FORWARD + "\n-----Original Message-----\nFrom: b\nolder thread\n"
+    text = normalize_text(body)
+    assert "The gas desk budget is due Friday." in text
+    assert "older thread" not in text
+
+
+def test_quoted_lines_are_dropped():
+    assert normalize_text("Agreed.\n> earlier reply\n>> older\n") == "Agreed.\n"
+
+
+def test_consumer_cap_and_missing_text():
+    assert len(normalize_text("x" * 10000, "fast")) == 2000
+    assert normalize_text(None) == ""
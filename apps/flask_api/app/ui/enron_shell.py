@@ -15,6 +15,7 @@ from rich.syntax import Syntax
 from rich.text import Text
 
 # Import the classifier
+from app.services.email_cleaning import CLEAN_BODY_VERSION, clean_email_body
 from app.services.enron_classifier import EnronEmailClassifier
 from app.services.responder import EmailResponder
 from app.services.summarizer import EmailSummarizer
@@ -189,11 +190,15 @@ Body: {self.current_email.get('body', '')}
             sender = msg.get("From", "[No sender]")
             subject = msg.get("Subject", "[No subject]")
             body = self.extract_body(msg)[:1000]  # First 1000 chars
+            # Cleaned once, shared by classification, summary and NER
+            clean_body = clean_email_body(body)
 
             # Prepare email data for AI classification
             email_data = {
                 "subject": subject,
                 "body": body,
+                "clean_body": clean_body,
+                "clean_body_version": CLEAN_BODY_VERSION,
                 "sender": sender,
                 "has_attachment": len(msg.get_payload()) > 1,
                 "num_recipients": len(msg.get_all("To", []))
@@ -203,15 +208,10 @@ Body: {self.current_email.get('body', '')}
             }
 
             # AI Classification
-            prediction = self.classifier.predict(email_data)
+            prediction = self.classifier.predict_one(email_data)
 
             # Generate Email Summary
-            full_email_text = f"""
-    Subject: {subject}
-    From: {sender}
-    Body: {body}
-            """
-            summary = self.summarizer.summarize_email(full_email_text)
+            summary = self.summarizer.summarize_email(clean_body, cleaned=True)
 
             # Create rich display
             table = Table(
@@ -249,7 +249,7 @@ Body: {self.current_email.get('body', '')}
 
             table.add_row("🎭 Emotional Tone", emotions_text)
 
-            entities = self.extractor.extract_entities(email_data["body"])
+            entities = self.extractor.extract_entities(clean_body)
             entities_str = (
                 f"Names: {entities['names']}\nOrgs:"
                 "{entities['orgs']}\nDates: {entities['dates']}"
@@ -0,0 +1,61 @@
+"""
+Pre-fork production serving: ``gunicorn -c gunicorn.conf.py app.server:app``
+
+The app, and with it the classifier, sentence encoder, zero-shot pipeline and
+spaCy model, is imported once in the master (``preload_app``). The master then
+freezes the garbage collector's view of those objects and forks the workers,
+which share the weights copy-on-write instead of each loading a private copy.
+Check what each worker really costs at ``/api/system/memory``, which reports
+its unique set size (USS) next to its RSS.
+
+The master only loads the models; it runs nothing through torch, whose
+thread pools do not survive a fork. Each worker embeds the category names
+itself once it is forked.
+
+Each worker serves its own copy of what changes at runtime and catches up
+with the others before handling a request (see
+EnronEmailClassifier.sync_published): a version trained or activated in one
+worker is followed through the registry's active pointer, and feedback
+through the online head snapshot, saved every FEEDBACK_SNAPSHOT_SECONDS.
+Taxonomy reloads still only change the worker that handles them.
+"""
+import gc
+import os
+
+bind = os.getenv("SERVE_BIND", "0.0.0.0:5050")
+workers = int(os.getenv("SERVE_WORKERS", str(max(2, (os.cpu_count() or 1) // 2))))
+threads = int(os.getenv("SERVE_THREADS", "4"))
+timeout = int(os.getenv("SERVE_TIMEOUT", "300"))
+preload_app = True
+
+# Feedback taken by one worker reaches the others when it is snapshotted;
+# read by the OnlineLearner the preloaded app creates
+os.environ.setdefault("FEEDBACK_SNAPSHOT_SECONDS", "10")
+
+# No collections while the models load: a collection would touch (and later
+# force copies of) every object's header. Re-enabled in each worker below.
+gc.disable()
+
+
+def when_ready(server):
+    # Move everything loaded so far into the permanent generation, so the
+    # workers' collectors never write to the pages they share with the master
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Models loaded; {gc.get_freeze_count()} objects frozen")
+
+
+def post_fork(server, worker):
+    gc.enable()
+    # Lets /api/system/memory find the master and its other workers
+    os.environ["SERVE_MASTER_PID"] = str(server.pid)
+    # Split the cores between workers rather than letting each torch / BLAS
+    # runtime start one thread per core (see app/services/resources.py)
+    from app.services.resources import configure
+
+    configure(processes=workers, force=True)
+
+    # First torch work in this process, now that its threads are configured
+    from app.routes.classify import classifier
+
+    classifier.category_index()